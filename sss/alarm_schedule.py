@@ -0,0 +1,168 @@
+"""
+闹钟调度
+计算每个闹钟的下一次响铃时间，按时间放入最小堆，界面只需为最早的一个闹钟设置定时器。
+与界面无关，供闹钟页使用。
+"""
+
+import heapq
+import itertools
+from functools import lru_cache
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# 支持调度的循环方式
+SCHEDULED_LOOP_TYPES = ("once", "daily", "weekly")
+
+# 定时器到点较晚（休眠唤醒等）时，超过这个秒数的响铃直接跳过，顺延到下一次
+MISFIRE_GRACE_SECONDS = 60
+
+
+@lru_cache(maxsize=4096)
+def parse_alarm_time(text: str) -> Optional[dt_time]:
+    """解析 HH:MM:SS（或 HH:MM），结果缓存，大量闹钟反复计算时不重复解析"""
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.strptime(text, fmt).time()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+@lru_cache(maxsize=4096)
+def parse_alarm_date(text: str) -> Optional[date]:
+    """解析 ISO 日期，结果缓存"""
+    try:
+        return datetime.fromisoformat(text).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def next_fire_time(alarm: Dict, now: datetime) -> Optional[datetime]:
+    """闹钟在 now 所在分钟及之后的下一次响铃时间，不会再响时返回 None
+
+    与原来按分钟比较的行为一致：响铃时间落在当前这一分钟内也算作待响铃；
+    last_trigger_at（上次响铃对应的计划时间戳）之前及当时的响铃不会重复。
+    """
+    if not alarm.get("enabled", True):
+        return None
+    loop_type = alarm.get("loop_type", "once")
+    if loop_type not in SCHEDULED_LOOP_TYPES:
+        return None
+    alarm_time = parse_alarm_time(alarm.get("time", ""))
+    if alarm_time is None:
+        return None
+
+    floor = now.replace(second=0, microsecond=0)
+    last = alarm.get("last_trigger_at")
+
+    if loop_type == "once":
+        alarm_date = parse_alarm_date(alarm.get("date", ""))
+        if alarm_date is None:
+            return None
+        fire_at = datetime.combine(alarm_date, alarm_time)
+        if fire_at < floor or (last is not None and fire_at.timestamp() <= last):
+            return None
+        return fire_at
+
+    if loop_type == "daily":
+        step = timedelta(days=1)
+        fire_at = datetime.combine(floor.date(), alarm_time)
+    else:
+        alarm_date = parse_alarm_date(alarm.get("date", ""))
+        if alarm_date is None:
+            return None
+        step = timedelta(days=7)
+        offset = (alarm_date.weekday() - floor.weekday()) % 7
+        fire_at = datetime.combine(floor.date() + timedelta(days=offset), alarm_time)
+    if fire_at < floor:
+        fire_at += step
+    while last is not None and fire_at.timestamp() <= last:
+        fire_at += step
+    return fire_at
+
+
+class AlarmSchedule:
+    """闹钟的下一次响铃时间（最小堆）
+
+    堆中的条目为 (时间戳, 序号, 闹钟 id)，修改或删除闹钟时不在堆中查找，
+    只更新 _next 中的时间，过期条目在弹出时丢弃（惰性删除）。
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._next: Dict[str, float] = {}
+        self._alarms: Dict[str, Dict] = {}
+        self._counter = itertools.count()
+
+    def rebuild(self, alarms: Iterable[Dict], now: datetime):
+        """按全部闹钟重建（加载或批量修改后调用）"""
+        self._heap = []
+        self._next.clear()
+        self._alarms.clear()
+        for alarm in alarms:
+            fire_at = next_fire_time(alarm, now)
+            if fire_at is None or not alarm.get("id"):
+                continue
+            timestamp = fire_at.timestamp()
+            self._next[alarm["id"]] = timestamp
+            self._alarms[alarm["id"]] = alarm
+            self._heap.append((timestamp, next(self._counter), alarm["id"]))
+        heapq.heapify(self._heap)
+
+    def update(self, alarm: Dict, now: datetime):
+        """重新计算一个闹钟的下一次响铃时间"""
+        alarm_id = alarm.get("id")
+        if not alarm_id:
+            return
+        fire_at = next_fire_time(alarm, now)
+        if fire_at is None:
+            self.remove(alarm_id)
+            return
+        timestamp = fire_at.timestamp()
+        self._alarms[alarm_id] = alarm
+        if self._next.get(alarm_id) == timestamp:
+            return
+        self._next[alarm_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, next(self._counter), alarm_id))
+        if len(self._heap) > 2 * len(self._next) + 64:
+            # 过期条目太多时压缩一次
+            self._heap = [(ts, seq, i) for ts, seq, i in self._heap if self._next.get(i) == ts]
+            heapq.heapify(self._heap)
+
+    def remove(self, alarm_id: str):
+        self._next.pop(alarm_id, None)
+        self._alarms.pop(alarm_id, None)
+
+    def _discard_stale(self):
+        while self._heap and self._next.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_time(self) -> Optional[float]:
+        """最早一次响铃的时间戳，没有待响铃的闹钟时返回 None"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[Tuple[Dict, float]]:
+        """弹出所有已到时间的闹钟，返回 [(闹钟, 计划响铃时间戳)]
+
+        超过 MISFIRE_GRACE_SECONDS 才处理到的响铃不返回，只顺延到下一次。
+        调用方在记录 last_trigger_at 后应对每个闹钟调用 update() 安排下一次。
+        """
+        due: List[Tuple[Dict, float]] = []
+        now_ts = now.timestamp()
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now_ts:
+                break
+            timestamp, _, alarm_id = heapq.heappop(self._heap)
+            del self._next[alarm_id]
+            alarm = self._alarms.pop(alarm_id)
+            if now_ts - timestamp <= MISFIRE_GRACE_SECONDS:
+                due.append((alarm, timestamp))
+            else:
+                self.update(alarm, now)
+        return due
+
+    def __len__(self) -> int:
+        return len(self._next)
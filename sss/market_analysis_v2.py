@@ -4,6 +4,7 @@
 完全复用 novel_reader_qt.py 的解析逻辑
 """
 
+import os
 import sys
 import sqlite3
 import time
@@ -14,22 +15,25 @@ from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QTableWidget, 
     QTableWidgetItem, QPushButton, QLabel, QSplitter, QComboBox,
     QDialog, QDialogButtonBox, QHeaderView, QMessageBox, QTabWidget,
-    QSpinBox
+    QSpinBox, QCheckBox, QFileDialog
 )
 from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal
 from PyQt6.QtGui import QColor
 
 # Import core logic from main application
 import novel_reader_qt as nr
+from market_store import (
+    DEFAULT_DB_PATH, MarketDatabase, PYARROW_AVAILABLE, close_store_writer, get_store_writer,
+)
 
-# Check for OCR availability
+# Check for OCR availability (paddleocr itself is imported lazily by nr.load_ocr_engine)
 try:
-    from paddleocr import PaddleOCR
     from PIL import Image
     import numpy as np
-    PADDLEOCR_AVAILABLE = True
+    PADDLEOCR_AVAILABLE = nr.PADDLEOCR_AVAILABLE
 except ImportError:
     PADDLEOCR_AVAILABLE = False
+if not PADDLEOCR_AVAILABLE:
     print("PaddleOCR not available. OCR features will be disabled.")
 
 # Check for matplotlib availability
@@ -107,150 +111,6 @@ class ManualInputDialog(QDialog):
         return self.text_edit.toPlainText()
 
 
-class MarketDatabase:
-    """市场数据库管理类"""
-    
-    def __init__(self, db_path="market_data.db"):
-        self.db_path = db_path
-        self.conn = None
-        self._init_database()
-    
-    def _init_database(self):
-        """初始化数据库"""
-        self.conn = sqlite3.connect(self.db_path)
-        cursor = self.conn.cursor()
-        
-        # 创建表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS market_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                item_name TEXT NOT NULL,
-                standard_name TEXT NOT NULL,
-                price REAL NOT NULL,
-                trade_type TEXT NOT NULL,
-                category TEXT NOT NULL,
-                subcategory TEXT,
-                raw_name TEXT,
-                full_text TEXT,
-                timestamp DATETIME NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # 创建索引
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_item_timestamp 
-            ON market_records(standard_name, timestamp)
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_timestamp 
-            ON market_records(timestamp)
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_category 
-            ON market_records(category)
-        """)
-        
-        self.conn.commit()
-    
-    def insert_record(self, item_dict: dict):
-        """插入记录"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO market_records 
-            (item_name, standard_name, price, trade_type, category, subcategory, 
-             raw_name, full_text, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            item_dict.get('name'),
-            item_dict.get('name'),
-            item_dict.get('price'),
-            item_dict.get('trade_type'),
-            item_dict.get('category', '').split('-')[0] if '-' in item_dict.get('category', '') else item_dict.get('category', ''),
-            item_dict.get('category', '').split('-')[1] if '-' in item_dict.get('category', '') else '',
-            item_dict.get('raw_name'),
-            item_dict.get('full_text'),
-            item_dict.get('timestamp', datetime.now())
-        ))
-        self.conn.commit()
-    
-    def query_by_item(self, item_name: str, days: int = 7) -> List[tuple]:
-        """查询物品历史"""
-        cursor = self.conn.cursor()
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
-        cursor.execute("""
-            SELECT timestamp, price, trade_type, full_text
-            FROM market_records
-            WHERE standard_name = ? AND timestamp BETWEEN ? AND ?
-            ORDER BY timestamp ASC
-        """, (item_name, start_date, end_date))
-        
-        return cursor.fetchall()
-    
-    def get_item_statistics(self, item_name: str, days: int = 7) -> dict:
-        """获取物品统计信息"""
-        records = self.query_by_item(item_name, days)
-        if not records:
-            return {}
-        
-        prices = [r[1] for r in records]
-        return {
-            'count': len(prices),
-            'min_price': min(prices),
-            'max_price': max(prices),
-            'avg_price': sum(prices) / len(prices),
-            'latest_price': prices[-1] if prices else 0
-        }
-    
-    def get_all_items_stats(self, days: int = 7) -> List[dict]:
-        """获取所有物品的统计信息"""
-        cursor = self.conn.cursor()
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
-        cursor.execute("""
-            SELECT standard_name, COUNT(*) as count,
-                   MIN(price) as min_price, MAX(price) as max_price,
-                   AVG(price) as avg_price
-            FROM market_records
-            WHERE timestamp BETWEEN ? AND ? AND price > 0
-            GROUP BY standard_name
-            ORDER BY count DESC
-        """, (start_date, end_date))
-        
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                'name': row[0],
-                'count': row[1],
-                'min_price': row[2],
-                'max_price': row[3],
-                'avg_price': row[4]
-            })
-        
-        return results
-    
-    def cleanup_old_records(self, months=3):
-        """清理旧数据"""
-        cursor = self.conn.cursor()
-        cutoff_date = datetime.now() - timedelta(days=months * 30)
-        
-        cursor.execute("""
-            DELETE FROM market_records
-            WHERE timestamp < ?
-        """, (cutoff_date,))
-        
-        self.conn.commit()
-        return cursor.rowcount
-    
-    def close(self):
-        """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
-
-
 class TestParser:
     """
     解析器包装类，复用主程序的解析逻辑
@@ -280,13 +140,18 @@ class TestParser:
 class MarketAnalysisV2Tab(QWidget):
     """市场分析 V2 - 主界面"""
     
+    # 后台导出完成（从写线程发出，界面线程接收）
+    export_finished = pyqtSignal(dict)
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         
         # 数据存储
         self.raw_logs: List[str] = []  # 原始聊天记录
         self.parsed_items: List[dict] = []  # 解析后的物品
-        self.db = MarketDatabase()  # 数据库
+        # 写入由共用的后台写线程批量完成（打开、升级和定期整理数据库也在写线程中）
+        self.db_path = DEFAULT_DB_PATH
+        self.export_finished.connect(self._on_export_finished)
         
         # 筛选条件
         self.filter_category = "全部"
@@ -299,30 +164,56 @@ class MarketAnalysisV2Tab(QWidget):
         self.ocr_worker = None
         self.capture_timer = QTimer(self)
         self.capture_timer.timeout.connect(self._capture_and_analyze)
-        
-        # 初始化OCR
-        self._init_ocr()
+        self.ocr_warmup_worker = None
+        self._ocr_load_error: Optional[str] = None  # 加载失败后不再在每次显示时重试
         
         self._build_ui()
     
-    def _init_ocr(self):
-        """初始化OCR引擎"""
-        if not PADDLEOCR_AVAILABLE:
-            print("[V2] PaddleOCR未安装，OCR功能将被禁用")
-            return
+    @property
+    def db_writer(self):
+        """market_data.db 的共用写入器（与市场分析界面是同一个写线程）"""
+        return get_store_writer(self.db_path)
+    
+    def showEvent(self, event):
+        """首次显示时在后台预热OCR"""
+        super().showEvent(event)
+        self._init_ocr()
+    
+    def _init_ocr(self, retry: bool = False):
+        """后台加载OCR引擎（与主程序共用同一个实例）
         
-        try:
-            print("[V2] 正在初始化PaddleOCR...")
-            self.ocr_engine = PaddleOCR(
-                use_angle_cls=False,
-                lang='ch',
-                det_db_box_thresh=0.5,
-                rec_batch_num=6
-            )
-            print("[V2] OCR引擎初始化成功")
-        except Exception as e:
-            print(f"[V2] OCR初始化失败: {e}")
-            self.ocr_engine = None
+        加载失败过一次后只在用户点击识别按钮时（retry=True）重新加载。
+        """
+        if self.ocr_engine is not None or not PADDLEOCR_AVAILABLE:
+            return
+        if self._ocr_load_error is not None and not retry:
+            return
+        if self.ocr_warmup_worker is not None and self.ocr_warmup_worker.isRunning():
+            return
+        print("[V2] 正在后台初始化PaddleOCR...")
+        self._ocr_load_error = None
+        self.ocr_warmup_worker = nr.OCRWarmupWorker()
+        self.ocr_warmup_worker.ready_signal.connect(self._on_ocr_ready)
+        self.ocr_warmup_worker.error_signal.connect(self._on_ocr_load_failed)
+        self.ocr_warmup_worker.start()
+        self.btn_ocr.setToolTip("OCR模型加载中...")
+    
+    def _on_ocr_ready(self, engine):
+        """OCR引擎就绪"""
+        print("[V2] OCR引擎初始化成功")
+        self.ocr_engine = engine
+        self.btn_ocr.setToolTip("")
+        if self.btn_ocr.isChecked() and not self.is_capturing:
+            self.toggle_ocr()
+    
+    def _on_ocr_load_failed(self, error: str):
+        """OCR引擎加载失败"""
+        print(f"[V2] OCR初始化失败: {error}")
+        self._ocr_load_error = error
+        self.btn_ocr.setToolTip(f"OCR初始化失败: {error}")
+        if self.btn_ocr.isChecked():
+            self.btn_ocr.setChecked(False)
+            self.status_label.setText("OCR初始化失败")
     
     def _build_ui(self):
         """构建界面"""
@@ -337,7 +228,7 @@ class MarketAnalysisV2Tab(QWidget):
         self.btn_ocr = QPushButton("OCR识别")
         self.btn_ocr.setCheckable(True)
         self.btn_ocr.clicked.connect(self.toggle_ocr)
-        if not self.ocr_engine:
+        if not PADDLEOCR_AVAILABLE:
             self.btn_ocr.setEnabled(False)
             self.btn_ocr.setToolTip("OCR引擎未安装")
         toolbar_layout.addWidget(self.btn_ocr)
@@ -359,6 +250,13 @@ class MarketAnalysisV2Tab(QWidget):
         self.btn_clear.clicked.connect(self.clear_data)
         toolbar_layout.addWidget(self.btn_clear)
         
+        # 导出历史按钮（Parquet，供数据分析使用）
+        self.btn_export = QPushButton("导出历史")
+        self.btn_export.setToolTip("将数据库中的全部价格记录按日期/大类导出为 Parquet，再次导出只追加新记录")
+        self.btn_export.clicked.connect(self.export_history)
+        self.btn_export.setEnabled(PYARROW_AVAILABLE)
+        toolbar_layout.addWidget(self.btn_export)
+        
         # 重载代码按钮（调试功能）
         self.btn_reload = QPushButton("重载代码")
         self.btn_reload.clicked.connect(self.reload_code)
@@ -471,11 +369,20 @@ class MarketAnalysisV2Tab(QWidget):
     
     def toggle_ocr(self):
         """切换OCR识别状态"""
-        if not self.ocr_engine:
+        if not PADDLEOCR_AVAILABLE:
             QMessageBox.warning(self, "OCR未安装", "请先安装PaddleOCR")
             self.btn_ocr.setChecked(False)
             return
         
+        if not self.ocr_engine:
+            if self.btn_ocr.isChecked():
+                # 模型加载完成后由 _on_ocr_ready 自动开始
+                self.status_label.setText("OCR模型加载中...")
+                self._init_ocr(retry=True)
+            else:
+                self.status_label.setText("已取消")
+            return
+        
         if self.btn_ocr.isChecked():
             # 开始识别
             self.is_capturing = True
@@ -629,12 +536,9 @@ class MarketAnalysisV2Tab(QWidget):
         new_items = parser.results
         self.parsed_items.extend(new_items)
         
-        # 写入数据库
+        # 交给后台线程写入数据库（按批次在单个事务中写入）
         for item in new_items:
-            try:
-                self.db.insert_record(item)
-            except Exception as e:
-                print(f"数据库插入失败: {e}")
+            self.db_writer.put(item)
         
         # 更新界面
         self.update_table()
@@ -642,6 +546,25 @@ class MarketAnalysisV2Tab(QWidget):
         
         self.status_label.setText(f"完成，提取 {len(new_items)} 条信息")
     
+    def export_history(self):
+        """选择目录后在后台导出价格历史"""
+        out_dir = QFileDialog.getExistingDirectory(self, "选择导出目录", os.path.abspath("market_export"))
+        if not out_dir:
+            return
+        self.btn_export.setEnabled(False)
+        self.status_label.setText("正在后台导出历史记录...")
+        self.db_writer.export_history(out_dir, callback=self.export_finished.emit)
+
+    def _on_export_finished(self, result: dict):
+        self.btn_export.setEnabled(True)
+        if result.get('error'):
+            self.status_label.setText("导出失败")
+            QMessageBox.warning(self, "导出失败", f"无法导出历史记录：{result['error']}")
+            return
+        self.status_label.setText(
+            f"导出完成：新增 {result['exported']} 条记录，{result['files']} 个文件"
+        )
+
     def update_table(self):
         """更新表格显示"""
         # 应用筛选
@@ -713,7 +636,9 @@ class MarketAnalysisV2Tab(QWidget):
         """更新采集区统计"""
         log_count = len(self.raw_logs)
         item_count = len(self.parsed_items)
-        self.stats_label.setText(f"识别条数: {log_count} | 提取物品: {item_count}")
+        self.stats_label.setText(
+            f"识别条数: {log_count} | 提取物品: {item_count} | 待写入: {self.db_writer.depth}"
+        )
     
     def update_display_stats(self, items: List[dict]):
         """更新展示区统计"""
@@ -765,21 +690,215 @@ class MarketAnalysisV2Tab(QWidget):
             self.is_capturing = False
             self.capture_timer.stop()
         
-        # 关闭数据库
-        self.db.close()
+        # 等待后台线程写完再关闭数据库
+        close_store_writer(self.db_path, timeout=10)
         super().closeEvent(event)
 # ==================== 新增：价格趋势图标签页 ====================
-import pandas as pd
+from array import array
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.dates import DateFormatter
 import matplotlib.dates as mdates
+import numpy as np
+
+
+class TrendDataService:
+    """价格趋势数据服务
+    
+    从 market_records 读取价格并按物品缓存在内存中（时间戳、价格各一个 array('d')），
+    之后每次刷新只读取 id 大于上次读取位置的新记录。切换分组、平滑等显示选项只读缓存。
+    """
+    
+    # 首次加载和缓存保留的时间范围
+    LOOKBACK_DAYS = 30
+    
+    def __init__(self, db_path: str = "market_data.db", lookback_days: int = LOOKBACK_DAYS):
+        self.db_path = db_path
+        self.lookback_days = lookback_days
+        self._series: Dict[str, tuple] = {}  # {物品名: (时间戳毫秒 array, 价格 array)}
+        self._unsorted: set = set()  # 追加了早于末尾时间的记录、需要重新排序的物品
+        self._last_id = 0
+        self._schema_checked = False
+        self._schema_waiting = False
+        self.conn: Optional[sqlite3.Connection] = None
+    
+    def _cutoff_ms(self) -> int:
+        return int((datetime.now() - timedelta(days=self.lookback_days)).timestamp() * 1000)
+    
+    def refresh(self) -> int:
+        """读取新记录并追加到缓存，返回新增条数"""
+        if self.conn is None:
+            if not os.path.exists(self.db_path):
+                return 0
+            self.conn = sqlite3.connect(self.db_path)
+        try:
+            if not self._schema_ready():
+                return 0
+            # 只读取已转换为 epoch 毫秒的记录，个别无法转换的旧行不影响整体
+            rows = self.conn.execute("""
+                SELECT id, standard_name, timestamp, price
+                FROM market_records
+                WHERE id > ? AND timestamp >= ? AND typeof(timestamp) = 'integer' AND price > 0
+                ORDER BY id
+            """, (self._last_id, self._cutoff_ms())).fetchall()
+        except sqlite3.Error as exc:
+            # 数据库尚未建表、被锁或已损坏
+            print(f"[TrendDataService] 读取失败: {exc}")
+            return 0
+        
+        for record_id, name, timestamp, price in rows:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = (array('d'), array('d'))
+            times, prices = series
+            if times and timestamp < times[-1]:
+                self._unsorted.add(name)
+            times.append(timestamp)
+            prices.append(price)
+        if rows:
+            self._last_id = rows[-1][0]
+        self._prune()
+        return len(rows)
+    
+    def _schema_ready(self) -> bool:
+        """数据库结构是否已升级到当前版本
+        
+        旧数据库的 datetime 文本时间戳由写线程（MarketStoreWriter）原地转换，id 不变；
+        转换完成前不读取，否则读取位置越过这些 id 后，转换好的记录就不会再被读到。
+        """
+        if self._schema_checked:
+            return True
+        try:
+            row = self.conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        except sqlite3.OperationalError:
+            row = None  # 还没有被 MarketDatabase 打开过的旧数据库
+        if not row or row[0] is None or row[0] < MarketDatabase.SCHEMA_VERSION:
+            if not self._schema_waiting:
+                print("[TrendDataService] 数据库结构尚未升级，等待写线程完成转换后再读取")
+                self._schema_waiting = True
+            return False
+        self._schema_checked = True
+        return True
+    
+    def _prune(self):
+        """丢弃超出时间范围的旧数据"""
+        cutoff = self._cutoff_ms()
+        for name in list(self._series):
+            times, prices = self._series[name]
+            if name in self._unsorted or not times or times[0] >= cutoff:
+                continue
+            keep_from = int(np.searchsorted(np.frombuffer(times, dtype=np.float64), cutoff))
+            if keep_from >= len(times):
+                del self._series[name]
+                continue
+            del times[:keep_from]
+            del prices[:keep_from]
+    
+    def items(self) -> List[str]:
+        return list(self._series)
+    
+    def counts(self) -> Dict[str, int]:
+        """各物品缓存的记录数"""
+        return {name: len(series[0]) for name, series in self._series.items()}
+    
+    def series(self, name: str):
+        """返回 (时间戳毫秒, 价格) 两个按时间排序的 numpy 数组（副本，缓存之后仍可追加）"""
+        series = self._series.get(name)
+        if series is None:
+            return np.empty(0), np.empty(0)
+        times, prices = series
+        if name in self._unsorted:
+            order = np.argsort(np.frombuffer(times, dtype=np.float64), kind='stable')
+            times = array('d', np.frombuffer(times, dtype=np.float64)[order].tobytes())
+            prices = array('d', np.frombuffer(prices, dtype=np.float64)[order].tobytes())
+            self._series[name] = (times, prices)
+            self._unsorted.discard(name)
+        return np.array(times, dtype=np.float64), np.array(prices, dtype=np.float64)
+    
+    # 时区偏移（夏令时切换）都发生在整刻钟，按刻钟分桶计算偏移
+    UTC_OFFSET_BUCKET_SECONDS = 900
+    
+    @classmethod
+    def to_datenum(cls, timestamps_ms):
+        """epoch 毫秒转换为 matplotlib 日期数值（本地时间）
+        
+        每个时间戳按自己所在时刻的 UTC 偏移换算，跨夏令时切换的序列不会整体错开一小时；
+        偏移按刻钟分桶只计算一次，仍然是向量化的。
+        """
+        seconds = np.asarray(timestamps_ms, dtype=np.float64) / 1000
+        if not len(seconds):
+            return seconds
+        buckets, inverse = np.unique(
+            np.floor(seconds / cls.UTC_OFFSET_BUCKET_SECONDS), return_inverse=True
+        )
+        offsets = np.array([
+            datetime.fromtimestamp(bucket * cls.UTC_OFFSET_BUCKET_SECONDS).astimezone().utcoffset().total_seconds()
+            for bucket in buckets
+        ])
+        return (seconds + offsets[inverse]) / 86400 + mdates.date2num(datetime(1970, 1, 1))
+    
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def downsample_lttb(x, y, threshold: int):
+    """Largest-Triangle-Three-Buckets 降采样，返回 (x, y)
+    
+    首尾点保留，中间的点均分为 threshold - 2 个桶，每个桶选出与上一个选中点、
+    下一个桶均值构成三角形面积最大的点，能保留峰谷形状。
+    桶均值用 reduceat 一次算出，桶内面积向量化计算，只按桶数循环。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold < 3 or n <= threshold:
+        return x, y
+    
+    buckets = threshold - 2
+    edges = (np.arange(buckets + 1) * (n - 2) // buckets + 1).astype(np.intp)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # 第 i 个桶的右侧锚点为第 i+1 个桶的均值，最后一个桶用末尾点
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+    
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(buckets):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+def canvas_point_budget(canvas, minimum: int = 200) -> int:
+    """按画布像素宽度决定每条曲线最多画多少个点"""
+    return max(minimum, int(canvas.width() * canvas.devicePixelRatioF()))
+
+
+_trend_services: Dict[str, TrendDataService] = {}
+
+
+def get_trend_service(db_path: str = "market_data.db") -> TrendDataService:
+    """同一数据库的趋势图共用一个缓存"""
+    service = _trend_services.get(db_path)
+    if service is None:
+        service = _trend_services[db_path] = TrendDataService(db_path)
+    return service
 
 class PriceTrendTab(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
         self.setWindowTitle("价格趋势")
+        self.trend_service = get_trend_service()
         self.init_ui()
 
     def init_ui(self):
@@ -788,7 +907,7 @@ class PriceTrendTab(QWidget):
         # 顶部操作栏
         top_bar = QHBoxLayout()
         refresh_btn = QPushButton("刷新趋势图")
-        refresh_btn.clicked.connect(self.plot_trend)
+        refresh_btn.clicked.connect(self.refresh_trend)
         top_bar.addWidget(QLabel("热门物品趋势："))
         top_bar.addWidget(refresh_btn)
         top_bar.addStretch()
@@ -800,20 +919,20 @@ class PriceTrendTab(QWidget):
 
         layout.addLayout(top_bar)
         layout.addWidget(self.canvas, 1)
-        self.plot_trend()  # 启动时自动画一次
+        self.refresh_trend()  # 启动时自动画一次
+
+    TRACKED_ITEMS = ['高级必杀', '伤害符', '黑宝石', 'C66', '神兜兜', '炼兽真经', '五色灵尘']
+
+    def refresh_trend(self):
+        """读取新记录后重画"""
+        self.trend_service.refresh()
+        self.plot_trend()
 
     def plot_trend(self):
         try:
-            conn = sqlite3.connect("market_data.db")
-            df = pd.read_sql("""
-                SELECT name, price, timestamp 
-                FROM market_items 
-                WHERE name IN ('高级必杀','伤害符','黑宝石','C66','神兜兜','炼兽真经','五色灵尘')
-                ORDER BY timestamp
-            """, conn, parse_dates=['timestamp'])
-            conn.close()
-
-            if df.empty:
+            items = [name for name in self.TRACKED_ITEMS if name in self.trend_service.counts()]
+
+            if not items:
                 self.figure.clear()
                 ax = self.figure.add_subplot(111)
                 ax.text(0.5, 0.5, "暂无数据\n去采集几条记录再来看哦~", 
@@ -828,10 +947,12 @@ class PriceTrendTab(QWidget):
             self.figure.patch.set_facecolor('#2b2b2b')
 
             colors = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#f9ca24', '#f3722c', '#a29bfe', '#fd79a8']
-            for i, item in enumerate(df['name'].unique()):
-                data = df[df['name'] == item]
-                ax.plot(data['timestamp'], data['price'], 
-                       'o-', label=f"{item} ({data['price'].iloc[-1]:.1f}万)", 
+            budget = canvas_point_budget(self.canvas)
+            for i, item in enumerate(items):
+                times, prices = self.trend_service.series(item)
+                x, y = downsample_lttb(self.trend_service.to_datenum(times), prices, budget)
+                ax.plot(x, y,
+                       'o-', label=f"{item} ({prices[-1]:.1f}万)", 
                        color=colors[i % len(colors)], linewidth=2.5, markersize=6)
 
             ax.set_title("梦幻西游热门物品实时价格趋势", fontsize=18, color='white', pad=20)
@@ -856,18 +977,13 @@ class PriceTrendTab(QWidget):
 
 
 # ==================== 终极价格趋势图（V2.0 封神版）===================
-import pandas as pd
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.dates import DateFormatter
-import matplotlib.dates as mdates
 from scipy.interpolate import make_interp_spline
-import numpy as np
 
 class UltimatePriceTrendTab(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("价格趋势·终极版")
+        self.trend_service = get_trend_service()
         self.init_ui()
 
     def init_ui(self):
@@ -891,8 +1007,16 @@ class UltimatePriceTrendTab(QWidget):
         self.predict_cb.stateChanged.connect(self.plot_trend)
         ctrl.addWidget(self.predict_cb)
 
+        # 实时模式：定时读取新记录，只更新线条数据
+        self.live_cb = QCheckBox("实时模式")
+        self.live_cb.stateChanged.connect(self._toggle_live)
+        ctrl.addWidget(self.live_cb)
+        self.live_timer = QTimer(self)
+        self.live_timer.timeout.connect(self._live_tick)
+        self._clear_live()
+
         refresh_btn = QPushButton("刷新")
-        refresh_btn.clicked.connect(self.plot_trend)
+        refresh_btn.clicked.connect(self.refresh_trend)
         ctrl.addWidget(refresh_btn)
         ctrl.addStretch()
 
@@ -900,31 +1024,248 @@ class UltimatePriceTrendTab(QWidget):
         self.figure = Figure(figsize=(14, 8), facecolor='#1e1e1e')
         self.canvas = FigureCanvas(self.figure)
         self.canvas.setStyleSheet("background:#1e1e1e;")
+        self.canvas.mpl_connect('draw_event', self._on_canvas_draw)
 
         layout.addLayout(ctrl)
         layout.addWidget(self.canvas, 1)
+        self.refresh_trend()
+
+    # 热门词典
+    HOT_GROUPS = {
+        "兽决": ["必杀","连击","偷袭","强力","感知","神佑","隐攻","幸存"],
+        "符": ["伤害符","力量符","体质符","魔力符","耐力符","敏捷符"],
+        "宝石": ["黑宝石","红玛瑙","太阳石","月亮石","舍利子","光芒石","翡翠石","星辉石"],
+        "书铁": ["制造指南书","百炼精铁","灵饰指南书","元灵晶石"],
+        "强化石": ["青龙石","白虎石","朱雀石","玄武石"],
+        "附魔宝珠": ["附魔宝珠"],
+    }
+
+    def refresh_trend(self):
+        """读取新记录后重画"""
+        self.trend_service.refresh()
         self.plot_trend()
 
+    def _select_items(self) -> List[str]:
+        """按当前分组从缓存中选出要画的物品"""
+        counts = self.trend_service.counts()
+        group = self.combo.currentText()
+        if group in self.HOT_GROUPS:
+            keywords = self.HOT_GROUPS[group]
+            return [name for name in counts if any(k in name for k in keywords)]
+        if group == "全部热门":
+            return sorted(counts, key=counts.get, reverse=True)[:8]
+        return list(counts)
+
+    COLORS = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#f9ca24', '#f3722c', '#a29bfe', '#fd79a8', '#55efc4']
+
+    def _prepare_series(self, item: str, budget: int) -> dict:
+        """按画布宽度降采样，再计算平滑曲线和预测线（预测仍用完整数据拟合）"""
+        times, full_y = self.trend_service.series(item)
+        full_x = self.trend_service.to_datenum(times)
+        x, y = downsample_lttb(full_x, full_y, budget)
+        result = {'label': f"{item} ({y[-1]:.1f}万)", 'x': x, 'y': y, 'smooth': None, 'pred': None}
+
+        if self.smooth_cb.isChecked() and len(x) >= 4 and len(np.unique(x)) == len(x):
+            x_smooth = np.linspace(x.min(), x.max(), min(budget, max(200, len(x) * 4)))
+            result['smooth'] = (x_smooth, make_interp_spline(x, y, k=3)(x_smooth))
+
+        # 线性拟合预测未来6小时
+        if self.predict_cb.isChecked() and len(full_x) >= 3:
+            coef = np.polyfit(full_x, full_y, 1)
+            x_pred = np.linspace(full_x.max(), full_x.max() + 0.25, 10)
+            result['pred'] = (x_pred, np.polyval(coef, x_pred))
+        return result
+
+    def _style_axes(self, ax):
+        ax.set_facecolor('#1e1e1e')
+        self.figure.patch.set_facecolor('#1e1e1e')
+        ax.set_title("梦幻西游物品价格趋势", fontsize=18, color='white', pad=20)
+        ax.set_ylabel("价格（万）", fontsize=14, color='white')
+        ax.set_xlabel("时间", fontsize=14, color='white')
+        ax.grid(True, alpha=0.2, color='gray')
+        ax.tick_params(colors='white')
+        for spine in ax.spines.values():
+            spine.set_color('#555')
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d %H:%M'))
+
+    def _plot_empty(self):
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+        ax.text(0.5, 0.5, "暂无数据\n快去世界频道喊话吧~", ha='center', va='center', fontsize=24, color='#888')
+        ax.axis('off')
+        self.canvas.draw()
+
     def plot_trend(self):
+        """只读取内存缓存，切换分组/平滑/预测不访问数据库"""
+        if self.live_cb.isChecked():
+            # 显示选项变化后实时模式需要重建坐标轴
+            self._live_items = None
+            self.update_live()
+            return
         try:
-            conn = sqlite3.connect("market_data.db")
-            df = pd.read_sql("SELECT name, price, timestamp FROM market_items ORDER BY timestamp", conn, parse_dates=['timestamp'])
-            conn.close()
+            items = self._select_items()
 
-            if df.empty:
-                self.figure.clear()
-                ax = self.figure.add_subplot(111)
-                ax.text(0.5, 0.5, "暂无数据\n快去世界频道喊话吧~", ha='center', va='center', fontsize=24, color='#888')
-                ax.axis('off')
+            if not items:
+                self._plot_empty()
+                return
+
+            self._clear_live()
+            self.figure.clear()
+            ax = self.figure.add_subplot(111)
+
+            budget = canvas_point_budget(self.canvas)
+            for i, item in enumerate(items):
+                color = self.COLORS[i % len(self.COLORS)]
+                series = self._prepare_series(item, budget)
+                x, y = series['x'], series['y']
+
+                if series['smooth'] is not None:
+                    ax.plot(*series['smooth'], '-', color=color, linewidth=2.5, label=series['label'])
+                    ax.scatter(x, y, color=color, s=20)
+                else:
+                    ax.plot(x, y, 'o-', color=color, linewidth=2.5, markersize=5, label=series['label'])
+
+                if series['pred'] is not None:
+                    ax.plot(*series['pred'], '--', color=color, alpha=0.6)
+
+            self._style_axes(ax)
+            ax.legend(facecolor='#2d2d2d', labelcolor='white')
+            self.figure.autofmt_xdate()
+
+            self.canvas.draw()
+        except Exception as e:
+            print(f"趋势图绘制出错: {e}")
+
+    # ---------- 实时模式：保留线条对象，只更新数据并用缓存背景局部重绘 ----------
+
+    LIVE_INTERVAL_MS = 3000
+
+    def _toggle_live(self):
+        if self.live_cb.isChecked():
+            self._live_items = None
+            self.refresh_trend()
+            self.live_timer.start(self.LIVE_INTERVAL_MS)
+        else:
+            self.live_timer.stop()
+            self._clear_live()
+            self.plot_trend()
+
+    def _clear_live(self):
+        self._live_items = None
+        self._live_artists = {}
+        self._live_legend = None
+        self._live_background = None
+
+    def _live_tick(self):
+        """定时读取新记录，有新数据时才重绘"""
+        if self.trend_service.refresh() or self._live_items is None:
+            self.update_live()
+
+    def update_live(self):
+        """更新实时趋势图：物品集合不变时只更新线条数据并局部重绘"""
+        try:
+            items = self._select_items()
+            if not items:
+                self._clear_live()
+                self._plot_empty()
+                return
+
+            budget = canvas_point_budget(self.canvas)
+            data = {item: self._prepare_series(item, budget) for item in items}
+            if items != self._live_items:
+                self._build_live_axes(items, data)
+                return
+
+            ax = self.figure.axes[0]
+            for item, series in data.items():
+                self._set_live_data(self._live_artists[item], series)
+            for text, item in zip(self._live_legend.get_texts(), items):
+                text.set_text(data[item]['label'])
+
+            if self._live_out_of_bounds(ax, data.values()) or self._live_background is None:
+                # 数据超出当前坐标范围时重新设定范围并完整重绘（draw_event 中会重新缓存背景）
+                self._set_live_limits(ax, data.values())
                 self.canvas.draw()
                 return
 
-            # 热门词典
-            hot_groups = {
-                "兽决": ["必杀","连击","偷袭","强力","感知","神佑","隐攻","幸存"],
-                "符": ["伤害符","力量符","体质符","魔力符","耐力符","敏捷符"],
-                "宝石": ["黑宝石","红玛瑙","太阳石","月亮石","舍利子","光芒石","翡翠石","星辉石"],
-                "书铁
+            self.canvas.restore_region(self._live_background)
+            self._draw_live_artists()
+            self.canvas.blit(self.figure.bbox)
+        except Exception as e:
+            print(f"实时趋势图更新出错: {e}")
+
+    def _build_live_axes(self, items: List[str], data: Dict[str, dict]):
+        """物品集合变化时重建坐标轴、线条和图例"""
+        self._clear_live()
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+        self._style_axes(ax)
+
+        for i, item in enumerate(items):
+            color = self.COLORS[i % len(self.COLORS)]
+            artists = {
+                'line': ax.plot([], [], '-', color=color, linewidth=2.5, label=data[item]['label'], animated=True)[0],
+                'points': ax.plot([], [], 'o', color=color, markersize=5, animated=True)[0],
+                'pred': ax.plot([], [], '--', color=color, alpha=0.6, animated=True)[0],
+            }
+            self._set_live_data(artists, data[item])
+            self._live_artists[item] = artists
+
+        self._live_legend = ax.legend(facecolor='#2d2d2d', labelcolor='white')
+        self._live_legend.set_animated(True)
+        self._set_live_limits(ax, data.values())
+        self.figure.autofmt_xdate()
+        self._live_items = list(items)
+        self.canvas.draw()
+
+    @staticmethod
+    def _set_live_data(artists: dict, series: dict):
+        if series['smooth'] is not None:
+            artists['line'].set_data(*series['smooth'])
+        else:
+            artists['line'].set_data(series['x'], series['y'])
+        artists['points'].set_data(series['x'], series['y'])
+        artists['pred'].set_data(*(series['pred'] if series['pred'] is not None else ([], [])))
+
+    @staticmethod
+    def _live_extent(data):
+        xs = [series['x'] for series in data] + [series['pred'][0] for series in data if series['pred'] is not None]
+        ys = [series['y'] for series in data] + [series['smooth'][1] for series in data if series['smooth'] is not None]
+        ys += [series['pred'][1] for series in data if series['pred'] is not None]
+        x = np.concatenate(xs)
+        y = np.concatenate(ys)
+        return x.min(), x.max(), y.min(), y.max()
+
+    def _set_live_limits(self, ax, data):
+        """设定坐标范围并留出余量，新数据在余量内时不需要完整重绘"""
+        x_min, x_max, y_min, y_max = self._live_extent(data)
+        x_pad = max((x_max - x_min) * 0.1, 1 / 24)
+        y_pad = max((y_max - y_min) * 0.1, 1.0)
+        ax.set_xlim(x_min, x_max + x_pad)
+        ax.set_ylim(y_min - y_pad, y_max + y_pad)
+
+    def _live_out_of_bounds(self, ax, data) -> bool:
+        x_min, x_max, y_min, y_max = self._live_extent(data)
+        left, right = ax.get_xlim()
+        bottom, top = ax.get_ylim()
+        return x_min < left or x_max > right or y_min < bottom or y_max > top
+
+    def _draw_live_artists(self):
+        ax = self.figure.axes[0]
+        for artists in self._live_artists.values():
+            for artist in artists.values():
+                ax.draw_artist(artist)
+        if self._live_legend is not None:
+            ax.draw_artist(self._live_legend)
+
+    def _on_canvas_draw(self, event):
+        """完整重绘（含窗口缩放）后重新缓存背景，并画上实时线条"""
+        if not self._live_artists:
+            return
+        self._live_background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_live_artists()
+
+
 # 测试代码
 if __name__ == "__main__":
     from PyQt6.QtWidgets import QApplication
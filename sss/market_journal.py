@@ -0,0 +1,126 @@
+"""
+市场数据日志
+每条价格记录、学习结果追加写入 JSONL 日志，定期压缩为快照（临时文件 + 原子替换），
+启动时先读快照，再重放快照之后的日志。
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+
+# 追加多少条日志后压缩一次快照
+JOURNAL_COMPACT_EVERY = 500
+
+
+def atomic_write_json(path: str, data, indent: Optional[int] = 2):
+    """先写临时文件再原子替换，写到一半崩溃也不会损坏原文件"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class MarketJournal:
+    """快照 + 追加日志
+
+    每条日志带递增的 seq，快照中记录已包含的最大 seq（journal_seq）。
+    压缩时先原子替换快照再清空日志，若两步之间崩溃，重放时会跳过快照已包含的日志。
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: Optional[str] = None,
+                 compact_every: int = JOURNAL_COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + "_journal.jsonl"
+        self.compact_every = compact_every
+        self.seq = 0
+        self.pending = 0  # 上次压缩后追加的条数
+        self._file = None
+
+    def load(self) -> Tuple[Dict, List[Dict]]:
+        """读取快照和快照之后的日志，返回 (快照, 待重放的日志列表)"""
+        snapshot: Dict = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f) or {}
+        snapshot_seq = int(snapshot.get('journal_seq', 0) or 0)
+        self.seq = snapshot_seq
+
+        events: List[Dict] = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 最后一行可能在写入时被中断，丢弃即可
+                        print(f"[MarketJournal] 跳过损坏的日志行 {line_no}")
+                        continue
+                    seq = event.get('seq', 0)
+                    if seq <= snapshot_seq:
+                        continue
+                    events.append(event)
+                    self.seq = max(self.seq, seq)
+        self.pending = len(events)
+        return snapshot, events
+
+    def assign_seq(self, event: Dict) -> int:
+        """为日志分配 seq（在界面线程调用，写盘交给 write_events）"""
+        self.seq += 1
+        event['seq'] = self.seq
+        self.pending += 1
+        return self.seq
+
+    def write_events(self, events: List[Dict]):
+        """把已分配 seq 的日志一次性追加写入（可在后台写线程调用）"""
+        if not events:
+            return
+        if self._file is None:
+            directory = os.path.dirname(self.journal_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+        self._file.flush()
+
+    def append(self, event: Dict) -> int:
+        """追加一条日志，返回分配的 seq"""
+        seq = self.assign_seq(event)
+        self.write_events([event])
+        return seq
+
+    def should_compact(self) -> bool:
+        return self.pending >= self.compact_every
+
+    def prepare_snapshot(self, snapshot: Dict) -> Dict:
+        """记录快照包含的最大 seq 并重置计数（在界面线程生成快照时调用）"""
+        snapshot['journal_seq'] = self.seq
+        self.pending = 0
+        return snapshot
+
+    def write_snapshot(self, snapshot: Dict):
+        """原子写入快照并清空日志（可在后台写线程调用）
+
+        快照之后分配 seq 的日志在写线程中排在快照之后，清空日志不会丢失它们。
+        """
+        atomic_write_json(self.snapshot_path, snapshot)
+        self.close()
+        with open(self.journal_path, 'w', encoding='utf-8'):
+            pass
+
+    def compact(self, snapshot: Dict):
+        """写入完整快照并清空日志"""
+        self.write_snapshot(self.prepare_snapshot(snapshot))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,586 @@
+"""
+市场分析界面的数据模型
+表格数据保存在模型中，刷新时只通知发生变化的行，视图不再逐格重建。
+"""
+
+import bisect
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from PyQt6.QtCore import QAbstractListModel, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt
+from PyQt6.QtGui import QColor
+from PyQt6.QtWidgets import QTreeWidget, QTreeWidgetItem
+
+
+def build_market_row(item_name: str, meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """由 market_data 中的一项计算表格行（没有任何价格时返回 None）"""
+    buy_prices = meta.get('buy')
+    sell_prices = meta.get('sell')
+    if not buy_prices and not sell_prices:
+        return None
+
+    min_buy = buy_prices.min if buy_prices else None
+    max_buy = buy_prices.max if buy_prices else None
+    min_sell = sell_prices.min if sell_prices else None
+    max_sell = sell_prices.max if sell_prices else None
+
+    # 计算利润空间（最低卖价 - 最高收价）
+    profit = None
+    if min_sell is not None and max_buy is not None:
+        profit = min_sell - max_buy
+    elif min_sell is not None and min_buy is not None:
+        profit = min_sell - min_buy
+
+    return {
+        'item': item_name,
+        'category': meta.get('category', '未分类'),
+        'subcategory': meta.get('subcategory', '未分类'),
+        'confidence': meta.get('confidence'),
+        'min_buy': min_buy,
+        'max_buy': max_buy,
+        'min_sell': min_sell,
+        'max_sell': max_sell,
+        'profit': profit,
+    }
+
+
+class MarketTableModel(QAbstractTableModel):
+    """市场价格汇总表模型
+
+    每个物品一行，sync() 与 market_data 比较后只对新增、删除、变化的行发出信号。
+    SORT_ROLE 返回原始数值供代理模型排序，没有价格的单元格按最小值处理。
+    """
+
+    HEADERS = ["物品名", "最低收价", "最高收价", "最低卖价", "最高卖价", "利润空间"]
+    VALUE_KEYS = (None, 'min_buy', 'max_buy', 'min_sell', 'max_sell', 'profit')
+    SORT_ROLE = Qt.ItemDataRole.UserRole
+    PROFIT_COLUMN = 5
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        key = self.VALUE_KEYS[column]
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return f"{row['item']} ({row['category']}/{row['subcategory']})"
+            value = row[key]
+            if column == self.PROFIT_COLUMN:
+                if value is None:
+                    return "-"
+                return f"{value:.1f} ✓" if value > 0 else f"{value:.1f}"
+            return f"{value:.1f}" if value else "-"
+        if role == self.SORT_ROLE:
+            if column == 0:
+                return row['item']
+            value = row[key]
+            return float('-inf') if value is None else float(value)
+        if role == Qt.ItemDataRole.ForegroundRole and column == self.PROFIT_COLUMN:
+            if row['profit'] and row['profit'] > 0:
+                return QColor(Qt.GlobalColor.green)
+        return None
+
+    def row_data(self, row: int) -> Dict[str, Any]:
+        return self._rows[row]
+
+    def row_for(self, item_name: str) -> Optional[Dict[str, Any]]:
+        pos = self._row_of.get(item_name)
+        return None if pos is None else self._rows[pos]
+
+    def sync(self, market_data: Dict[str, Dict[str, Any]]) -> Optional[Set[str]]:
+        """与 market_data 同步，返回发生变化（含新增、删除）的物品名；整体重置时返回 None"""
+        fresh: Dict[str, Dict[str, Any]] = {}
+        for item_name, meta in market_data.items():
+            row = build_market_row(item_name, meta)
+            if row is not None:
+                fresh[item_name] = row
+
+        stale = {name: pos for name, pos in self._row_of.items() if name not in fresh}
+        if stale and len(stale) * 2 > len(self._rows):
+            # 清空或导入数据时整体重置
+            self.beginResetModel()
+            self._rows = list(fresh.values())
+            self._row_of = {row['item']: pos for pos, row in enumerate(self._rows)}
+            self.endResetModel()
+            return None
+        for pos in sorted(stale.values(), reverse=True):
+            self.beginRemoveRows(QModelIndex(), pos, pos)
+            del self._rows[pos]
+            self.endRemoveRows()
+        if stale:
+            self._row_of = {row['item']: pos for pos, row in enumerate(self._rows)}
+
+        changed: Set[str] = set(stale)
+        last_column = len(self.HEADERS) - 1
+        added: List[Dict[str, Any]] = []
+        for item_name, row in fresh.items():
+            pos = self._row_of.get(item_name)
+            if pos is None:
+                added.append(row)
+            elif self._rows[pos] != row:
+                self._rows[pos] = row
+                self.dataChanged.emit(self.index(pos, 0), self.index(pos, last_column))
+                changed.add(item_name)
+
+        if added:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for offset, row in enumerate(added):
+                self._row_of[row['item']] = first + offset
+            self._rows.extend(added)
+            self.endInsertRows()
+            changed.update(row['item'] for row in added)
+        return changed
+
+
+class MarketFilterProxyModel(QSortFilterProxyModel):
+    """按分类、子分类和最低利润筛选市场表格，并按数值排序"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.category: Optional[str] = None
+        self.subcategory: Optional[str] = None
+        self.min_profit = 0.0
+        self.setSortRole(MarketTableModel.SORT_ROLE)
+        self.setDynamicSortFilter(True)
+
+    def set_filters(self, category: Optional[str], subcategory: Optional[str], min_profit: float) -> bool:
+        """更新筛选条件，条件未变化时不重新筛选"""
+        filters = (category, subcategory, min_profit or 0.0)
+        if filters == (self.category, self.subcategory, self.min_profit):
+            return False
+        self.category, self.subcategory, self.min_profit = filters
+        self.invalidateFilter()
+        return True
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        return self.accepts(self.sourceModel().row_data(source_row))
+
+    def accepts(self, row: Dict[str, Any]) -> bool:
+        """某一行是否满足当前筛选条件"""
+        if self.category and row['category'] != self.category:
+            return False
+        if self.subcategory and row['subcategory'] != self.subcategory:
+            return False
+        if self.min_profit and (row['profit'] is None or row['profit'] < self.min_profit):
+            return False
+        return True
+
+    def visible_rows(self) -> List[Dict[str, Any]]:
+        """按当前排序返回筛选后的行"""
+        source = self.sourceModel()
+        return [source.row_data(self.mapToSource(self.index(row, 0)).row()) for row in range(self.rowCount())]
+
+
+class RepositoryTableModel(QAbstractTableModel):
+    """物品趋势表模型
+
+    行按物品首次出现的顺序保存，upsert() 只替换传入的行并发出 dataChanged；
+    排序交给 QSortFilterProxyModel（dynamicSortFilter），变化的行由代理移动到排序位置。
+    """
+
+    HEADERS = [
+        "物品名",
+        "出现次数",
+        "最新价格(万)",
+        "今日均价(万)",
+        "昨日均价(万)",
+        "7日均价(万)",
+        "本次P10/中位/P90",
+        "今日P10/中位/P90",
+        "7日P10/中位/P90",
+        "趋势",
+    ]
+    KEYS = (None, 'count', 'latest', 'today_avg', 'yesterday_avg', 'week_avg',
+            'session_quantiles', 'today_quantiles', 'week_quantiles', 'trend')
+    SORT_ROLE = Qt.ItemDataRole.UserRole
+    COUNT_COLUMN = 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return f"{row['item']} ({row['category']}/{row['subcategory']})"
+            value = row[self.KEYS[column]]
+            if column == self.COUNT_COLUMN:
+                return str(value)
+            if isinstance(value, str):
+                return value
+            return f"{value:.1f}" if isinstance(value, (int, float)) else "-"
+        if role == self.SORT_ROLE:
+            if column == 0:
+                return row['item']
+            value = row[self.KEYS[column]]
+            if isinstance(value, str):
+                return value
+            return float('-inf') if value is None else float(value)
+        return None
+
+    def upsert(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """新增或替换若干行，返回变化的行数"""
+        changed = 0
+        last_column = len(self.HEADERS) - 1
+        added: List[Dict[str, Any]] = []
+        for row in rows:
+            pos = self._row_of.get(row['item'])
+            if pos is None:
+                added.append(row)
+            elif self._rows[pos] != row:
+                self._rows[pos] = row
+                self.dataChanged.emit(self.index(pos, 0), self.index(pos, last_column))
+                changed += 1
+        if added:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for offset, row in enumerate(added):
+                self._row_of[row['item']] = first + offset
+            self._rows.extend(added)
+            self.endInsertRows()
+            changed += len(added)
+        return changed
+
+    def reset(self, rows: Iterable[Dict[str, Any]] = ()):
+        """整体替换所有行（加载、导入、清空、跨天时使用）"""
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._row_of = {row['item']: pos for pos, row in enumerate(self._rows)}
+        self.endResetModel()
+
+
+class _GroupNode:
+    """分类树中的分类/子分类节点及其利润累计值"""
+
+    __slots__ = ("node", "count", "profit_sum", "profit_count", "children")
+
+    def __init__(self, node: QTreeWidgetItem):
+        self.node = node
+        self.count = 0
+        self.profit_sum = 0.0
+        self.profit_count = 0
+        self.children: Dict[str, "_GroupNode"] = {}
+
+    def add(self, profit: Optional[float], sign: int = 1):
+        self.count += sign
+        if profit is not None:
+            self.profit_sum += sign * profit
+            self.profit_count += sign
+
+    @property
+    def average(self) -> Optional[float]:
+        return self.profit_sum / self.profit_count if self.profit_count else None
+
+
+class CategoryTreeIndex:
+    """分类 → 子分类 → 物品 的增量分类树
+
+    节点常驻，按物品名索引；物品变化时只更新它自己的节点和所属的两级分组，
+    分组的均利润由累计和计算。用户折叠过的分组在重建后仍保持折叠。
+    """
+
+    def __init__(self, tree: QTreeWidget):
+        self.tree = tree
+        self._categories: Dict[str, _GroupNode] = {}
+        # 物品名 -> (分类, 子分类, 节点, 利润)
+        self._items: Dict[str, Tuple[str, str, QTreeWidgetItem, Optional[float]]] = {}
+        self._collapsed: Set[Tuple[str, ...]] = set()
+        tree.itemCollapsed.connect(lambda node: self._remember_expanded(node, False))
+        tree.itemExpanded.connect(lambda node: self._remember_expanded(node, True))
+
+    def _remember_expanded(self, node: QTreeWidgetItem, expanded: bool):
+        key = node.data(0, Qt.ItemDataRole.UserRole)
+        if not key:
+            return
+        if expanded:
+            self._collapsed.discard(key)
+        else:
+            self._collapsed.add(key)
+
+    def reset(self, rows: Iterable[Dict[str, Any]]):
+        """按给定的行重建整棵树（筛选条件变化、数据整体替换时使用）"""
+        self.tree.setUpdatesEnabled(False)
+        try:
+            self.tree.clear()
+            self._categories.clear()
+            self._items.clear()
+            self.update(rows)
+        finally:
+            self.tree.setUpdatesEnabled(True)
+
+    def update(self, rows: Iterable[Dict[str, Any]], removed: Iterable[str] = ()):
+        """新增/更新 rows 中的物品，移除 removed 中的物品"""
+        dirty: Set[_GroupNode] = set()
+        for item_name in removed:
+            self._detach(item_name, dirty)
+        for row in rows:
+            item_name = row['item']
+            category = row.get('category') or '未分类'
+            subcategory = row.get('subcategory') or '未分类'
+            profit = row.get('profit')
+            entry = self._items.get(item_name)
+            if entry is not None and (entry[0], entry[1]) != (category, subcategory):
+                self._detach(item_name, dirty)
+                entry = None
+
+            cat_group, sub_group = self._group(category, subcategory)
+            if entry is None:
+                node = QTreeWidgetItem()
+                sub_group.node.addChild(node)
+                cat_group.add(profit)
+                sub_group.add(profit)
+            else:
+                node, old_profit = entry[2], entry[3]
+                for group in (cat_group, sub_group):
+                    group.add(old_profit, -1)
+                    group.add(profit)
+            self._items[item_name] = (category, subcategory, node, profit)
+            self._set_item_text(node, row)
+            dirty.add(cat_group)
+            dirty.add(sub_group)
+
+        for group in dirty:
+            self._set_group_text(group)
+
+    def _group(self, category: str, subcategory: str) -> Tuple[_GroupNode, _GroupNode]:
+        cat_group = self._categories.get(category)
+        if cat_group is None:
+            cat_group = self._categories[category] = _GroupNode(QTreeWidgetItem())
+            cat_group.node.setData(0, Qt.ItemDataRole.UserRole, (category,))
+            pos = bisect.bisect_left(sorted(self._categories), category)
+            self.tree.insertTopLevelItem(pos, cat_group.node)
+            cat_group.node.setExpanded((category,) not in self._collapsed)
+        sub_group = cat_group.children.get(subcategory)
+        if sub_group is None:
+            sub_group = cat_group.children[subcategory] = _GroupNode(QTreeWidgetItem())
+            key = (category, subcategory)
+            sub_group.node.setData(0, Qt.ItemDataRole.UserRole, key)
+            pos = bisect.bisect_left(sorted(cat_group.children), subcategory)
+            cat_group.node.insertChild(pos, sub_group.node)
+            sub_group.node.setExpanded(key not in self._collapsed)
+        return cat_group, sub_group
+
+    def _detach(self, item_name: str, dirty: Set[_GroupNode]):
+        entry = self._items.pop(item_name, None)
+        if entry is None:
+            return
+        category, subcategory, node, profit = entry
+        cat_group = self._categories[category]
+        sub_group = cat_group.children[subcategory]
+        sub_group.node.removeChild(node)
+        cat_group.add(profit, -1)
+        sub_group.add(profit, -1)
+        if not sub_group.count:
+            cat_group.node.removeChild(sub_group.node)
+            del cat_group.children[subcategory]
+            dirty.discard(sub_group)
+        else:
+            dirty.add(sub_group)
+        if not cat_group.count:
+            self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(cat_group.node))
+            del self._categories[category]
+            dirty.discard(cat_group)
+        else:
+            dirty.add(cat_group)
+
+    @staticmethod
+    def _set_group_text(group: _GroupNode):
+        name = group.node.data(0, Qt.ItemDataRole.UserRole)[-1]
+        average = group.average
+        group.node.setText(0, f"{name} ({group.count})")
+        group.node.setText(1, f"均利润 {average:.1f}万" if average is not None else "暂无利润数据")
+
+    @staticmethod
+    def _set_item_text(node: QTreeWidgetItem, row: Dict[str, Any]):
+        profit = row.get('profit')
+        confidence = row.get('confidence')
+        profit_text = f"{profit:.1f}万" if profit is not None else "-"
+        confidence_text = f"{confidence:.2f}" if isinstance(confidence, (float, int)) else "-"
+        node.setText(0, row['item'])
+        node.setText(1, (
+            f"收 {row['min_buy'] or '-'}~{row['max_buy'] or '-'} | "
+            f"卖 {row['min_sell'] or '-'}~{row['max_sell'] or '-'} | "
+            f"利润 {profit_text} | 置信度 {confidence_text}"
+        ))
+
+    def summary_text(self) -> str:
+        """各分类均利润汇总"""
+        if not self._categories:
+            return "分类统计：暂无数据"
+        parts = []
+        for category in sorted(self._categories):
+            average = self._categories[category].average
+            parts.append(f"{category}均利润{average:.1f}万" if average is not None else f"{category}暂无利润")
+        return "分类统计：" + "； ".join(parts)
+
+
+# 消息日志在内存中保留的条数
+MESSAGE_LOG_LIMIT = 5000
+
+
+class RingBuffer:
+    """定长环形缓冲区（预分配列表 + 头部偏移）
+
+    接口与 deque(maxlen=...) 相同（append / popleft / extend / clear / 迭代），
+    但按下标读写是 O(1)；deque 访问中间位置需要逐块查找，视图逐行取数据时会退化为 O(n)。
+    满了以后 append 覆盖最旧的一条。
+    """
+
+    __slots__ = ("maxlen", "_items", "_head", "_size")
+
+    def __init__(self, maxlen: int, items: Iterable[Any] = ()):
+        self.maxlen = maxlen
+        self._items: List[Any] = [None] * maxlen
+        self._head = 0
+        self._size = 0
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _slot(self, index: int) -> int:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("RingBuffer index out of range")
+        return (self._head + index) % self.maxlen
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._items[self._slot(i)] for i in range(*index.indices(self._size))]
+        return self._items[self._slot(index)]
+
+    def __setitem__(self, index: int, value: Any):
+        self._items[self._slot(index)] = value
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(self._size):
+            yield self._items[(self._head + i) % self.maxlen]
+
+    def __reversed__(self) -> Iterator[Any]:
+        for i in range(self._size - 1, -1, -1):
+            yield self._items[(self._head + i) % self.maxlen]
+
+    def append(self, item: Any):
+        if self._size == self.maxlen:
+            self._items[self._head] = item
+            self._head = (self._head + 1) % self.maxlen
+        else:
+            self._items[(self._head + self._size) % self.maxlen] = item
+            self._size += 1
+
+    def extend(self, items: Iterable[Any]):
+        for item in items:
+            self.append(item)
+
+    def popleft(self) -> Any:
+        if not self._size:
+            raise IndexError("pop from an empty RingBuffer")
+        item = self._items[self._head]
+        self._items[self._head] = None
+        self._head = (self._head + 1) % self.maxlen
+        self._size -= 1
+        return item
+
+    def clear(self):
+        self._items = [None] * self.maxlen
+        self._head = 0
+        self._size = 0
+
+    def __repr__(self) -> str:
+        return f"RingBuffer({list(self)!r}, maxlen={self.maxlen})"
+
+
+class MessageLogModel(QAbstractListModel):
+    """识别消息日志（环形缓冲区）
+
+    消息保存在定长 RingBuffer 中，追加时只在末尾插入一行，超出容量时从开头删除一行；
+    按行号取消息是 O(1)，显示文本在 data() 中按需格式化，只有视图可见的行才会被格式化。
+    messages 即市场分析页的 raw_messages，整体替换时用 reset() 原地更新。
+    """
+
+    def __init__(self, limit: int = MESSAGE_LOG_LIMIT, parent=None):
+        super().__init__(parent)
+        self.messages = RingBuffer(limit)
+        self.appended = 0  # 累计追加条数（容量满后 len 不再增长，用它统计新增）
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.messages)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.format_message(self.messages[index.row()])
+
+    @staticmethod
+    def format_message(msg: Dict[str, Any]) -> str:
+        category = msg.get('category', '-')
+        subcategory = msg.get('subcategory', '-')
+        confidence = msg.get('confidence')
+        confidence_text = f"{confidence:.2f}" if isinstance(confidence, (int, float)) else "-"
+        return (
+            f"[{msg['time']}] [{category}/{subcategory}] {msg['type']} {msg['item']} "
+            f"{msg['price']:.1f}万 (置信度 {confidence_text}) - {msg['text'][:30]}"
+        )
+
+    def append(self, msg: Dict[str, Any]):
+        if len(self.messages) == self.messages.maxlen:
+            self.beginRemoveRows(QModelIndex(), 0, 0)
+            self.messages.popleft()
+            self.endRemoveRows()
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append(msg)
+        self.endInsertRows()
+        self.appended += 1
+
+    def reset(self, messages: Iterable[Dict[str, Any]] = ()):
+        """整体替换消息（加载、导入、清空时使用）"""
+        self.beginResetModel()
+        self.messages.clear()
+        self.messages.extend(msg for msg in messages if isinstance(msg, dict))
+        self.endResetModel()
+
+    def message_changed(self, row: int):
+        """第 row 条消息被修改（学习、标记状态）后只通知这一行重绘"""
+        if 0 <= row < len(self.messages):
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def recent(self, count: int) -> List[Dict[str, Any]]:
+        """最近 count 条消息（从旧到新）"""
+        return self.messages[max(len(self.messages) - count, 0):]
@@ -0,0 +1,331 @@
+"""
+市场价格统计工具
+与界面无关的价格数据结构，供市场分析界面使用
+"""
+
+import math
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+# 每个物品每种交易类型保留的最近价格条数
+PRICE_SERIES_CAPACITY = 200
+
+# 分位数草图的相对误差（1%）
+QUANTILE_RELATIVE_ACCURACY = 0.01
+
+# 每日统计保留的天数
+DAILY_RETENTION_DAYS = 60
+
+
+class PriceSeries:
+    """固定容量的价格环形缓冲区
+
+    底层使用 array('d') 存储，写满后覆盖最旧的价格；
+    窗口内的最小值/最大值用单调队列维护，均值用滚动求和维护，
+    append 和读取统计都是 O(1)（均摊）。
+    """
+
+    __slots__ = ("capacity", "_buf", "_start", "_size", "_seq", "_sum", "_min_q", "_max_q")
+
+    def __init__(self, values: Optional[Iterable[float]] = None, capacity: int = PRICE_SERIES_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("capacity 必须大于 0")
+        self.capacity = capacity
+        self._buf = array('d', bytes(8 * capacity))
+        self._start = 0
+        self._size = 0
+        self._seq = 0  # 累计写入条数，用于判断单调队列中的元素是否已被覆盖
+        self._sum = 0.0
+        self._min_q: deque = deque()  # (seq, value)，value 单调递增
+        self._max_q: deque = deque()  # (seq, value)，value 单调递减
+        if values:
+            self.extend(values)
+
+    def append(self, value: float):
+        value = float(value)
+        if self._size == self.capacity:
+            self._sum -= self._buf[self._start]
+            self._start = (self._start + 1) % self.capacity
+            self._size -= 1
+        pos = (self._start + self._size) % self.capacity
+        self._buf[pos] = value
+        self._size += 1
+        if pos == 0:
+            # 每绕一圈重新求和一次，避免浮点误差累积
+            self._sum = sum(self)
+        else:
+            self._sum += value
+
+        seq = self._seq
+        self._seq += 1
+        while self._min_q and self._min_q[-1][1] >= value:
+            self._min_q.pop()
+        self._min_q.append((seq, value))
+        while self._max_q and self._max_q[-1][1] <= value:
+            self._max_q.pop()
+        self._max_q.append((seq, value))
+
+        oldest_seq = self._seq - self._size
+        while self._min_q[0][0] < oldest_seq:
+            self._min_q.popleft()
+        while self._max_q[0][0] < oldest_seq:
+            self._max_q.popleft()
+
+    def extend(self, values: Iterable[float]):
+        for value in values:
+            self.append(value)
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+        self._sum = 0.0
+        self._min_q.clear()
+        self._max_q.clear()
+
+    @property
+    def min(self) -> Optional[float]:
+        return self._min_q[0][1] if self._size else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return self._max_q[0][1] if self._size else None
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._sum / self._size if self._size else None
+
+    @property
+    def latest(self) -> Optional[float]:
+        if not self._size:
+            return None
+        return self._buf[(self._start + self._size - 1) % self.capacity]
+
+    def to_list(self) -> List[float]:
+        """按时间顺序（旧 -> 新）导出，用于保存到 JSON"""
+        return list(self)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[float]:
+        for i in range(self._size):
+            yield self._buf[(self._start + i) % self.capacity]
+
+    def __repr__(self) -> str:
+        return f"PriceSeries(len={self._size}, capacity={self.capacity})"
+
+
+class QuantileSketch:
+    """流式分位数草图（对数分桶）
+
+    每个价格落入宽度按比例增长的桶中，add 为 O(1)，内存只与价格跨度有关；
+    估计的分位数相对误差不超过 alpha。与 P² 估计器不同，草图之间可以直接合并，
+    因此可以按天保存，再合并出任意天数窗口的分位数。
+    只统计正数价格（价格为 0 表示喊话中没有报价）。
+    """
+
+    __slots__ = ("alpha", "_gamma", "_log_gamma", "buckets", "count", "min", "max")
+
+    def __init__(self, alpha: float = QUANTILE_RELATIVE_ACCURACY):
+        self.alpha = alpha
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float, weight: int = 1):
+        if value is None or value <= 0:
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + weight
+        self.count += weight
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: Optional["QuantileSketch"]):
+        if not other or not other.count:
+            return
+        if other.alpha != self.alpha:
+            raise ValueError("只能合并相同精度的分位数草图")
+        for index, weight in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + weight
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @classmethod
+    def merged(cls, sketches: Iterable[Optional["QuantileSketch"]]) -> "QuantileSketch":
+        result = cls()
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        """返回第 q 分位数的估计值（0 <= q <= 1），没有数据时返回 None"""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def median(self) -> Optional[float]:
+        return self.quantile(0.5)
+
+    def to_dict(self) -> Dict:
+        """导出为可写入 JSON 的字典"""
+        return {
+            'alpha': self.alpha,
+            'buckets': {str(k): v for k, v in self.buckets.items()},
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QuantileSketch":
+        sketch = cls(data.get('alpha', QUANTILE_RELATIVE_ACCURACY))
+        sketch.buckets = {int(k): int(v) for k, v in (data.get('buckets') or {}).items()}
+        sketch.count = int(data.get('count', sum(sketch.buckets.values())))
+        sketch.min = data.get('min')
+        sketch.max = data.get('max')
+        return sketch
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __repr__(self) -> str:
+        return f"QuantileSketch(count={self.count}, buckets={len(self.buckets)})"
+
+
+class DailyAggregates:
+    """按天、按交易类型的滚动统计（条数/总和/最小/最大）
+
+    不保存每条价格，每天每种交易类型只占一个 [count, sum, min, max]，
+    读取任一天或几天的均值都只需查表，与当天记录条数无关。
+    日期按时间顺序存放在 OrderedDict 中，只在出现新的一天时从最旧一端淘汰过期日期。
+    """
+
+    __slots__ = ("days", "retention_days")
+
+    TRADE_TYPES = ('buy', 'sell')
+
+    def __init__(self, retention_days: int = DAILY_RETENTION_DAYS):
+        self.retention_days = retention_days
+        # {日期: {交易类型: [count, sum, min, max]}}，日期从旧到新
+        self.days: "OrderedDict[str, Dict[str, List[float]]]" = OrderedDict()
+
+    def add(self, date_key: str, trade_type: str, price: float, count: int = 1):
+        entry = self.days.get(date_key)
+        if entry is None:
+            entry = self._new_day(date_key)
+        stats = entry.get(trade_type)
+        if stats is None:
+            entry[trade_type] = [count, price * count, price, price]
+            return
+        stats[0] += count
+        stats[1] += price * count
+        if price < stats[2]:
+            stats[2] = price
+        if price > stats[3]:
+            stats[3] = price
+
+    def _new_day(self, date_key: str) -> Dict[str, List[float]]:
+        entry: Dict[str, List[float]] = {}
+        out_of_order = bool(self.days) and date_key < next(reversed(self.days))
+        self.days[date_key] = entry
+        if out_of_order:
+            # 补录较早的日期（很少见），重新排序
+            self.days = OrderedDict(sorted(self.days.items()))
+        else:
+            self.expire(date_key)
+        return entry
+
+    def expire(self, today_key: str):
+        """淘汰比 today_key 早 retention_days 天以上的日期"""
+        cutoff = (datetime.strptime(today_key, "%Y-%m-%d") - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        while self.days:
+            oldest = next(iter(self.days))
+            if oldest >= cutoff:
+                break
+            self.days.popitem(last=False)
+
+    def stats(self, date_key: str, trade_type: Optional[str] = None) -> Optional[List[float]]:
+        """返回某天的 [count, sum, min, max]（不指定交易类型时合并收购和出售）"""
+        entry = self.days.get(date_key)
+        if not entry:
+            return None
+        if trade_type:
+            return entry.get(trade_type)
+        merged = None
+        for stats in entry.values():
+            if merged is None:
+                merged = list(stats)
+            else:
+                merged[0] += stats[0]
+                merged[1] += stats[1]
+                merged[2] = min(merged[2], stats[2])
+                merged[3] = max(merged[3], stats[3])
+        return merged
+
+    def average(self, date_keys: Iterable[str], trade_type: Optional[str] = None) -> Optional[float]:
+        """若干天的平均价格，没有数据时返回 None"""
+        count = 0
+        total = 0.0
+        for key in date_keys:
+            stats = self.stats(key, trade_type)
+            if stats:
+                count += stats[0]
+                total += stats[1]
+        return total / count if count else None
+
+    def to_dict(self) -> Dict:
+        """导出为可写入 JSON 的字典"""
+        return {
+            day: {
+                trade_type: {'count': stats[0], 'sum': stats[1], 'min': stats[2], 'max': stats[3]}
+                for trade_type, stats in entry.items()
+            }
+            for day, entry in self.days.items()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, retention_days: int = DAILY_RETENTION_DAYS) -> "DailyAggregates":
+        """从 JSON 数据恢复，兼容旧格式 {日期: {'buy': [价格...], 'sell': [价格...]}}"""
+        aggregates = cls(retention_days)
+        for day in sorted(data or {}):
+            entry = data[day]
+            if not isinstance(entry, dict):
+                continue
+            restored: Dict[str, List[float]] = {}
+            for trade_type, value in entry.items():
+                if isinstance(value, dict) and value.get('count'):
+                    restored[trade_type] = [value['count'], value['sum'], value['min'], value['max']]
+                elif isinstance(value, list):
+                    prices = [p for p in value if isinstance(p, (int, float))]
+                    if prices:
+                        restored[trade_type] = [len(prices), float(sum(prices)), min(prices), max(prices)]
+            aggregates.days[day] = restored
+        return aggregates
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __repr__(self) -> str:
+        return f"DailyAggregates(days={len(self.days)})"
@@ -0,0 +1,1019 @@
+"""
+市场数据存储
+market_data.db 是市场分析界面、市场分析 V2 和价格趋势图共用的唯一数据存储；
+本模块不依赖界面，写入统一通过 MarketStoreWriter 在后台线程完成。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from write_behind import WriteBehindQueue
+
+try:
+    import ijson  # 可选：流式解析大 JSON 文件
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+# 默认数据库路径（相对于运行目录，与历史版本保持一致）
+DEFAULT_DB_PATH = "market_data.db"
+
+
+class MarketDatabase:
+    """市场数据库管理类"""
+    
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.conn = None
+        self._init_database()
+    
+    def _init_database(self):
+        """初始化数据库"""
+        self.conn = sqlite3.connect(self.db_path)
+        cursor = self.conn.cursor()
+        
+        # 新建的数据库启用增量回收（对已有表的数据库不生效，需在整理时 VACUUM 一次才会切换）
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL 模式下读写互不阻塞；NORMAL 只在检查点时 fsync，WAL 下仍不会损坏数据库
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        
+        # 创建表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS market_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                item_name TEXT NOT NULL,
+                standard_name TEXT NOT NULL,
+                price REAL NOT NULL,
+                trade_type TEXT NOT NULL,
+                category TEXT NOT NULL,
+                subcategory TEXT,
+                raw_name TEXT,
+                full_text TEXT,
+                timestamp INTEGER NOT NULL,  -- epoch 毫秒（本地时间对应的时刻）
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER NOT NULL
+            )
+        """)
+        self.conn.commit()
+        
+        # 旧数据库先升级结构再建索引
+        self._migrate_schema()
+        
+        # 覆盖索引：按物品查时间范围内的价格只读索引，不回表
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_item_time_price 
+            ON market_records(standard_name, timestamp, trade_type, price)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_timestamp 
+            ON market_records(timestamp)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_category 
+            ON market_records(category)
+        """)
+        
+        # 预聚合表：按物品/交易类型/时间桶的 OHLC（bucket_start 为本地整点/零点的 epoch 毫秒）
+        for table in self.ROLLUP_TABLES.values():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    standard_name TEXT NOT NULL,
+                    trade_type TEXT NOT NULL,
+                    bucket_start INTEGER NOT NULL,
+                    open REAL NOT NULL,
+                    high REAL NOT NULL,
+                    low REAL NOT NULL,
+                    close REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    sum REAL NOT NULL,
+                    open_ts INTEGER NOT NULL,
+                    close_ts INTEGER NOT NULL,
+                    PRIMARY KEY (standard_name, trade_type, bucket_start)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{table}_bucket 
+                ON {table}(bucket_start)
+            """)
+        # 记录已聚合到的 market_records.id
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS market_rollup_state (
+                name TEXT PRIMARY KEY,
+                last_record_id INTEGER NOT NULL
+            )
+        """)
+        # 数据整理状态（上次 VACUUM 时间等，epoch 毫秒）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS maintenance_state (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        
+        self.conn.commit()
+        
+        # 补齐旧数据库中尚未聚合的记录
+        self.catch_up_rollups()
+    
+    # 1: timestamp 为 datetime 文本；2: timestamp 为 epoch 毫秒整数
+    SCHEMA_VERSION = 2
+    
+    MIGRATION_BATCH = 5000
+    
+    def _get_schema_version(self) -> int:
+        row = self.conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        return row[0] if row and row[0] is not None else 1
+    
+    def _set_schema_version(self, version: int):
+        with self.conn:
+            self.conn.execute("DELETE FROM schema_version")
+            self.conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+    
+    def _migrate_schema(self):
+        """按版本号依次升级旧数据库"""
+        version = self._get_schema_version()
+        if version >= self.SCHEMA_VERSION:
+            return
+        if version < 2:
+            self._migrate_epoch_timestamps()
+        self._set_schema_version(self.SCHEMA_VERSION)
+        print(f"[MarketDatabase] 数据库结构已从版本 {version} 升级到 {self.SCHEMA_VERSION}")
+    
+    def _migrate_epoch_timestamps(self):
+        """版本 2：datetime 文本时间戳转换为 epoch 毫秒
+        
+        timestamp 列为数值亲和类型，可以原地改写为整数，无需重建表；
+        按 id 分批提交，避免长时间锁库。中途中断后重新运行会跳过已转换的行。
+        """
+        converted = 0
+        last_id = 0
+        while True:
+            rows = self.conn.execute("""
+                SELECT id, timestamp, created_at FROM market_records
+                WHERE id > ? AND typeof(timestamp) = 'text'
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, self.MIGRATION_BATCH)).fetchall()
+            if not rows:
+                break
+            updates = []
+            for record_id, timestamp, created_at in rows:
+                ts_ms = self._to_epoch_ms(timestamp)
+                if ts_ms is None and created_at:
+                    # created_at 为 SQLite 的 UTC 时间
+                    try:
+                        created = datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc)
+                        ts_ms = int(created.timestamp() * 1000)
+                    except ValueError:
+                        ts_ms = None
+                updates.append((ts_ms or 0, record_id))
+            with self.conn:
+                self.conn.executemany("UPDATE market_records SET timestamp = ? WHERE id = ?", updates)
+            last_id = rows[-1][0]
+            converted += len(rows)
+        # 旧的 (standard_name, timestamp) 索引被覆盖索引取代
+        with self.conn:
+            self.conn.execute("DROP INDEX IF EXISTS idx_item_timestamp")
+        if converted:
+            print(f"[MarketDatabase] 已将 {converted} 条记录的时间戳转换为 epoch 毫秒")
+    
+    ROLLUP_TABLES = {
+        'hour': 'market_rollup_hourly',
+        'day': 'market_rollup_daily',
+    }
+    
+    # 同一时间桶的多条记录合并：open/close 取时间最早/最晚的价格
+    ROLLUP_UPSERT_SQL = """
+        INSERT INTO {table} 
+        (standard_name, trade_type, bucket_start, open, high, low, close, 
+         count, sum, open_ts, close_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(standard_name, trade_type, bucket_start) DO UPDATE SET
+            open = CASE WHEN excluded.open_ts < open_ts THEN excluded.open ELSE open END,
+            close = CASE WHEN excluded.close_ts >= close_ts THEN excluded.close ELSE close END,
+            high = MAX(high, excluded.high),
+            low = MIN(low, excluded.low),
+            count = count + excluded.count,
+            sum = sum + excluded.sum,
+            open_ts = MIN(open_ts, excluded.open_ts),
+            close_ts = MAX(close_ts, excluded.close_ts)
+    """
+    
+    ROLLUP_CATCH_UP_BATCH = 5000
+    
+    INSERT_SQL = """
+        INSERT INTO market_records 
+        (item_name, standard_name, price, trade_type, category, subcategory, 
+         raw_name, full_text, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    
+    @staticmethod
+    def _record_to_row(item_dict: dict) -> tuple:
+        """将解析结果转换为 market_records 的一行
+        
+        category 为 "大类-小类" 格式；也可以直接给出 subcategory。
+        """
+        category = item_dict.get('category') or ''
+        if 'subcategory' in item_dict:
+            subcategory = item_dict.get('subcategory') or ''
+        else:
+            category, _, subcategory = category.partition('-')
+        return (
+            item_dict.get('name'),
+            item_dict.get('name'),
+            item_dict.get('price'),
+            item_dict.get('trade_type'),
+            category,
+            subcategory,
+            item_dict.get('raw_name'),
+            item_dict.get('full_text'),
+            MarketDatabase._to_epoch_ms(item_dict.get('timestamp') or datetime.now())
+        )
+    
+    def insert_record(self, item_dict: dict) -> int:
+        """插入记录，返回新记录的 id"""
+        return self.insert_many([item_dict])[0]
+    
+    def insert_many(self, items: List[dict]) -> List[int]:
+        """在一个事务中批量插入记录并更新预聚合表，返回新记录的 id 列表（按输入顺序）"""
+        rows = [self._record_to_row(item) for item in items]
+        if not rows:
+            return []
+        with self.conn:
+            self.conn.executemany(self.INSERT_SQL, rows)
+            # 同一事务内 AUTOINCREMENT 分配的 id 是连续的
+            last_id = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            ids = list(range(last_id - len(rows) + 1, last_id + 1))
+            # 每日汇总导入的记录带 count/min/max，预聚合时按原始条数累加
+            self._apply_rollups(
+                (record_id, row[1], row[3], row[2], row[8],
+                 item.get('count') or 1,
+                 row[2] if item.get('min') is None else item['min'],
+                 row[2] if item.get('max') is None else item['max'])
+                for record_id, row, item in zip(ids, rows, items)
+            )
+        return ids
+    
+    def record_exists(self, item_dict: dict) -> bool:
+        """数据库中是否已有同一物品、时间、交易类型和价格的记录（时间允许 1 毫秒的取整误差）"""
+        row = self._record_to_row(item_dict)
+        return self.conn.execute("""
+            SELECT 1 FROM market_records
+            WHERE standard_name = ? AND timestamp BETWEEN ? AND ? AND trade_type = ? AND price = ?
+            LIMIT 1
+        """, (row[1], row[8] - 1, row[8] + 1, row[3], row[2])).fetchone() is not None
+    
+    @staticmethod
+    def _to_epoch_ms(value) -> Optional[int]:
+        """将 datetime / ISO 字符串 / epoch 数值统一转换为 epoch 毫秒"""
+        if isinstance(value, datetime):
+            return int(value.timestamp() * 1000)
+        if isinstance(value, (int, float)):
+            # 小于 1e11 视为秒
+            return int(value * 1000) if value < 1e11 else int(value)
+        if isinstance(value, str) and value:
+            try:
+                return int(datetime.fromisoformat(value).timestamp() * 1000)
+            except ValueError:
+                return None
+        return None
+    
+    @staticmethod
+    def _bucket_start(ts_ms: int, granularity: str) -> int:
+        """按本地时间取整点（hour）或零点（day）"""
+        dt = datetime.fromtimestamp(ts_ms / 1000)
+        if granularity == 'day':
+            dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        else:
+            dt = dt.replace(minute=0, second=0, microsecond=0)
+        return int(dt.timestamp() * 1000)
+    
+    def _apply_rollups(self, records):
+        """把 (id, standard_name, trade_type, price, timestamp[, count, low, high]) 记录累加到预聚合表
+        
+        需在事务中调用；价格为 0（未报价）的记录不参与聚合。
+        带 count/low/high 的记录代表 count 条均价为 price 的价格（每日汇总导入）。
+        """
+        buckets: Dict[tuple, list] = {}
+        last_id = None
+        for record in records:
+            record_id, name, trade_type, price, timestamp = record[:5]
+            count, low, high = record[5:8] if len(record) > 5 else (1, price, price)
+            last_id = record_id if last_id is None else max(last_id, record_id)
+            if not price or price <= 0:
+                continue
+            ts_ms = self._to_epoch_ms(timestamp)
+            if ts_ms is None:
+                continue
+            for granularity, table in self.ROLLUP_TABLES.items():
+                key = (table, name, trade_type, self._bucket_start(ts_ms, granularity))
+                agg = buckets.get(key)
+                if agg is None:
+                    buckets[key] = [price, high, low, price, count, price * count, ts_ms, ts_ms]
+                    continue
+                if ts_ms < agg[6]:
+                    agg[0], agg[6] = price, ts_ms
+                if ts_ms >= agg[7]:
+                    agg[3], agg[7] = price, ts_ms
+                agg[1] = max(agg[1], high)
+                agg[2] = min(agg[2], low)
+                agg[4] += count
+                agg[5] += price * count
+        
+        for table in self.ROLLUP_TABLES.values():
+            params = [
+                (name, trade_type, bucket, *agg)
+                for (key_table, name, trade_type, bucket), agg in buckets.items()
+                if key_table == table
+            ]
+            if params:
+                self.conn.executemany(self.ROLLUP_UPSERT_SQL.format(table=table), params)
+        
+        if last_id is not None:
+            self.conn.execute("""
+                INSERT INTO market_rollup_state (name, last_record_id) VALUES ('market_records', ?)
+                ON CONFLICT(name) DO UPDATE SET last_record_id = MAX(last_record_id, excluded.last_record_id)
+            """, (last_id,))
+    
+    def catch_up_rollups(self) -> int:
+        """把尚未聚合的历史记录分批补进预聚合表，返回处理的记录数"""
+        row = self.conn.execute(
+            "SELECT last_record_id FROM market_rollup_state WHERE name = 'market_records'"
+        ).fetchone()
+        last_id = row[0] if row else 0
+        processed = 0
+        while True:
+            records = self.conn.execute("""
+                SELECT id, standard_name, trade_type, price, timestamp
+                FROM market_records
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, self.ROLLUP_CATCH_UP_BATCH)).fetchall()
+            if not records:
+                break
+            with self.conn:
+                self._apply_rollups(records)
+            last_id = records[-1][0]
+            processed += len(records)
+        if processed:
+            print(f"[MarketDatabase] 已补齐 {processed} 条记录的预聚合数据")
+        return processed
+    
+    def query_by_item(self, item_name: str, days: int = 7) -> List[tuple]:
+        """查询物品历史 (timestamp, price, trade_type)，timestamp 为 epoch 毫秒
+        
+        只读取覆盖索引 idx_item_time_price，不回表；需要原文时用 query_texts_by_item。
+        """
+        cursor = self.conn.cursor()
+        end_ms = self._to_epoch_ms(datetime.now())
+        start_ms = end_ms - days * 86400 * 1000
+        
+        cursor.execute("""
+            SELECT timestamp, price, trade_type
+            FROM market_records
+            WHERE standard_name = ? AND timestamp BETWEEN ? AND ?
+            ORDER BY timestamp ASC
+        """, (item_name, start_ms, end_ms))
+        
+        return cursor.fetchall()
+    
+    def query_texts_by_item(self, item_name: str, days: int = 7) -> List[tuple]:
+        """查询物品历史记录的原文 (timestamp, full_text)（需要回表，只在查看原文时使用）"""
+        end_ms = self._to_epoch_ms(datetime.now())
+        start_ms = end_ms - days * 86400 * 1000
+        return self.conn.execute("""
+            SELECT timestamp, full_text
+            FROM market_records
+            WHERE standard_name = ? AND timestamp BETWEEN ? AND ?
+            ORDER BY timestamp ASC
+        """, (item_name, start_ms, end_ms)).fetchall()
+    
+    def _rollup_window(self, days: int):
+        """返回统计窗口使用的预聚合表和起始桶（31天内按小时，更长按天）"""
+        granularity = 'hour' if days <= 31 else 'day'
+        start_ms = self._to_epoch_ms(datetime.now() - timedelta(days=days))
+        return self.ROLLUP_TABLES[granularity], self._bucket_start(start_ms, granularity)
+    
+    def get_item_statistics(self, item_name: str, days: int = 7) -> dict:
+        """获取物品统计信息（读取预聚合表，不扫描原始记录）"""
+        table, start_bucket = self._rollup_window(days)
+        row = self.conn.execute(f"""
+            SELECT SUM(count), MIN(low), MAX(high), SUM(sum)
+            FROM {table}
+            WHERE standard_name = ? AND bucket_start >= ?
+        """, (item_name, start_bucket)).fetchone()
+        if not row or not row[0]:
+            return {}
+        
+        latest = self.conn.execute(f"""
+            SELECT close FROM {table}
+            WHERE standard_name = ? AND bucket_start >= ?
+            ORDER BY close_ts DESC
+            LIMIT 1
+        """, (item_name, start_bucket)).fetchone()
+        return {
+            'count': row[0],
+            'min_price': row[1],
+            'max_price': row[2],
+            'avg_price': row[3] / row[0],
+            'latest_price': latest[0] if latest else 0
+        }
+    
+    def get_item_ohlc(self, item_name: str, days: int = 30, granularity: str = 'day',
+                      trade_type: Optional[str] = None) -> List[dict]:
+        """获取物品的 OHLC 趋势数据（granularity: 'hour' 或 'day'）"""
+        table = self.ROLLUP_TABLES[granularity]
+        start_bucket = self._bucket_start(
+            self._to_epoch_ms(datetime.now() - timedelta(days=days)), granularity
+        )
+        sql = f"""
+            SELECT bucket_start, trade_type, open, high, low, close, count, sum
+            FROM {table}
+            WHERE standard_name = ? AND bucket_start >= ?
+        """
+        params = [item_name, start_bucket]
+        if trade_type:
+            sql += " AND trade_type = ?"
+            params.append(trade_type)
+        sql += " ORDER BY bucket_start, trade_type"
+        
+        return [
+            {
+                'bucket_start': row[0],
+                'trade_type': row[1],
+                'open': row[2],
+                'high': row[3],
+                'low': row[4],
+                'close': row[5],
+                'count': row[6],
+                'avg_price': row[7] / row[6] if row[6] else None,
+            }
+            for row in self.conn.execute(sql, params)
+        ]
+    
+    def get_all_items_stats(self, days: int = 7) -> List[dict]:
+        """获取所有物品的统计信息（读取预聚合表）"""
+        cursor = self.conn.cursor()
+        table, start_bucket = self._rollup_window(days)
+        
+        cursor.execute(f"""
+            SELECT standard_name, SUM(count) as count,
+                   MIN(low) as min_price, MAX(high) as max_price,
+                   SUM(sum) / SUM(count) as avg_price
+            FROM {table}
+            WHERE bucket_start >= ?
+            GROUP BY standard_name
+            ORDER BY count DESC
+        """, (start_bucket,))
+        
+        results = []
+        for row in cursor.fetchall():
+            results.append({
+                'name': row[0],
+                'count': row[1],
+                'min_price': row[2],
+                'max_price': row[3],
+                'avg_price': row[4]
+            })
+        
+        return results
+    
+    # 分级保留：原始记录保留 N 天，小时聚合保留 M 个月，日聚合永久保留
+    RAW_RETENTION_DAYS = 90
+    HOURLY_RETENTION_MONTHS = 12
+    # 每批删除的行数（每批单独提交，避免长时间锁库）
+    RETENTION_BATCH = 2000
+    # 每次增量回收的页数 / 触发回收的空闲页数
+    INCREMENTAL_VACUUM_PAGES = 1000
+    INCREMENTAL_VACUUM_MIN_FREE = 256
+    # 未启用增量回收的旧数据库，最多每隔多少天执行一次完整 VACUUM
+    FULL_VACUUM_INTERVAL_DAYS = 30
+    
+    def _delete_in_batches(self, select_sql: str, delete_sql: str, params: tuple,
+                           max_batches: Optional[int]) -> Tuple[int, bool]:
+        """分批删除：select_sql 取出一批主键，delete_sql 按主键删除，返回 (删除行数, 是否已删完)"""
+        deleted = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            keys = self.conn.execute(select_sql, params + (self.RETENTION_BATCH,)).fetchall()
+            if not keys:
+                return deleted, True
+            with self.conn:
+                self.conn.executemany(delete_sql, keys)
+            deleted += len(keys)
+            batches += 1
+        return deleted, False
+    
+    def apply_retention(self, raw_days: Optional[int] = None, hourly_months: Optional[int] = None,
+                        max_batches: Optional[int] = None) -> dict:
+        """按分级保留策略删除过期数据
+        
+        只删除已计入预聚合表的原始记录，删除后长期趋势仍可从小时/日聚合读取。
+        导出过历史时，只删除已导出的原始记录（导出按 id 增量进行），其余留到下次导出后再删；
+        从未导出过则直接删除过期原始记录并打印条数。
+        max_batches 限制本次最多处理的批数，未删完的部分留到下次继续。
+        """
+        raw_days = self.RAW_RETENTION_DAYS if raw_days is None else raw_days
+        hourly_months = self.HOURLY_RETENTION_MONTHS if hourly_months is None else hourly_months
+        
+        # 先补齐聚合，确保删除的记录都已计入预聚合表
+        self.catch_up_rollups()
+        row = self.conn.execute(
+            "SELECT last_record_id FROM market_rollup_state WHERE name = 'market_records'"
+        ).fetchone()
+        rolled_up_id = row[0] if row else 0
+        exported_id = self._export_high_water()
+        max_id = rolled_up_id if exported_id is None else min(rolled_up_id, exported_id)
+        
+        now = datetime.now()
+        raw_cutoff = self._to_epoch_ms(now - timedelta(days=raw_days))
+        raw_deleted, raw_done = self._delete_in_batches(
+            "SELECT id FROM market_records WHERE timestamp < ? AND id <= ? LIMIT ?",
+            "DELETE FROM market_records WHERE id = ?",
+            (raw_cutoff, max_id),
+            max_batches,
+        )
+        raw_held = 0
+        if exported_id is None:
+            if raw_deleted:
+                print(f"[MarketDatabase] 尚未导出过历史，已删除 {raw_deleted} 条超过 {raw_days} 天的原始记录"
+                      f"（长期趋势保留在预聚合表中）")
+        elif max_id < rolled_up_id:
+            raw_held = self.conn.execute(
+                "SELECT COUNT(*) FROM market_records WHERE timestamp < ? AND id > ? AND id <= ?",
+                (raw_cutoff, max_id, rolled_up_id),
+            ).fetchone()[0]
+        
+        hourly_cutoff = self._bucket_start(
+            self._to_epoch_ms(now - timedelta(days=hourly_months * 30)), 'day'
+        )
+        hourly_table = self.ROLLUP_TABLES['hour']
+        hourly_deleted, hourly_done = self._delete_in_batches(
+            f"SELECT standard_name, trade_type, bucket_start FROM {hourly_table} "
+            f"WHERE bucket_start < ? LIMIT ?",
+            f"DELETE FROM {hourly_table} WHERE standard_name = ? AND trade_type = ? AND bucket_start = ?",
+            (hourly_cutoff,),
+            max_batches,
+        )
+        
+        return {
+            'raw_deleted': raw_deleted,
+            'raw_held': raw_held,  # 已过期但尚未导出、暂不删除的原始记录
+            'hourly_deleted': hourly_deleted,
+            'done': raw_done and hourly_done,
+        }
+    
+    def _export_high_water(self) -> Optional[int]:
+        """各导出目录中最大的已导出 id（见 export_market_history），从未导出时返回 None"""
+        row = self.conn.execute(
+            "SELECT MAX(value) FROM maintenance_state WHERE name LIKE 'export:%'"
+        ).fetchone()
+        return row[0] if row else None
+    
+    def _get_state(self, name: str) -> Optional[int]:
+        row = self.conn.execute("SELECT value FROM maintenance_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+    
+    def _set_state(self, name: str, value: int):
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO maintenance_state (name, value) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET value = excluded.value
+            """, (name, value))
+    
+    def reclaim_space(self) -> str:
+        """回收删除后空出的页面，返回执行的操作（'incremental' / 'full' / ''）
+        
+        启用了增量回收时每次只释放少量页面；旧数据库按间隔执行一次完整 VACUUM，
+        同时切换为增量回收，之后不再需要完整 VACUUM。
+        """
+        free_pages = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages < self.INCREMENTAL_VACUUM_MIN_FREE:
+            return ''
+        auto_vacuum = self.conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum == 2:
+            self.conn.execute(f"PRAGMA incremental_vacuum({self.INCREMENTAL_VACUUM_PAGES})").fetchall()
+            return 'incremental'
+        
+        now_ms = self._to_epoch_ms(datetime.now())
+        last_vacuum = self._get_state('last_full_vacuum') or 0
+        if now_ms - last_vacuum < self.FULL_VACUUM_INTERVAL_DAYS * 86400 * 1000:
+            return ''
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("VACUUM")
+        self._set_state('last_full_vacuum', now_ms)
+        return 'full'
+    
+    def run_maintenance(self, max_batches: Optional[int] = 20) -> dict:
+        """增量整理一次：按保留策略删除少量过期数据，再回收空间"""
+        result = self.apply_retention(max_batches=max_batches)
+        result['vacuum'] = self.reclaim_space()
+        if result['raw_deleted'] or result['hourly_deleted'] or result['vacuum']:
+            print(
+                f"[MarketDatabase] 数据整理：删除原始记录 {result['raw_deleted']} 条，"
+                f"小时聚合 {result['hourly_deleted']} 条，回收空间 {result['vacuum'] or '无'}"
+            )
+        if result['raw_held']:
+            print(f"[MarketDatabase] {result['raw_held']} 条过期原始记录尚未导出，导出后再删除")
+        return result
+    
+    def cleanup_old_records(self, months=3):
+        """清理旧数据（原始记录删除前已计入预聚合表，不会丢失长期趋势）"""
+        return self.apply_retention(raw_days=months * 30)['raw_deleted']
+    
+    def close(self):
+        """关闭数据库连接"""
+        if self.conn:
+            self.conn.close()
+
+
+class MarketStoreWriter:
+    """market_data.db 的后台写入器
+    
+    界面线程只把记录入队，写线程使用自己的数据库连接（WAL 模式下与读连接互不阻塞）
+    按批写入；每隔 MAINTENANCE_INTERVAL 秒在写入后顺带增量整理一次（分级保留 + 空间回收）。
+    导入快照也在写线程中执行，与记录写入保持先后顺序。
+    """
+    
+    MAINTENANCE_INTERVAL = 10 * 60
+    # 启动后第一次整理的延迟
+    MAINTENANCE_FIRST_DELAY = 60
+    
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, name: str = "MarketDBWriter"):
+        self.db_path = db_path
+        self._db: Optional[MarketDatabase] = None
+        self._next_maintenance = time.monotonic() + self.MAINTENANCE_FIRST_DELAY
+        self.queue = WriteBehindQueue(
+            self._write_batch,
+            max_batch=500,
+            name=name,
+            on_stop=self._close_db,
+        )
+        # 启动后立即在写线程中打开数据库：旧数据库的结构升级和聚合补齐不必等到第一条记录
+        self.queue.put(_DatabaseJob(lambda db: None))
+    
+    def put(self, record: dict):
+        """入队一条记录（字段同 MarketDatabase.insert_many）"""
+        self.queue.put(record)
+    
+    def import_snapshot(self, source: Union[str, Dict], source_key: Optional[str] = None):
+        """入队一次快照导入（source 为 JSON 文件路径或已读取的快照字典）
+        
+        导入失败（如快照文件损坏）只打印，不影响同一批中排在后面的价格记录。
+        """
+        def job(db):
+            try:
+                import_market_snapshot(db, source, source_key=source_key)
+            except Exception as exc:
+                print(f"[MarketStore] 导入快照失败: {exc}")
+        self.queue.put(_DatabaseJob(job))
+    
+    def export_history(self, out_dir: str, fmt: str = 'parquet',
+                       callback: Optional[Callable[[Dict], None]] = None):
+        """入队一次历史导出，完成后在写线程中调用 callback(结果)"""
+        def job(db):
+            try:
+                result = export_market_history(db, out_dir, fmt=fmt)
+            except Exception as exc:
+                result = {'error': str(exc)}
+            if callback:
+                callback(result)
+        self.queue.put(_DatabaseJob(job))
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return self.queue.flush(timeout)
+    
+    def close(self, timeout: Optional[float] = None) -> bool:
+        return self.queue.close(timeout)
+    
+    @property
+    def closed(self) -> bool:
+        return self.queue.closed
+    
+    @property
+    def depth(self) -> int:
+        return self.queue.depth
+    
+    def stats(self) -> Dict[str, Any]:
+        return self.queue.stats()
+    
+    def _write_batch(self, batch: List[Any]):
+        """写线程：按入队顺序写入记录，遇到导入/导出任务时先写出之前的记录
+        
+        写入成功的部分立即从 batch 中删除，写入失败由队列重试时不会重复插入。
+        """
+        if self._db is None:
+            self._db = MarketDatabase(self.db_path)
+        while batch:
+            end = next((i for i, item in enumerate(batch) if isinstance(item, _DatabaseJob)), len(batch))
+            if end:
+                self._db.insert_many(batch[:end])
+                del batch[:end]
+                continue
+            batch[0].func(self._db)
+            del batch[0]
+        
+        if time.monotonic() >= self._next_maintenance:
+            self._next_maintenance = time.monotonic() + self.MAINTENANCE_INTERVAL
+            self._db.run_maintenance()
+    
+    def _close_db(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_store_writers: Dict[str, MarketStoreWriter] = {}
+_store_writers_lock = threading.Lock()
+
+
+def get_store_writer(db_path: str = DEFAULT_DB_PATH) -> MarketStoreWriter:
+    """同一数据库共用一个写入器（一个写线程、一个写连接），已关闭时重新创建"""
+    key = os.path.abspath(db_path)
+    with _store_writers_lock:
+        writer = _store_writers.get(key)
+        if writer is None or writer.closed:
+            writer = _store_writers[key] = MarketStoreWriter(key)
+        return writer
+
+
+def close_store_writer(db_path: str = DEFAULT_DB_PATH, timeout: Optional[float] = None) -> bool:
+    """等待共用写入器写完队列后关闭，超时返回 False"""
+    with _store_writers_lock:
+        writer = _store_writers.pop(os.path.abspath(db_path), None)
+    if writer is None or writer.close(timeout):
+        return True
+    print(f"[MarketStoreWriter] 关闭超时，仍有 {writer.depth} 条记录未写入")
+    return False
+
+
+class _DatabaseJob:
+    """写入队列中的数据库任务（导入、导出），在写线程中以写连接调用 func(db)"""
+    
+    __slots__ = ("func",)
+    
+    def __init__(self, func: Callable[[MarketDatabase], Any]):
+        self.func = func
+
+
+# ==================== 快照导入 ====================
+
+# 每个事务写入的记录数
+IMPORT_BATCH = 5000
+
+
+def _iter_snapshot_sections(path: str) -> Iterator[Tuple[str, str, Any]]:
+    """逐个读取快照文件中 market_data / item_repository 的 (段名, 物品名, 数据)
+    
+    安装了 ijson 时流式解析，内存只与单个物品的数据量有关；否则整体读取。
+    """
+    if IJSON_AVAILABLE:
+        for section in ('market_data', 'item_repository'):
+            with open(path, 'rb') as f:
+                for name, value in ijson.kvitems(f, section, use_float=True):
+                    yield section, name, value
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f) or {}
+    for section in ('market_data', 'item_repository'):
+        for name, value in (data.get(section) or {}).items():
+            yield section, name, value
+
+
+def _guess_trade_type(price: float, market_meta: Optional[Dict]) -> str:
+    """旧版仓库的价格历史没有交易类型，按 market_data 中的收购/出售价格列表推断"""
+    if market_meta:
+        if price in (market_meta.get('buy') or []):
+            return 'buy'
+        if price in (market_meta.get('sell') or []):
+            return 'sell'
+    return 'unknown'
+
+
+def _repository_records(name: str, repo: Dict, market_meta: Optional[Dict]) -> Iterator[dict]:
+    """把物品仓库的一项转换为 market_records 记录
+    
+    records（带时间和交易类型）最准确；更早、只剩每日统计的日期按当天中午记录：
+    旧版的每日价格列表逐条导入，每日汇总（count/sum/min/max）按均价导入一条，
+    并带上 count/min/max，预聚合表中仍按原始条数统计；
+    旧版的 history（[时间, 价格]）按 market_data 推断交易类型。
+    """
+    category = repo.get('category') or (market_meta or {}).get('category') or '未分类'
+    subcategory = repo.get('subcategory') or (market_meta or {}).get('subcategory') or '未分类'
+    base = {'name': name, 'category': category, 'subcategory': subcategory, 'raw_name': name}
+    
+    earliest_date = None
+    for record in repo.get('records') or []:
+        if not isinstance(record, dict) or not record.get('time'):
+            continue
+        day = str(record['time'])[:10]
+        earliest_date = day if earliest_date is None else min(earliest_date, day)
+        yield dict(base, price=record.get('price'), trade_type=record.get('type') or 'unknown',
+                   timestamp=record['time'])
+    
+    daily = repo.get('daily') or {}
+    for day in sorted(daily):
+        if earliest_date is not None and day >= earliest_date:
+            break
+        for trade_type in ('buy', 'sell'):
+            value = (daily[day] or {}).get(trade_type)
+            timestamp = f"{day}T12:00:00"
+            if isinstance(value, dict):
+                if value.get('count'):
+                    yield dict(base, price=value['sum'] / value['count'], trade_type=trade_type,
+                               timestamp=timestamp, count=value['count'],
+                               min=value.get('min'), max=value.get('max'))
+                continue
+            for price in value or []:
+                yield dict(base, price=price, trade_type=trade_type, timestamp=timestamp)
+    
+    if not repo.get('records'):
+        for entry in repo.get('history') or []:
+            if isinstance(entry, (list, tuple)) and len(entry) == 2:
+                timestamp, price = entry
+                yield dict(base, price=price, trade_type=_guess_trade_type(price, market_meta),
+                           timestamp=timestamp)
+
+
+def iter_snapshot_records(source: Union[str, Dict]) -> Iterator[dict]:
+    """从 market_data.json / 学习数据快照中逐条生成 market_records 记录"""
+    if isinstance(source, dict):
+        sections: Iterable = (
+            (section, name, value)
+            for section in ('market_data', 'item_repository')
+            for name, value in (source.get(section) or {}).items()
+        )
+    else:
+        sections = _iter_snapshot_sections(source)
+    
+    # market_data 只用于推断交易类型和分类（价格列表没有时间，不单独导入）
+    market_data: Dict[str, Dict] = {}
+    for section, name, value in sections:
+        if not isinstance(value, dict):
+            continue
+        if section == 'market_data':
+            market_data[name] = {
+                'buy': set(value.get('buy') or []),
+                'sell': set(value.get('sell') or []),
+                'category': value.get('category'),
+                'subcategory': value.get('subcategory'),
+            }
+        else:
+            for record in _repository_records(name, value, market_data.get(name)):
+                price = record.get('price')
+                if isinstance(price, (int, float)) and price > 0:
+                    yield record
+
+
+def import_market_snapshot(db: MarketDatabase, source: Union[str, Dict],
+                           source_key: Optional[str] = None, batch_size: int = IMPORT_BATCH,
+                           force: bool = False) -> int:
+    """把快照中的价格记录分批导入数据库，返回导入条数
+    
+    每 batch_size 条一个事务。同一来源（source_key，默认按文件路径 + 修改时间 + 大小）
+    只导入一次，force=True 时重新导入。数据库中已有的记录（物品、时间、价格、交易类型相同，
+    如重新导入自己导出的学习数据）逐条跳过，不会重复计入统计。
+    """
+    if source_key is None:
+        if isinstance(source, dict):
+            raise ValueError("导入快照字典时必须提供 source_key")
+        stat = os.stat(source)
+        source_key = f"{os.path.abspath(source)}:{int(stat.st_mtime * 1000)}:{stat.st_size}"
+    state_name = f"import:{source_key}"
+    if not force and db._get_state(state_name) is not None:
+        return 0
+    
+    imported = 0
+    skipped = 0
+    batch: List[dict] = []
+    for record in iter_snapshot_records(source):
+        if db.record_exists(record):
+            skipped += 1
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            db.insert_many(batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        db.insert_many(batch)
+        imported += len(batch)
+    db._set_state(state_name, imported)
+    print(f"[MarketStore] 已从快照导入 {imported} 条价格记录，跳过已存在的 {skipped} 条")
+    return imported
+
+
+# ==================== 列式导出 ====================
+
+# 每次从数据库读取的行数（导出时内存只与这个数量有关）
+EXPORT_CHUNK = 50000
+
+EXPORT_COLUMNS = (
+    'id', 'timestamp', 'standard_name', 'item_name', 'price', 'trade_type',
+    'subcategory', 'raw_name', 'full_text',
+)
+
+
+def _export_schema():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('timestamp', pa.timestamp('ms', tz='UTC')),
+        ('standard_name', pa.string()),
+        ('item_name', pa.string()),
+        ('price', pa.float64()),
+        ('trade_type', pa.string()),
+        ('subcategory', pa.string()),
+        ('raw_name', pa.string()),
+        ('full_text', pa.string()),
+    ])
+
+
+def export_market_history(db: MarketDatabase, out_dir: str, fmt: str = 'parquet',
+                          chunk_size: int = EXPORT_CHUNK, full: bool = False) -> Dict[str, Any]:
+    """把 market_records 导出为按日期和大类分区的 Parquet / Arrow IPC 文件
+    
+    目录结构为 day=YYYY-MM-DD/category=大类/part-起始id-结束id.parquet（hive 分区，
+    分区值做 URL 编码），可直接用 pyarrow.dataset / pandas 读取整个目录。
+    按 id 分块读取，每块写完后记录导出位置，再次导出只追加上次之后的新记录；
+    full=True 时从头导出。
+    """
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("导出需要安装 pyarrow 库")
+    if fmt not in ('parquet', 'arrow'):
+        raise ValueError(f"不支持的导出格式：{fmt}")
+    
+    os.makedirs(out_dir, exist_ok=True)
+    state_name = f"export:{fmt}:{os.path.abspath(out_dir)}"
+    last_id = 0 if full else (db._get_state(state_name) or 0)
+    schema = _export_schema()
+    exported = 0
+    files = 0
+    
+    while True:
+        rows = db.conn.execute("""
+            SELECT id, timestamp, standard_name, item_name, price, trade_type,
+                   subcategory, raw_name, full_text, category
+            FROM market_records
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        
+        # 按 (日期, 大类) 分组，每组写一个文件
+        partitions: Dict[Tuple[str, str], List[tuple]] = {}
+        day_cache: Dict[int, str] = {}  # 时区偏移都是 15 分钟的整数倍，同一个 15 分钟内日期相同
+        for row in rows:
+            quarter = row[1] // 900000
+            day = day_cache.get(quarter)
+            if day is None:
+                day = day_cache[quarter] = datetime.fromtimestamp(quarter * 900).strftime("%Y-%m-%d")
+            partitions.setdefault((day, row[9] or '未分类'), []).append(row)
+        
+        for (day, category), part_rows in partitions.items():
+            columns = list(zip(*part_rows))
+            table = pa.Table.from_arrays(
+                [pa.array(columns[i], type=schema.field(i).type) for i in range(len(EXPORT_COLUMNS))],
+                schema=schema,
+            )
+            part_dir = os.path.join(out_dir, f"day={day}", f"category={quote(category, safe='')}")
+            os.makedirs(part_dir, exist_ok=True)
+            name = f"part-{part_rows[0][0]}-{part_rows[-1][0]}.{fmt}"
+            tmp_path = os.path.join(part_dir, f".{name}.tmp")
+            if fmt == 'parquet':
+                pq.write_table(table, tmp_path, compression='zstd')
+            else:
+                feather.write_feather(table, tmp_path, compression='zstd')
+            os.replace(tmp_path, os.path.join(part_dir, name))
+            files += 1
+        
+        last_id = rows[-1][0]
+        exported += len(rows)
+        db._set_state(state_name, last_id)
+    
+    if exported:
+        print(f"[MarketStore] 已导出 {exported} 条记录到 {out_dir}（{files} 个文件）")
+    return {'exported': exported, 'files': files, 'last_id': last_id, 'out_dir': out_dir}
@@ -15,6 +15,7 @@ import subprocess
 from novel_fetcher import create_fetcher
 from novel_manager import NovelManager
 from tts_manager import TTSManager
+from paged_text import PagedText
 
 
 class NovelReaderApp:
@@ -42,6 +43,11 @@ class NovelReaderApp:
         self.current_chapters = []
         self.current_chapter_index = 0
         
+        # 章节文本（文本框中只显示当前位置附近的一段窗口）
+        self.paged_text = PagedText()
+        self._tts_range = None
+        self._search_range = None
+        
         # 字体设置
         self.font_size = 12
         self.font_family = "微软雅黑"
@@ -272,6 +278,9 @@ class NovelReaderApp:
         self.content_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         self.content_text.tag_configure("tts_highlight", background="#cfe8ff")
         self.content_text.tag_configure("search_highlight", background="#ffff00")
+        # 滚动条按整章位置显示，拖动时由阅读器换算到窗口
+        self.content_text.config(yscrollcommand=self._on_content_yview)
+        self.content_text.vbar.config(command=self._on_content_scrollbar)
         
         # 状态栏
         status_frame = ttk.Frame(right_panel)
@@ -476,8 +485,7 @@ class NovelReaderApp:
             content = self.fetcher.get_chapter_content(chapter_url)
             
             # 显示内容
-            self.content_text.delete(1.0, tk.END)
-            self.content_text.insert(1.0, content)
+            self._set_content(content)
             self.clear_highlight()
             
             # 重置滚动位置到顶部
@@ -517,7 +525,7 @@ class NovelReaderApp:
             self.title_label.config(text="请选择一本小说")
             self.author_label.config(text="")
             self.chapter_label.config(text="")
-            self.content_text.delete(1.0, tk.END)
+            self._set_content("")
             # 重置滚动位置
             self.content_text.see(1.0)
             self.content_text.mark_set(tk.INSERT, 1.0)
@@ -694,17 +702,82 @@ class NovelReaderApp:
         try:
             if start < 0 or end <= start:
                 return
-            self.content_text.tag_remove("tts_highlight", "1.0", tk.END)
-            start_index = f"1.0 + {start} chars"
-            end_index = f"1.0 + {end} chars"
-            self.content_text.tag_add("tts_highlight", start_index, end_index)
+            self._tts_range = (start, end)
+            start_index = self._content_index(start)
+            self._apply_content_tags()
             self.content_text.see(start_index)
         except Exception as e:
             print(f"高亮文本范围错误: {e}")
 
     def clear_highlight(self):
+        self._tts_range = None
         self.content_text.tag_remove("tts_highlight", "1.0", tk.END)
 
+    # ---------- 分页显示 ----------
+    def _set_content(self, content: str):
+        """设置整章文本，只渲染开头的一段窗口"""
+        self.paged_text.set_text(content)
+        self._tts_range = None
+        self._search_range = None
+        self._render_content_window()
+
+    def _render_content_window(self):
+        """把当前窗口的文本放入文本框，并重新应用高亮"""
+        self.content_text.delete(1.0, tk.END)
+        self.content_text.insert(1.0, self.paged_text.window_text())
+        self._apply_content_tags()
+
+    def _apply_content_tags(self):
+        """按绝对偏移重新设置朗读和搜索高亮"""
+        for tag, text_range in (("tts_highlight", self._tts_range), ("search_highlight", self._search_range)):
+            self.content_text.tag_remove(tag, "1.0", tk.END)
+            local = self.paged_text.local_range(*text_range) if text_range else None
+            if local:
+                self.content_text.tag_add(tag, f"1.0 + {local[0]} chars", f"1.0 + {local[1]} chars")
+
+    def _content_index(self, offset: int) -> str:
+        """绝对偏移对应的文本框位置，不在窗口内时先移动窗口"""
+        if not self.paged_text.contains(offset):
+            if self.paged_text.move_window(self.paged_text.line_of(offset)):
+                self._render_content_window()
+        return f"1.0 + {self.paged_text.to_local(offset)} chars"
+
+    def _content_offset(self, index) -> int:
+        """文本框位置对应的绝对偏移"""
+        count = self.content_text.count("1.0", index, "chars")
+        if isinstance(count, tuple):
+            count = count[0]
+        return self.paged_text.to_absolute(count or 0)
+
+    def _content_fits_window(self) -> bool:
+        """整章都在窗口内（章节较短），滚动与原来一样由文本框自己处理"""
+        return self.paged_text.window_first == 0 and self.paged_text.window_last >= self.paged_text.line_count
+
+    def _on_content_yview(self, first, last):
+        """文本框滚动：接近窗口边缘时移动窗口，滚动条显示整章中的位置"""
+        if self._content_fits_window():
+            self.content_text.vbar.set(first, last)
+            return
+        top = self._content_offset("@0,0")
+        bottom = self._content_offset(f"@0,{self.content_text.winfo_height()}")
+        if self.paged_text.needs_shift(top, bottom):
+            # 以当前顶部为中心重新渲染，顶部行保持不动
+            self.paged_text.move_window(self.paged_text.line_of(top))
+            self._render_content_window()
+            self.content_text.yview(self._content_index(top))
+            return
+        line_count = max(1, self.paged_text.line_count)
+        self.content_text.vbar.set(self.paged_text.line_of(top) / line_count,
+                                   (self.paged_text.line_of(bottom) + 1) / line_count)
+
+    def _on_content_scrollbar(self, *args):
+        """拖动滚动条按整章位置跳转，按行/页滚动交给文本框"""
+        if args and args[0] == tk.MOVETO and not self._content_fits_window():
+            line = int(float(args[1]) * self.paged_text.line_count)
+            self.content_text.yview(self._content_index(self.paged_text.line_start(line)))
+        else:
+            self.content_text.yview(*args)
+
     def start_reading(self):
         """开始朗读"""
         try:
@@ -726,14 +799,15 @@ class NovelReaderApp:
             
             # 获取当前显示的文本
             try:
-                content = self.content_text.get(1.0, tk.END).strip()
+                # 朗读整章原文（不去掉首尾空白），回调的偏移即整章中的绝对偏移
+                content = self.paged_text.text
                 print(f"获取到的文本内容长度: {len(content)}")
             except Exception as get_error:
                 print(f"获取文本内容错误: {get_error}")
                 messagebox.showerror("错误", f"无法获取文本内容：{get_error}")
                 return
             
-            if not content:
+            if not content.strip():
                 messagebox.showinfo("提示", "当前没有可朗读的内容")
                 return
             
@@ -935,9 +1009,7 @@ class NovelReaderApp:
         
         # 获取当前光标位置
         try:
-            cursor_pos = self.content_text.index(tk.INSERT)
-            line, col = cursor_pos.split('.')
-            position = int(line) - 1
+            position = self.paged_text.paragraph_of(self._content_offset(tk.INSERT))
         except:
             position = 0
         
@@ -1205,19 +1277,8 @@ class NovelReaderApp:
             messagebox.showwarning("警告", "请先选择一本小说")
             return
         
-        # 获取当前章节内容
-        content = self.content_text.get(1.0, tk.END)
-        self.search_results = []
-        
-        # 搜索所有匹配项（不区分大小写）
-        start = 1.0
-        while True:
-            pos = self.content_text.search(keyword, start, tk.END, nocase=True)
-            if not pos:
-                break
-            end_pos = f"{pos}+{len(keyword)}c"
-            self.search_results.append((pos, end_pos))
-            start = end_pos
+        # 在整章文本中搜索所有匹配项（不区分大小写），结果为绝对偏移
+        self.search_results = self.paged_text.find_all(keyword)
         
         if not self.search_results:
             messagebox.showinfo("提示", f"未找到关键词：{keyword}")
@@ -1231,6 +1292,7 @@ class NovelReaderApp:
     def on_search_key_release(self, event):
         """搜索框按键释放事件"""
         # 清除之前的搜索结果高亮
+        self._search_range = None
         self.content_text.tag_remove("search_highlight", 1.0, tk.END)
         self.search_results = []
         self.current_search_index = -1
@@ -1266,12 +1328,11 @@ class NovelReaderApp:
         if not self.search_results or self.current_search_index < 0:
             return
         
-        # 清除之前的高亮
-        self.content_text.tag_remove("search_highlight", 1.0, tk.END)
-        
-        # 高亮当前结果
-        pos, end_pos = self.search_results[self.current_search_index]
-        self.content_text.tag_add("search_highlight", pos, end_pos)
+        # 高亮当前结果（不在窗口内时先移动窗口）
+        start, end = self.search_results[self.current_search_index]
+        self._search_range = (start, end)
+        pos = self._content_index(start)
+        self._apply_content_tags()
         self.content_text.see(pos)
         
         # 更新状态
@@ -1291,7 +1352,7 @@ class NovelReaderApp:
             # 每30秒更新一次统计
             if not self.last_stats_update or (current_time - self.last_stats_update) >= 30:
                 # 计算阅读的字数（简单估算：当前章节内容长度）
-                content = self.content_text.get(1.0, tk.END)
+                content = self.paged_text.text
                 words_count = len(content.replace(' ', '').replace('\n', ''))
                 
                 self.manager.update_reading_stats(
@@ -7,8 +7,10 @@ import socket
 import posixpath
 import html
 import copy
+import uuid
 import difflib
 import unicodedata
+import importlib.util
 try:
     import qrcode
     from PIL import ImageQt
@@ -21,9 +23,10 @@ from typing import List, Dict, Optional, Tuple, Any, Set
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 import threading
+from collections import deque
 from functools import partial
 
-from PyQt6.QtCore import Qt, QUrl, QTimer, pyqtSlot, pyqtSignal, QDate, QByteArray, QBuffer, QIODevice, QRect, QThread
+from PyQt6.QtCore import Qt, QUrl, QTimer, pyqtSlot, pyqtSignal, QDate, QByteArray, QBuffer, QIODevice, QRect, QPoint, QThread, QSortFilterProxyModel, QAbstractTableModel, QModelIndex
 from PyQt6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -32,6 +35,7 @@ from PyQt6.QtWidgets import (
     QHBoxLayout,
     QListWidget,
     QListWidgetItem,
+    QListView,
     QLabel,
     QPushButton,
     QSplitter,
@@ -47,6 +51,7 @@ from PyQt6.QtWidgets import (
     QProgressBar,
     QTableWidget,
     QTableWidgetItem,
+    QTableView,
     QHeaderView,
     QDialog,
     QRadioButton,
@@ -65,6 +70,7 @@ from PyQt6.QtWidgets import (
     QTreeWidgetItem,
     QPlainTextEdit,
     QTextBrowser,
+    QScrollBar,
 )
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineDownloadRequest
@@ -80,10 +86,10 @@ from daily_brief_fetchers import (
 )
 
 # OCR 相关导入（可选，如果未安装会提示）
+# 只检测是否安装，真正的 import 推迟到 load_ocr_engine()，避免拖慢程序启动
 try:
-    from paddleocr import PaddleOCR
-    PADDLEOCR_AVAILABLE = True
-except ImportError:
+    PADDLEOCR_AVAILABLE = importlib.util.find_spec("paddleocr") is not None
+except (ImportError, ValueError):
     PADDLEOCR_AVAILABLE = False
 
 try:
@@ -112,6 +118,19 @@ except ImportError:
     PINYIN_AVAILABLE = False
 
 from novel_manager import NovelManager
+from market_stats import DAILY_RETENTION_DAYS, DailyAggregates, PriceSeries, QuantileSketch
+from market_journal import MarketJournal, atomic_write_json
+from write_behind import WriteBehindQueue
+from alarm_schedule import AlarmSchedule, parse_alarm_date, parse_alarm_time
+from market_store import close_store_writer, get_store_writer
+from paged_text import PagedText
+from market_models import (
+    CategoryTreeIndex,
+    MarketFilterProxyModel,
+    MarketTableModel,
+    MessageLogModel,
+    RepositoryTableModel,
+)
 from novel_fetcher import create_fetcher
 from tts_manager import TTSManager
 import time
@@ -1660,9 +1679,209 @@ class DownloadTab(QWidget):
             QMessageBox.critical(self, "错误", f"自动导入小说失败：{exc}")
 
 
+class PagedTextView(QWidget):
+    """分页阅读视图
+
+    整章文本保存在 PagedText 中，QTextEdit 里只放当前位置附近的一段窗口，
+    右侧滚动条按整章的行数滚动。对外的位置（高亮、跳转、toPlainText）都是整章中的绝对偏移。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paged = PagedText()
+        # {名称: (起始, 结束, 颜色)}，同名高亮复用同一个 ExtraSelection
+        self._highlights: Dict[str, Tuple[int, int, QColor]] = {}
+        self._selections: Dict[str, QTextEdit.ExtraSelection] = {}
+        self._applied: List[Tuple[str, int, int]] = []
+        self._rendering = False
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        self.editor = QTextEdit()
+        self.editor.setReadOnly(True)
+        # 编辑框内部只滚动窗口，整章位置由外部滚动条表示
+        self.editor.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.scrollbar = QScrollBar(Qt.Orientation.Vertical)
+        layout.addWidget(self.editor, stretch=1)
+        layout.addWidget(self.scrollbar)
+
+        self.editor.verticalScrollBar().valueChanged.connect(self._on_editor_scrolled)
+        self.scrollbar.valueChanged.connect(self._on_scrollbar_moved)
+
+    # ---------- 内容 ----------
+    def setPlainText(self, text: str):
+        self.paged.set_text(text)
+        self._highlights.clear()
+        self._render()
+        self._scroll_editor_to(0)
+
+    def toPlainText(self) -> str:
+        return self.paged.text
+
+    def clear(self):
+        self.setPlainText("")
+
+    def _render(self):
+        """把当前窗口的文本放入编辑框，并重新应用高亮"""
+        self._rendering = True
+        try:
+            self.editor.setPlainText(self.paged.window_text())
+            self.scrollbar.setRange(0, max(0, self.paged.line_count - 1))
+        finally:
+            self._rendering = False
+        # 文本已替换，原来的高亮需要重新设置
+        self._applied = []
+        self._apply_highlights()
+
+    # ---------- 滚动 ----------
+    def _visible_range(self) -> Tuple[int, int]:
+        """编辑框可见区域首尾字符的绝对偏移"""
+        viewport = self.editor.viewport()
+        margin = int(self.editor.document().documentMargin())
+        top = self.editor.cursorForPosition(QPoint(margin, 1)).position()
+        bottom = self.editor.cursorForPosition(QPoint(viewport.width() - 1, viewport.height() - 1)).position()
+        return self.paged.to_absolute(top), self.paged.to_absolute(bottom)
+
+    def _scroll_editor_to(self, offset: int):
+        """让绝对偏移 offset 所在的行显示在编辑框顶部"""
+        bar = self.editor.verticalScrollBar()
+        cursor = self.editor.textCursor()
+        cursor.setPosition(max(0, min(self.paged.to_local(offset), len(self.paged.window_text()))))
+        self._rendering = True
+        try:
+            bar.setValue(0)
+            bar.setValue(bar.value() + self.editor.cursorRect(cursor).top())
+        finally:
+            self._rendering = False
+        self._sync_scrollbar()
+
+    def _sync_scrollbar(self):
+        top, bottom = self._visible_range()
+        self.scrollbar.blockSignals(True)
+        self.scrollbar.setPageStep(max(1, self.paged.line_of(bottom) - self.paged.line_of(top)))
+        self.scrollbar.setValue(self.paged.line_of(top))
+        self.scrollbar.blockSignals(False)
+
+    def _on_editor_scrolled(self, _value: int):
+        if self._rendering:
+            return
+        top, bottom = self._visible_range()
+        if self.paged.needs_shift(top, bottom):
+            # 接近窗口边缘，以当前顶部为中心重新渲染，顶部行保持不动
+            self.paged.move_window(self.paged.line_of(top))
+            self._render()
+            self._scroll_editor_to(top)
+        else:
+            self._sync_scrollbar()
+
+    def _on_scrollbar_moved(self, line: int):
+        self.scroll_to_offset(self.paged.line_start(line))
+
+    def scroll_to_offset(self, offset: int):
+        """跳转到绝对偏移（显示在顶部）"""
+        if not self.paged.contains(offset) or self.paged.needs_shift(offset, offset):
+            if self.paged.move_window(self.paged.line_of(offset)):
+                self._render()
+        self._scroll_editor_to(offset)
+
+    def ensure_range(self, start: int, end: int):
+        """保证绝对区间在窗口内，必要时移动窗口"""
+        if not self.paged.contains(start, end):
+            if self.paged.move_window(self.paged.line_of(start)):
+                self._render()
+
+    def is_range_visible(self, start: int, end: int) -> bool:
+        """绝对区间是否完整显示在编辑框可见区域内"""
+        if not self.paged.contains(start, end):
+            return False
+        top, bottom = self._visible_range()
+        return top <= start and end <= bottom
+
+    def reveal_range(self, start: int, end: int):
+        """区间不在可见区域时把它滚到视图中央，已可见时不滚动"""
+        if self.is_range_visible(start, end):
+            return
+        self.ensure_range(start, end)
+        local = self.paged.local_range(start, end)
+        if not local:
+            return
+        cursor = self.editor.textCursor()
+        cursor.setPosition(local[0])
+        self._center_cursor(cursor)
+
+    def select_range(self, start: int, end: int):
+        """选中绝对区间，不在可见区域时滚动到视图中央"""
+        visible = self.is_range_visible(start, end)
+        self.ensure_range(start, end)
+        local = self.paged.local_range(start, end)
+        if not local:
+            return
+        cursor = self.editor.textCursor()
+        cursor.setPosition(local[0])
+        cursor.setPosition(local[1], QTextCursor.MoveMode.KeepAnchor)
+        self._rendering = True
+        try:
+            self.editor.setTextCursor(cursor)
+        finally:
+            self._rendering = False
+        if not visible:
+            self._center_cursor(cursor)
+
+    def _center_cursor(self, cursor: QTextCursor):
+        """QTextEdit 没有 centerCursor，按光标位置把它滚到中央"""
+        bar = self.editor.verticalScrollBar()
+        bar.setValue(bar.value() + self.editor.cursorRect(cursor).center().y()
+                     - self.editor.viewport().height() // 2)
+        self._sync_scrollbar()
+
+    # ---------- 高亮 ----------
+    def set_highlight(self, name: str, text_range: Optional[Tuple[int, int]], color: Optional[QColor] = None):
+        """设置一种高亮（绝对区间 + 背景色），text_range 为 None 时清除；窗口移动后自动重新应用"""
+        if text_range is None:
+            if self._highlights.pop(name, None) is None:
+                return
+        else:
+            self._highlights[name] = (text_range[0], text_range[1], color)
+        self._apply_highlights()
+
+    def _apply_highlights(self):
+        """把高亮换算到当前窗口，与上次应用的区间相同时不再调用 setExtraSelections"""
+        extra = []
+        applied = []
+        for name, (start, end, color) in self._highlights.items():
+            local = self.paged.local_range(start, end)
+            if not local:
+                continue
+            selection = self._selections.get(name)
+            if selection is None:
+                selection = QTextEdit.ExtraSelection()
+                selection.cursor = self.editor.textCursor()
+                selection.format = QTextCharFormat()
+                self._selections[name] = selection
+            if selection.format.background().color() != color:
+                selection.format.setBackground(color)
+            selection.cursor.setPosition(local[0])
+            selection.cursor.setPosition(local[1], QTextCursor.MoveMode.KeepAnchor)
+            extra.append(selection)
+            applied.append((name, local[0], local[1]))
+        if applied == self._applied:
+            return
+        self._applied = applied
+        self.editor.setExtraSelections(extra)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.paged.text:
+            self._sync_scrollbar()
+
+
 class NovelListTab(QWidget):
     """小说列表 + 阅读页（简化版）"""
 
+    # 朗读高亮最短刷新间隔（毫秒，约 30 帧/秒），期间的词边界事件合并为一次刷新
+    TTS_HIGHLIGHT_INTERVAL_MS = 33
+
     tts_highlight_signal = pyqtSignal(int, int)
     tts_status_signal = pyqtSignal(str)
     tts_finish_signal = pyqtSignal(bool, str)
@@ -1681,7 +1900,14 @@ class NovelListTab(QWidget):
         self.tts_active = False
         self.search_results: List[Dict] = []
         self.current_search_index = -1
-        self._tts_extra: List = []
+        # 朗读位置：工作线程只记录最新的词，界面按帧率合并刷新
+        self._pending_tts_range: Optional[Tuple[int, int]] = None
+        self._tts_lock = threading.Lock()  # 保护 _pending_tts_range 在朗读线程与界面线程间的交接
+        self._tts_range: Optional[Tuple[int, int]] = None
+        self.tts_highlight_timer = QTimer(self)
+        self.tts_highlight_timer.setSingleShot(True)
+        self.tts_highlight_timer.setInterval(self.TTS_HIGHLIGHT_INTERVAL_MS)
+        self.tts_highlight_timer.timeout.connect(self._flush_tts_highlight)
 
         self._build_ui()
         self.refresh_novel_list()
@@ -1731,8 +1957,7 @@ class NovelListTab(QWidget):
         chapter_row.addWidget(self.next_button)
         right_layout.addLayout(chapter_row)
 
-        self.content_edit = QTextEdit()
-        self.content_edit.setReadOnly(True)
+        self.content_edit = PagedTextView()
         right_layout.addWidget(self.content_edit, stretch=1)
 
         # 搜索区域
@@ -1930,17 +2155,10 @@ class NovelListTab(QWidget):
         if not keyword:
             QMessageBox.warning(self, "提示", "请输入搜索关键词")
             return
-        text = self.content_edit.toPlainText()
-        self.search_results = []
-        start = 0
-        lower_text = text.lower()
-        lower_keyword = keyword.lower()
-        while True:
-            idx = lower_text.find(lower_keyword, start)
-            if idx == -1:
-                break
-            self.search_results.append({"start": idx, "end": idx + len(keyword)})
-            start = idx + len(keyword)
+        self.search_results = [
+            {"start": start, "end": end}
+            for start, end in self.content_edit.paged.find_all(keyword)
+        ]
         if not self.search_results:
             self.current_search_index = -1
             self.apply_search_highlight()
@@ -1970,23 +2188,13 @@ class NovelListTab(QWidget):
         self.search_status_label.setText(f"{self.current_search_index + 1}/{len(self.search_results)}")
 
     def apply_search_highlight(self):
-        extra = []
-        format_search = QTextEdit.ExtraSelection()
-        fmt = QTextCharFormat()
-        fmt.setBackground(Qt.GlobalColor.yellow)
-        format_search.format = fmt
+        # 搜索结果是整章中的绝对偏移，由阅读视图换算到当前窗口；朗读高亮单独维护
         if self.search_results and 0 <= self.current_search_index < len(self.search_results):
             sel = self.search_results[self.current_search_index]
-            tmp_cursor = self.content_edit.textCursor()
-            tmp_cursor.setPosition(sel["start"])
-            tmp_cursor.setPosition(sel["end"], QTextCursor.MoveMode.KeepAnchor)
-            format_search.cursor = tmp_cursor
-            extra.append(format_search)
-            self.content_edit.setTextCursor(tmp_cursor)
-            self.content_edit.centerCursor()
-        # 合并朗读高亮
-        extra.extend(getattr(self, "_tts_extra", []))
-        self.content_edit.setExtraSelections(extra)
+            self.content_edit.select_range(sel["start"], sel["end"])
+            self.content_edit.set_highlight("search", (sel["start"], sel["end"]), QColor(Qt.GlobalColor.yellow))
+        else:
+            self.content_edit.set_highlight("search", None)
 
     @pyqtSlot(str)
     def update_status_label(self, text: str):
@@ -2073,11 +2281,16 @@ class NovelListTab(QWidget):
             self.tts_manager.stop()
             self.tts_active = False
             self.tts_status_signal.emit("朗读已停止")
-            self.apply_search_highlight()
+            self._clear_tts_highlight()
             self.update_tts_controls()
 
     def on_tts_word(self, start: int, end: int):
-        self.tts_highlight_signal.emit(start, end)
+        # 在朗读线程中调用：只记录最新位置，上一次通知还没处理时不再发信号
+        with self._tts_lock:
+            notify = self._pending_tts_range is None
+            self._pending_tts_range = (start, end)
+        if notify:
+            self.tts_highlight_signal.emit(start, end)
 
     def on_tts_finished_callback(self, success: bool, message: str):
         self.tts_finish_signal.emit(success, message or "")
@@ -2087,16 +2300,29 @@ class NovelListTab(QWidget):
 
     @pyqtSlot(int, int)
     def highlight_tts_range(self, start: int, end: int):
-        tmp_cursor = self.content_edit.textCursor()
-        tmp_cursor.setPosition(start)
-        tmp_cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
-        highlight = QTextEdit.ExtraSelection()
-        fmt = QTextCharFormat()
-        fmt.setBackground(Qt.GlobalColor.cyan)
-        highlight.cursor = tmp_cursor
-        highlight.format = fmt
-        self._tts_extra = [highlight]
-        self.apply_search_highlight()
+        """词边界通知：距上次刷新不足一帧时等定时器合并刷新"""
+        if not self.tts_highlight_timer.isActive():
+            self._flush_tts_highlight()
+
+    def _flush_tts_highlight(self):
+        with self._tts_lock:
+            tts_range, self._pending_tts_range = self._pending_tts_range, None
+        if tts_range is None:
+            return
+        # 取到过新位置就重新计时：定时器期间又有新词时，到点再刷新一次
+        self.tts_highlight_timer.start()
+        if tts_range == self._tts_range or not self.tts_active:
+            return
+        self._tts_range = tts_range
+        self.content_edit.set_highlight("tts", tts_range, QColor(Qt.GlobalColor.cyan))
+        self.content_edit.reveal_range(*tts_range)
+
+    def _clear_tts_highlight(self):
+        self.tts_highlight_timer.stop()
+        with self._tts_lock:
+            self._pending_tts_range = None
+        self._tts_range = None
+        self.content_edit.set_highlight("tts", None)
 
     @pyqtSlot(bool, str)
     def handle_tts_finished(self, success: bool, message: str):
@@ -2108,8 +2334,7 @@ class NovelListTab(QWidget):
             self.tts_status_signal.emit(f"朗读失败: {message}")
             if message:
                 QMessageBox.warning(self, "朗读失败", message)
-        self._tts_extra = []
-        self.apply_search_highlight()
+        self._clear_tts_highlight()
 
     @pyqtSlot(bool, str)
     def handle_test_voice_finished(self, success: bool, message: str):
@@ -3590,6 +3815,145 @@ class BatchAlarmDialog(QDialog):
                 QMessageBox.warning(self, "提示", "未找到音频文件")
 
 
+class AlarmTableModel(QAbstractTableModel):
+    """闹钟表格模型
+
+    行为当前分组、排序下的闹钟，按 id 建立行索引；剩余时间文本缓存在模型中，
+    refresh_remaining() 只对显示内容变化的单元格发出 dataChanged。
+    """
+
+    HEADERS = ["", "频率", "日期", "时间", "任务标签", "剩余", "状态"]
+    LOOP_NAMES = {
+        "once": "一次",
+        "daily": "每天",
+        "weekly": "每周",
+        "monthly": "每月",
+        "yearly": "每年",
+        "interval": "间隔",
+    }
+    WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+    REMAINING_COLUMN = 5
+    STATUS_COLUMN = 6
+
+    def __init__(self, remaining_func, parent=None):
+        super().__init__(parent)
+        self._remaining_func = remaining_func
+        self._alarms: List[Dict] = []
+        self._remaining: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._checked: Set[str] = set()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._alarms)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index: QModelIndex):
+        flags = super().flags(index)
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        alarm = self._alarms[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.CheckStateRole and column == 0:
+            return Qt.CheckState.Checked if alarm.get("id") in self._checked else Qt.CheckState.Unchecked
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        loop_type = alarm.get("loop_type", "once")
+        if column == 1:
+            return self.LOOP_NAMES.get(loop_type, "一次")
+        if column == 2:
+            date_str = alarm.get("date", "")
+            if loop_type == "daily":
+                return "每天"
+            if loop_type == "weekly":
+                alarm_date = parse_alarm_date(date_str)
+                if alarm_date is not None:
+                    return self.WEEKDAYS[alarm_date.weekday()]
+            return date_str
+        if column == 3:
+            return alarm.get("time", "")
+        if column == 4:
+            return alarm.get("label", "闹钟任务")
+        if column == self.REMAINING_COLUMN:
+            return self._remaining[index.row()]
+        if column == self.STATUS_COLUMN:
+            return "开启" if alarm.get("enabled", True) else "关闭"
+        return None
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if not index.isValid() or index.column() != 0 or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        alarm_id = self._alarms[index.row()].get("id")
+        if Qt.CheckState(value) == Qt.CheckState.Checked:
+            self._checked.add(alarm_id)
+        else:
+            self._checked.discard(alarm_id)
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def set_alarms(self, alarms: List[Dict]):
+        """整体替换显示的闹钟（分组、排序变化或增删闹钟后调用），勾选状态清空"""
+        now = datetime.now()
+        self.beginResetModel()
+        self._alarms = list(alarms)
+        self._remaining = [self._remaining_func(alarm, now) for alarm in self._alarms]
+        self._row_of = {alarm.get("id"): row for row, alarm in enumerate(self._alarms)}
+        self._checked.clear()
+        self.endResetModel()
+
+    def alarm_at(self, row: int) -> Optional[Dict]:
+        return self._alarms[row] if 0 <= row < len(self._alarms) else None
+
+    def checked_alarms(self) -> List[Dict]:
+        """按显示顺序返回勾选的闹钟"""
+        if not self._checked:
+            return []
+        return [alarm for alarm in self._alarms if alarm.get("id") in self._checked]
+
+    def alarm_changed(self, alarm_id: str):
+        """某个闹钟被修改（不影响排序和分组时），只刷新它所在的行"""
+        row = self._row_of.get(alarm_id)
+        if row is None:
+            return
+        self._remaining[row] = self._remaining_func(self._alarms[row], datetime.now())
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+    def refresh_remaining(self) -> int:
+        """重新计算剩余时间，只对文本变化的单元格发出 dataChanged，返回变化的行数"""
+        now = datetime.now()
+        changed = 0
+        start = None
+        for row, alarm in enumerate(self._alarms):
+            text = self._remaining_func(alarm, now)
+            if text != self._remaining[row]:
+                self._remaining[row] = text
+                changed += 1
+                if start is None:
+                    start = row
+                continue
+            if start is not None:
+                self._emit_remaining_changed(start, row - 1)
+                start = None
+        if start is not None:
+            self._emit_remaining_changed(start, len(self._alarms) - 1)
+        return changed
+
+    def _emit_remaining_changed(self, first: int, last: int):
+        column = self.REMAINING_COLUMN
+        self.dataChanged.emit(self.index(first, column), self.index(last, column), [Qt.ItemDataRole.DisplayRole])
+
+
 class AlarmTab(QWidget):
     """闹钟提醒管理标签页"""
     
@@ -3648,17 +4012,17 @@ class AlarmTab(QWidget):
                 border: none;
                 width: 20px;
             }
-            QTableWidget {
+            QTableView {
                 border: 2px solid #ddd;
                 border-radius: 4px;
                 background-color: white;
                 gridline-color: #e0e0e0;
                 selection-background-color: #E3F2FD;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 6px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #E3F2FD;
                 color: #1976D2;
             }
@@ -3710,12 +4074,12 @@ class AlarmTab(QWidget):
         layout.addLayout(control_layout)
         
         # 表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels(["", "频率", "日期", "时间", "任务标签", "剩余", "状态"])
+        self.table_model = AlarmTableModel(self._calculate_remaining, self)
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.setAlternatingRowColors(True)
         layout.addWidget(self.table)
         
@@ -3726,8 +4090,8 @@ class AlarmTab(QWidget):
         self.delete_button.clicked.connect(self.on_delete_alarm)
         self.clear_button.clicked.connect(self.on_clear_alarms)
         self.recycle_button.clicked.connect(self.on_recycle_bin)
-        self.table.itemDoubleClicked.connect(self.on_table_double_clicked)
-        self.table.cellClicked.connect(self.on_table_cell_clicked)
+        self.table.doubleClicked.connect(self.on_table_double_clicked)
+        self.table.clicked.connect(self.on_table_cell_clicked)
     
     def _load_alarms(self):
         """加载闹钟数据"""
@@ -3750,19 +4114,46 @@ class AlarmTab(QWidget):
             self.deleted_alarms = []
             self.groups_list = ["默认"]
     
+    # 闹钟数据有改动后延迟写盘的时间（毫秒），期间的多次改动合并为一次写入
+    ALARM_SAVE_DELAY_MS = 3000
+
     def _save_alarms(self):
-        """保存闹钟数据"""
+        """保存闹钟数据（闹钟有改动，重新安排响铃定时器并标记待写盘）"""
+        self._reschedule_alarms()
+        self._mark_alarms_dirty()
+
+    def _mark_alarms_dirty(self):
+        """标记闹钟数据待写盘，ALARM_SAVE_DELAY_MS 内最多写一次"""
+        self._alarms_dirty = True
+        if not hasattr(self, "save_timer"):
+            self.save_timer = QTimer(self)
+            self.save_timer.setSingleShot(True)
+            self.save_timer.setInterval(self.ALARM_SAVE_DELAY_MS)
+            self.save_timer.timeout.connect(self._flush_alarms)
+        if not self.save_timer.isActive():
+            self.save_timer.start()
+
+    def _flush_alarms(self):
+        """立即写入闹钟文件（临时文件 + 原子替换，写到一半退出也不会损坏原文件）"""
+        if hasattr(self, "save_timer"):
+            self.save_timer.stop()
+        if not getattr(self, "_alarms_dirty", False):
+            return
+        data = {
+            "alarms": self.alarms,
+            "deleted_alarms": getattr(self, 'deleted_alarms', []),
+            "groups_list": getattr(self, 'groups_list', ["默认"])
+        }
         try:
-            os.makedirs(os.path.dirname(ALARM_DATA_FILE), exist_ok=True)
-            data = {
-                "alarms": self.alarms,
-                "deleted_alarms": getattr(self, 'deleted_alarms', []),
-                "groups_list": getattr(self, 'groups_list', ["默认"])
-            }
-            with open(ALARM_DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
+            atomic_write_json(ALARM_DATA_FILE, data)
+            self._alarms_dirty = False
+        except Exception as exc:
+            print(f"[AlarmTab] 保存闹钟失败: {exc}")
+
+    def closeEvent(self, event):
+        """关闭时写入尚未保存的改动"""
+        self._flush_alarms()
+        super().closeEvent(event)
     
     def _refresh_groups(self):
         """刷新分组列表"""
@@ -3787,7 +4178,7 @@ class AlarmTab(QWidget):
             self.group_combo.setCurrentText(current_text)
     
     def _refresh_table(self):
-        """刷新表格"""
+        """刷新表格（按当前分组和排序重新设置模型的行）"""
         # 过滤分组
         selected_group = self.group_combo.currentText()
         filtered_alarms = self.alarms
@@ -3803,69 +4194,24 @@ class AlarmTab(QWidget):
             reverse = "↓" in sort_text
             filtered_alarms = sorted(filtered_alarms, key=lambda x: x.get("time", ""), reverse=reverse)
         
-        self.table.setRowCount(len(filtered_alarms))
-        
-        for row, alarm in enumerate(filtered_alarms):
-            # 复选框
-            checkbox = QTableWidgetItem()
-            checkbox.setCheckState(Qt.CheckState.Unchecked)
-            self.table.setItem(row, 0, checkbox)
-            
-            # 频率
-            loop_type = alarm.get("loop_type", "once")
-            loop_map = {
-                "once": "一次",
-                "daily": "每天",
-                "weekly": "每周",
-                "monthly": "每月",
-                "yearly": "每年",
-                "interval": "间隔",
-            }
-            self.table.setItem(row, 1, QTableWidgetItem(loop_map.get(loop_type, "一次")))
-            
-            # 日期
-            date_str = alarm.get("date", "")
-            if loop_type == "daily":
-                date_str = "每天"
-            elif loop_type == "weekly":
-                # 计算星期几
-                try:
-                    date_obj = datetime.fromisoformat(date_str)
-                    weekdays = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
-                    weekday = date_obj.weekday()
-                    date_str = weekdays[weekday]
-                except:
-                    pass
-            self.table.setItem(row, 2, QTableWidgetItem(date_str))
-            
-            # 时间
-            time_str = alarm.get("time", "")
-            self.table.setItem(row, 3, QTableWidgetItem(time_str))
-            
-            # 任务标签
-            label = alarm.get("label", "闹钟任务")
-            self.table.setItem(row, 4, QTableWidgetItem(label))
-            
-            # 剩余时间
-            remaining = self._calculate_remaining(alarm)
-            self.table.setItem(row, 5, QTableWidgetItem(remaining))
-            
-            # 状态（开关）
-            status_item = QTableWidgetItem("开启" if alarm.get("enabled", True) else "关闭")
-            status_item.setData(Qt.ItemDataRole.UserRole, alarm.get("id"))
-            self.table.setItem(row, 6, status_item)
-        
-        self.table.resizeColumnsToContents()
+        self.table_model.set_alarms(filtered_alarms)
+
+    def _selected_alarms(self) -> List[Dict]:
+        """表格中选中的闹钟（按行选择）"""
+        rows = sorted(index.row() for index in self.table.selectionModel().selectedRows())
+        return [self.table_model.alarm_at(row) for row in rows]
     
-    def _calculate_remaining(self, alarm: Dict) -> str:
+    def _calculate_remaining(self, alarm: Dict, now: Optional[datetime] = None) -> str:
         """计算剩余时间"""
         try:
             time_str = alarm.get("time", "")
             if not time_str:
                 return ""
             
-            now = datetime.now()
-            alarm_time = datetime.strptime(time_str, "%H:%M:%S").time()
+            now = now or datetime.now()
+            alarm_time = parse_alarm_time(time_str)
+            if alarm_time is None:
+                return ""
             alarm_datetime = datetime.combine(now.date(), alarm_time)
             
             loop_type = alarm.get("loop_type", "once")
@@ -3874,13 +4220,9 @@ class AlarmTab(QWidget):
                 if alarm_datetime <= now:
                     alarm_datetime += timedelta(days=1)
             elif loop_type == "once":
-                date_str = alarm.get("date", "")
-                if date_str:
-                    try:
-                        alarm_date = datetime.fromisoformat(date_str).date()
-                        alarm_datetime = datetime.combine(alarm_date, alarm_time)
-                    except:
-                        pass
+                alarm_date = parse_alarm_date(alarm.get("date", ""))
+                if alarm_date is not None:
+                    alarm_datetime = datetime.combine(alarm_date, alarm_time)
             
             if alarm_datetime > now:
                 delta = alarm_datetime - now
@@ -3899,12 +4241,32 @@ class AlarmTab(QWidget):
         except Exception:
             return ""
     
+    # 单次定时器的最长等待时间（毫秒），防止系统时间被修改后错过闹钟
+    ALARM_TIMER_MAX_WAIT_MS = 10 * 60 * 1000
+
     def _setup_alarm_checker(self):
-        """设置闹钟检查定时器"""
+        """设置闹钟定时器：按下一次响铃时间排序，只为最早的闹钟设置一个单次定时器"""
+        self.alarm_schedule = AlarmSchedule()
         self.check_timer = QTimer(self)
+        self.check_timer.setSingleShot(True)
         self.check_timer.timeout.connect(self._check_alarms)
-        self.check_timer.start(1000)  # 每秒检查一次
-    
+        self._reschedule_alarms()
+
+    def _reschedule_alarms(self):
+        """重新计算所有闹钟的下一次响铃时间（新建、修改、删除闹钟后调用）"""
+        if not hasattr(self, "alarm_schedule"):
+            return
+        self.alarm_schedule.rebuild(self.alarms, datetime.now())
+        self._arm_alarm_timer()
+
+    def _arm_alarm_timer(self):
+        next_time = self.alarm_schedule.next_time()
+        if next_time is None:
+            self.check_timer.stop()
+            return
+        delay_ms = int((next_time - time.time()) * 1000)
+        self.check_timer.start(min(max(delay_ms, 0), self.ALARM_TIMER_MAX_WAIT_MS))
+
     def _setup_refresh_timer(self):
         """设置剩余时间刷新定时器"""
         self.refresh_timer = QTimer(self)
@@ -3912,72 +4274,23 @@ class AlarmTab(QWidget):
         self.refresh_timer.start(60000)  # 每分钟刷新一次剩余时间
     
     def _refresh_remaining_time(self):
-        """只刷新剩余时间列"""
-        for row in range(self.table.rowCount()):
-            alarm_id = self.table.item(row, 6).data(Qt.ItemDataRole.UserRole)
-            if alarm_id:
-                alarm = next((a for a in self.alarms if a.get("id") == alarm_id), None)
-                if alarm:
-                    remaining = self._calculate_remaining(alarm)
-                    self.table.setItem(row, 5, QTableWidgetItem(remaining))
+        """只刷新剩余时间列中显示内容变化的单元格"""
+        self.table_model.refresh_remaining()
     
     def _check_alarms(self):
-        """检查并触发闹钟"""
+        """定时器到点：触发所有到时间的闹钟并安排下一次"""
         now = datetime.now()
-        current_time = now.strftime("%H:%M:%S")
-        current_date = now.date()
-        
-        for alarm in self.alarms:
-            if not alarm.get("enabled", True):
-                continue
-            
-            alarm_time = alarm.get("time", "")
-            if not alarm_time:
-                continue
-            
-            loop_type = alarm.get("loop_type", "once")
-            
-            should_trigger = False
-            
-            if loop_type == "daily":
-                # 每天：只要时间匹配就触发
-                if alarm_time[:5] == current_time[:5]:  # 只比较时和分
-                    should_trigger = True
-            elif loop_type == "once":
-                # 一次：日期和时间都要匹配
-                date_str = alarm.get("date", "")
-                if date_str:
-                    try:
-                        alarm_date = datetime.fromisoformat(date_str).date()
-                        if alarm_date == current_date and alarm_time[:5] == current_time[:5]:
-                            should_trigger = True
-                    except:
-                        pass
-            elif loop_type == "weekly":
-                # 每周：检查星期几
-                date_str = alarm.get("date", "")
-                if date_str:
-                    try:
-                        alarm_date = datetime.fromisoformat(date_str).date()
-                        if alarm_date.weekday() == current_date.weekday() and alarm_time[:5] == current_time[:5]:
-                            should_trigger = True
-                    except:
-                        pass
-            
-            if should_trigger:
-                # 检查是否已经触发过（避免重复触发）
-                # 使用 HH:MM 格式进行比较，避免秒级重复触发
-                current_time_minute = current_time[:5]  # HH:MM
-                last_trigger = alarm.get("last_trigger_time", "")
-                last_trigger_minute = last_trigger[:5] if last_trigger else ""
-                
-                if last_trigger_minute != current_time_minute:
-                    # 在触发前先更新 last_trigger_time，防止重复触发
-                    # 使用完整时间（包含秒），确保在这一分钟内不会再次触发
-                    alarm["last_trigger_time"] = current_time
-                    self._save_alarms()
-                    # 触发闹钟
-                    self._trigger_alarm(alarm)
+        due = self.alarm_schedule.pop_due(now)
+        for alarm, fire_at in due:
+            # 在触发前先记录本次响铃，防止重复触发
+            alarm["last_trigger_at"] = fire_at
+            alarm["last_trigger_time"] = now.strftime("%H:%M:%S")
+            self.alarm_schedule.update(alarm, now)
+        self._arm_alarm_timer()
+        if due:
+            self._mark_alarms_dirty()
+        for alarm, _ in due:
+            self._trigger_alarm(alarm)
     
     def _trigger_alarm(self, alarm: Dict):
         """触发闹钟"""
@@ -4019,9 +4332,7 @@ class AlarmTab(QWidget):
             QMessageBox.warning(self, "提示", "请先选择要修改的闹钟")
             return
         
-        row = selected_rows[0].row()
-        alarm_id = self.table.item(row, 6).data(Qt.ItemDataRole.UserRole)
-        alarm = next((a for a in self.alarms if a.get("id") == alarm_id), None)
+        alarm = self.table_model.alarm_at(selected_rows[0].row())
         
         if not alarm:
             return
@@ -4036,36 +4347,14 @@ class AlarmTab(QWidget):
     
     def on_delete_alarm(self):
         """删除闹钟到回收站（支持复选框和行选择）"""
-        # 先检查复选框选择的项
-        ids_to_delete = []
-        alarms_to_move = []
-        
-        for row in range(self.table.rowCount()):
-            checkbox_item = self.table.item(row, 0)
-            if checkbox_item and checkbox_item.checkState() == Qt.CheckState.Checked:
-                alarm_id = self.table.item(row, 6).data(Qt.ItemDataRole.UserRole)
-                if alarm_id:
-                    ids_to_delete.append(alarm_id)
-                    alarm = next((a for a in self.alarms if a.get("id") == alarm_id), None)
-                    if alarm:
-                        alarm["deleted_time"] = time.time()
-                        alarms_to_move.append(alarm)
-        
-        # 如果没有复选框选择，检查行选择
-        if not ids_to_delete:
-            selected_rows = self.table.selectionModel().selectedRows()
-            if not selected_rows:
+        # 先检查复选框选择的项，没有勾选时使用行选择
+        alarms_to_move = self.table_model.checked_alarms()
+        if not alarms_to_move:
+            if not self.table.selectionModel().selectedRows():
                 QMessageBox.warning(self, "提示", "请先勾选或选择要删除的闹钟")
                 return
-            
-            for row_index in [r.row() for r in selected_rows]:
-                alarm_id = self.table.item(row_index, 6).data(Qt.ItemDataRole.UserRole)
-                if alarm_id and alarm_id not in ids_to_delete:
-                    ids_to_delete.append(alarm_id)
-                    alarm = next((a for a in self.alarms if a.get("id") == alarm_id), None)
-                    if alarm:
-                        alarm["deleted_time"] = time.time()
-                        alarms_to_move.append(alarm)
+            alarms_to_move = self._selected_alarms()
+        ids_to_delete = {alarm.get("id") for alarm in alarms_to_move if alarm.get("id")}
         
         if not ids_to_delete:
             QMessageBox.warning(self, "提示", "请先勾选或选择要删除的闹钟")
@@ -4075,6 +4364,9 @@ class AlarmTab(QWidget):
             return
         
         # 移到回收站
+        deleted_time = time.time()
+        for alarm in alarms_to_move:
+            alarm["deleted_time"] = deleted_time
         self.deleted_alarms.extend(alarms_to_move)
         self.alarms = [a for a in self.alarms if a.get("id") not in ids_to_delete]
         self._save_alarms()
@@ -4088,21 +4380,20 @@ class AlarmTab(QWidget):
         self._save_alarms()
         self._refresh_table()
     
-    def on_table_double_clicked(self, item: QTableWidgetItem):
+    def on_table_double_clicked(self, index: QModelIndex):
         """双击表格项，修改闹钟"""
-        if item.column() != 6:  # 不是状态列
+        if index.column() != AlarmTableModel.STATUS_COLUMN:
             self.on_modify_alarm()
     
-    def on_table_cell_clicked(self, row: int, col: int):
+    def on_table_cell_clicked(self, index: QModelIndex):
         """点击表格单元格"""
-        if col == 6:  # 状态列
-            alarm_id = self.table.item(row, 6).data(Qt.ItemDataRole.UserRole)
-            alarm = next((a for a in self.alarms if a.get("id") == alarm_id), None)
+        if index.column() == AlarmTableModel.STATUS_COLUMN:
+            alarm = self.table_model.alarm_at(index.row())
             if alarm:
-                # 切换状态
+                # 切换状态（不影响分组和排序，只刷新这一行）
                 alarm["enabled"] = not alarm.get("enabled", True)
                 self._save_alarms()
-                self._refresh_table()
+                self.table_model.alarm_changed(alarm.get("id"))
     
     def on_recycle_bin(self):
         """打开回收站"""
@@ -5601,6 +5892,62 @@ class RegionSelector(QDialog):
 # 全局 OCR 锁（PaddleOCR 可能不支持多线程并发）
 _ocr_global_lock = threading.Lock()
 
+# 共享的 OCR 引擎（首次使用时才加载，多个界面共用同一个实例）
+_ocr_engine_cache = None
+_ocr_engine_load_lock = threading.Lock()
+
+
+def load_ocr_engine(warmup: bool = True):
+    """加载（或复用）PaddleOCR 引擎
+
+    首次调用时才导入 paddleocr 并创建实例，warmup=True 时额外跑一次空白图识别，
+    让模型真正加载完成。耗时较长，应在后台线程中调用。
+    """
+    global _ocr_engine_cache
+    with _ocr_engine_load_lock:
+        if _ocr_engine_cache is not None:
+            return _ocr_engine_cache
+        from paddleocr import PaddleOCR
+        print("[load_ocr_engine] 正在创建 PaddleOCR 实例...")
+        engine = PaddleOCR(
+            use_angle_cls=False,  # 关闭角度分类以提高速度
+            lang='ch',
+            det_db_box_thresh=0.5,  # 降低检测阈值
+            rec_batch_num=6  # 批处理数量
+        )
+        if warmup and NUMPY_AVAILABLE:
+            start_time = time.time()
+            test_img = np.ones((100, 200, 3), dtype=np.uint8) * 255  # 白色图像
+            with _ocr_global_lock:
+                engine.ocr(test_img)
+            print(f"[load_ocr_engine] 预热识别完成，耗时: {time.time() - start_time:.2f}秒")
+        _ocr_engine_cache = engine
+        return engine
+
+
+def reset_ocr_engine():
+    """丢弃共享的 OCR 引擎，下次 load_ocr_engine() 时重新创建"""
+    global _ocr_engine_cache
+    with _ocr_engine_load_lock:
+        _ocr_engine_cache = None
+
+
+class OCRWarmupWorker(QThread):
+    """后台加载并预热 OCR 模型"""
+    ready_signal = pyqtSignal(object)  # 传递加载好的引擎
+    error_signal = pyqtSignal(str)
+
+    def run(self):
+        try:
+            start_time = time.time()
+            engine = load_ocr_engine(warmup=True)
+            print(f"[OCRWarmupWorker] OCR 模型就绪，总耗时: {time.time() - start_time:.2f}秒")
+            self.ready_signal.emit(engine)
+        except Exception as exc:
+            import traceback
+            print(f"[OCRWarmupWorker] OCR 加载失败: {exc}\n{traceback.format_exc()}")
+            self.error_signal.emit(str(exc))
+
 class OCRWorker(QThread):
     """OCR 处理工作线程"""
     finished_signal = pyqtSignal(list)  # 传递识别结果
@@ -5854,129 +6201,113 @@ class MarketAnalysisTab(QWidget):
         
         # 市场数据存储：{物品名: {'buy': [价格列表], 'sell': [价格列表], 'latest_time': 时间戳}}
         self.market_data: Dict[str, Dict] = {}
-        self.raw_messages: List[Dict] = []  # 原始消息记录
+        # 原始消息记录（定长环形缓冲区，由消息日志模型持有，整体替换时用 reset()）
+        self.message_model = MessageLogModel(parent=self)
+        self.raw_messages = self.message_model.messages
         # 物品仓库（统计出现次数、价格历史等）
         self.item_repository: Dict[str, Dict] = {}
+        # 本次运行期间各物品价格的分位数草图（不保存）
+        self.session_sketches: Dict[str, QuantileSketch] = {}
+        # 价格/学习记录的追加日志，定期压缩到 market_data.json
+        self.market_journal = MarketJournal(self._get_market_data_file())
+        # 日志和快照由后台线程批量写盘，界面线程只入队
+        self.market_writer = WriteBehindQueue(
+            self._write_market_batch,
+            name="MarketWriter",
+            on_stop=self.market_journal.close,
+        )
+        # 每条价格同时写入 market_data.db（与市场分析 V2、价格趋势图共用，见 market_store 属性）
+        get_store_writer()
         # 物品同义词规则
         self.alias_config: Dict[str, Dict[str, object]] = self._load_item_aliases()
         self.item_alias_exact, self.item_alias_contains = self._build_item_alias_rules()
         self.item_matcher = SmartItemMatcher(self.alias_config)
         self._ocr_resetting = False
+        # OCR 模型在后台懒加载：首次显示本页或开始识别时才开始加载
+        self.ocr_warmup_worker = None
+        self._ocr_load_error: Optional[str] = None
+        self._capture_pending = False  # 模型加载完成后是否自动开始识别
+        # 界面刷新调度：记录价格只标记视图为脏，定时器到点后每个脏视图只重绘一次
+        self._dirty_views: Set[str] = set()
+        self.ui_refresh_timer = QTimer(self)
+        self.ui_refresh_timer.setSingleShot(True)
+        self.ui_refresh_timer.setInterval(self.UI_REFRESH_INTERVAL_MS)
+        self.ui_refresh_timer.timeout.connect(self._flush_ui_refresh)
+        # 物品趋势表只重算有变化的物品；None 表示需要全部重算（加载、导入、清空）
+        self._repository_dirty: Optional[Set[str]] = None
+        self._repository_day: Optional[str] = None
+        # 旧版仓库数据是否已导入 market_data.db（保存在快照中）
+        self._store_imported = False
         
-        self._init_ocr()
         self._build_ui()
         self._load_market_data()
 
+    def showEvent(self, event):
+        """首次显示市场分析页时，后台预热 OCR 模型"""
+        super().showEvent(event)
+        if self._dirty_views:
+            # 隐藏期间积累的更新在切回本页时一次性刷新
+            self.ui_refresh_timer.start(0)
+        if self._ocr_load_error is None:
+            self._init_ocr()
+
     def _init_ocr(self):
-        """初始化 OCR 引擎"""
-        print("[_init_ocr] 开始初始化 OCR 引擎")
+        """在后台线程中加载并预热 OCR 引擎（不阻塞界面）"""
+        if self.ocr_engine is not None:
+            return
         if not PADDLEOCR_AVAILABLE:
-            print("[_init_ocr] PaddleOCR 未安装")
+            self._set_ocr_status("未安装")
+            return
+        if self.ocr_warmup_worker is not None and self.ocr_warmup_worker.isRunning():
+            return
+        print("[_init_ocr] 开始在后台加载 OCR 引擎")
+        self._ocr_load_error = None
+        self._set_ocr_status("加载中...")
+        self.ocr_warmup_worker = OCRWarmupWorker()
+        self.ocr_warmup_worker.ready_signal.connect(self._on_ocr_ready)
+        self.ocr_warmup_worker.error_signal.connect(self._on_ocr_load_failed)
+        self.ocr_warmup_worker.finished.connect(self._on_ocr_warmup_finished)
+        self.ocr_warmup_worker.start()
+
+    def _on_ocr_ready(self, engine):
+        """OCR 模型加载并预热完成"""
+        self.ocr_engine = engine
+        self._set_ocr_status("就绪")
+        print("[_on_ocr_ready] OCR 引擎已就绪")
+        if self._capture_pending:
+            self._capture_pending = False
+            self._start_capture()
+        elif self.is_capturing and not self.is_processing:
+            # 引擎重置后恢复识别循环
+            self._capture_and_analyze()
+
+    def _on_ocr_load_failed(self, error_msg: str):
+        """OCR 模型加载失败"""
+        self._ocr_load_error = error_msg
+        self._set_ocr_status("加载失败")
+        if self._capture_pending:
+            self._capture_pending = False
+            self.capture_button.setText("开始识别")
+            self.status_label.setText("状态：OCR 加载失败")
             QMessageBox.warning(
                 self,
-                "OCR 未安装",
-                "请安装 PaddleOCR：\npip install paddlepaddle paddleocr\n\n"
-                "或使用其他 OCR 方案。"
+                "OCR 初始化失败",
+                f"无法初始化 OCR 引擎：{error_msg}\n\n"
+                "可能的原因：\n"
+                "1. PaddleOCR 模型加载失败\n"
+                "2. 系统资源不足\n"
+                "3. PaddleOCR 版本不兼容\n\n"
+                "请检查环境配置或重新安装 PaddleOCR。"
             )
-            return
-        try:
-            print("[_init_ocr] 正在创建 PaddleOCR 实例...")
-            # 关闭角度分类以提高速度
-            # 新版PaddleOCR会自动检测GPU
-            self.ocr_engine = PaddleOCR(
-                use_angle_cls=False,  # 关闭角度分类以提高速度
-                lang='ch',
-                det_db_box_thresh=0.5,  # 降低检测阈值
-                rec_batch_num=6  # 批处理数量
-            )
-            print("[_init_ocr] OCR 引擎初始化成功")
-            
-            # 测试 OCR 是否正常工作（10秒超时）
-            print("[_init_ocr] 开始测试 OCR 功能...")
-            if not self._test_ocr():
-                # 测试失败，但不退出程序，只显示警告
-                QMessageBox.warning(
-                    self,
-                    "OCR 测试失败",
-                    "OCR 引擎测试失败：10秒内无法完成识别。\n\n"
-                    "可能的原因：\n"
-                    "1. PaddleOCR 模型加载失败\n"
-                    "2. 系统资源不足\n"
-                    "3. PaddleOCR 版本不兼容\n\n"
-                    "请检查环境配置或重新安装 PaddleOCR。\n\n"
-                    "程序将继续运行，但 OCR 功能可能无法正常工作。"
-                )
-                print("[_init_ocr] OCR 测试失败，但程序继续运行")
-                return
-            print("[_init_ocr] OCR 测试通过，可以正常使用")
-        except Exception as exc:
-            import traceback
-            error_detail = traceback.format_exc()
-            print(f"[_init_ocr] OCR 初始化失败: {exc}\n{error_detail}")
-            QMessageBox.warning(self, "OCR 初始化失败", f"无法初始化 OCR 引擎：{exc}\n\n详细信息：\n{error_detail}")
-    
-    def _test_ocr(self):
-        """测试 OCR 是否正常工作（10秒超时）"""
-        try:
-            if not self.ocr_engine:
-                return False
-            
-            if not NUMPY_AVAILABLE:
-                print("[_test_ocr] numpy 未安装，无法测试")
-                return False
-            
-            # 创建一个简单的测试图像（白色背景，黑色文字）
-            print("[_test_ocr] 创建测试图像...")
-            test_img = np.ones((100, 200, 3), dtype=np.uint8) * 255  # 白色图像
-            
-            # 使用线程测试，设置超时
-            test_result = [None]
-            test_error = [None]
-            test_completed = threading.Event()
-            
-            def test_ocr_in_thread():
-                try:
-                    print("[_test_ocr] 在线程中调用 OCR...")
-                    start_time = time.time()
-                    
-                    # 获取锁
-                    with _ocr_global_lock:
-                        print("[_test_ocr] 获取锁，开始测试...")
-                        # 使用 ocr 方法（更稳定）
-                        result = self.ocr_engine.ocr(test_img)
-                        
-                        elapsed = time.time() - start_time
-                        print(f"[_test_ocr] OCR 测试完成，耗时: {elapsed:.2f}秒")
-                        test_result[0] = result
-                        test_completed.set()
-                except Exception as e:
-                    import traceback
-                    error_detail = traceback.format_exc()
-                    print(f"[_test_ocr] 测试出错: {e}\n{error_detail}")
-                    test_error[0] = str(e)
-                    test_completed.set()
-            
-            # 启动测试线程
-            test_thread = threading.Thread(target=test_ocr_in_thread, daemon=True)
-            test_thread.start()
-            
-            # 等待最多10秒
-            print("[_test_ocr] 等待测试完成（最多10秒）...")
-            if test_completed.wait(timeout=10):
-                if test_error[0]:
-                    print(f"[_test_ocr] 测试失败: {test_error[0]}")
-                    return False
-                else:
-                    print("[_test_ocr] 测试成功")
-                    return True
-            else:
-                print("[_test_ocr] 测试超时（10秒）")
-                return False
-                
-        except Exception as e:
-            import traceback
-            print(f"[_test_ocr] 测试异常: {e}\n{traceback.format_exc()}")
-            return False
+
+    def _on_ocr_warmup_finished(self):
+        if self.ocr_warmup_worker:
+            self.ocr_warmup_worker.deleteLater()
+            self.ocr_warmup_worker = None
+
+    def _set_ocr_status(self, text: str):
+        if hasattr(self, "ocr_status_label"):
+            self.ocr_status_label.setText(f"OCR：{text}")
 
     def _build_ui(self):
         """构建界面"""
@@ -6025,6 +6356,9 @@ class MarketAnalysisTab(QWidget):
         
         control_layout.addStretch()
         
+        self.ocr_status_label = QLabel("OCR：未加载")
+        control_layout.addWidget(self.ocr_status_label)
+        
         self.status_label = QLabel("状态：未开始")
         control_layout.addWidget(self.status_label)
         
@@ -6050,7 +6384,7 @@ class MarketAnalysisTab(QWidget):
         self.min_profit_spin.setRange(0, 9999)
         self.min_profit_spin.setDecimals(1)
         self.min_profit_spin.setSuffix(" 万")
-        self.min_profit_spin.valueChanged.connect(lambda _: self._update_ui())
+        self.min_profit_spin.valueChanged.connect(lambda _: self._on_filter_control_changed())
         filter_layout.addWidget(self.min_profit_spin)
         filter_layout.addStretch()
         main_layout.addLayout(filter_layout)
@@ -6062,9 +6396,14 @@ class MarketAnalysisTab(QWidget):
         left_panel = QWidget()
         left_layout = QVBoxLayout(left_panel)
         left_layout.setContentsMargins(0, 0, 0, 0)
-        left_layout.addWidget(QLabel("识别到的消息（最近100条）："))
-        self.message_list = QListWidget()
+        left_layout.addWidget(QLabel(f"识别到的消息（最近{self.message_model.messages.maxlen}条）："))
+        self.message_list = QListView()
+        self.message_list.setModel(self.message_model)
+        self.message_list.setUniformItemSizes(True)
         self.message_list.setMaximumWidth(400)
+        # 停在底部时自动跟随新消息，向上翻看历史时不打断
+        self._follow_messages = True
+        self.message_list.verticalScrollBar().valueChanged.connect(self._on_message_scroll)
         left_layout.addWidget(self.message_list)
         splitter.addWidget(left_panel)
         
@@ -6076,33 +6415,38 @@ class MarketAnalysisTab(QWidget):
         self.result_tree = QTreeWidget()
         self.result_tree.setHeaderLabels(["分类/物品", "统计"])
         self.result_tree.setAlternatingRowColors(True)
+        self.category_tree = CategoryTreeIndex(self.result_tree)
         right_layout.addWidget(self.result_tree)
         self.category_stats_label = QLabel("分类统计：暂无数据")
         right_layout.addWidget(self.category_stats_label)
 
         right_layout.addWidget(QLabel("市场价格汇总（按利润排序）："))
-        self.market_table = QTableWidget()
-        self.market_table.setColumnCount(6)
-        self.market_table.setHorizontalHeaderLabels(["物品名", "最低收价", "最高收价", "最低卖价", "最高卖价", "利润空间"])
+        # 市场表格使用模型/视图：刷新时只通知变化的行，筛选和排序由代理模型完成
+        self.market_model = MarketTableModel(self)
+        self.market_proxy = MarketFilterProxyModel(self)
+        self.market_proxy.setSourceModel(self.market_model)
+        self.market_table = QTableView()
+        self.market_table.setModel(self.market_proxy)
         self.market_table.horizontalHeader().setStretchLastSection(True)
         self.market_table.setAlternatingRowColors(True)
+        self.market_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.market_table.setSortingEnabled(True)
+        self.market_table.sortByColumn(MarketTableModel.PROFIT_COLUMN, Qt.SortOrder.DescendingOrder)
         right_layout.addWidget(self.market_table)
         right_layout.addWidget(QLabel("物品趋势分析："))
-        self.item_table = QTableWidget()
-        self.item_table.setColumnCount(7)
-        self.item_table.setHorizontalHeaderLabels([
-            "物品名",
-            "出现次数",
-            "最新价格(万)",
-            "今日均价(万)",
-            "昨日均价(万)",
-            "7日均价(万)",
-            "趋势"
-        ])
+        # 趋势表同样使用模型/视图，变化的行由排序代理移动到排序位置
+        self.repository_model = RepositoryTableModel(self)
+        self.repository_proxy = QSortFilterProxyModel(self)
+        self.repository_proxy.setSourceModel(self.repository_model)
+        self.repository_proxy.setSortRole(RepositoryTableModel.SORT_ROLE)
+        self.repository_proxy.setDynamicSortFilter(True)
+        self.item_table = QTableView()
+        self.item_table.setModel(self.repository_proxy)
         self.item_table.horizontalHeader().setStretchLastSection(True)
         self.item_table.setAlternatingRowColors(True)
+        self.item_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.item_table.setSortingEnabled(True)
+        self.item_table.sortByColumn(RepositoryTableModel.COUNT_COLUMN, Qt.SortOrder.DescendingOrder)
         right_layout.addWidget(self.item_table)
         splitter.addWidget(right_panel)
         
@@ -6147,9 +6491,23 @@ class MarketAnalysisTab(QWidget):
     def _toggle_capture(self):
         """切换识别状态"""
         print(f"[_toggle_capture] 点击切换，is_capturing={self.is_capturing}, ocr_engine={self.ocr_engine is not None}")
+        if self._capture_pending:
+            # 模型还在加载，再次点击视为取消
+            self._capture_pending = False
+            self.capture_button.setText("开始识别")
+            self.status_label.setText("状态：已取消")
+            return
         if not self.ocr_engine:
-            print("[_toggle_capture] OCR 引擎未初始化")
-            QMessageBox.warning(self, "错误", "OCR 引擎未初始化，请先安装 PaddleOCR")
+            if not PADDLEOCR_AVAILABLE:
+                print("[_toggle_capture] OCR 引擎未安装")
+                QMessageBox.warning(self, "错误", "OCR 引擎未初始化，请先安装 PaddleOCR")
+                return
+            # 模型尚未就绪：启动（或等待）后台加载，完成后自动开始识别
+            print("[_toggle_capture] OCR 模型未就绪，等待后台加载完成")
+            self._capture_pending = True
+            self.capture_button.setText("取消")
+            self.status_label.setText("状态：OCR 模型加载中，完成后自动开始识别...")
+            self._init_ocr()
             return
         
         if self.is_capturing:
@@ -6334,7 +6692,7 @@ class MarketAnalysisTab(QWidget):
                 # 检查线程运行时间
                 if hasattr(self.ocr_worker, 'start_time'):
                     elapsed = time.time() - self.ocr_worker.start_time
-                    if elapsed > 60:  # 60秒超时（第一次可能很慢，因为要加载模型）
+                    if elapsed > 60:  # 60秒超时（模型已在后台预热，正常识别远小于此值）
                         print(f"[_capture_and_analyze] OCR 线程运行超时 ({elapsed:.1f}秒)，强制清理")
                         try:
                             if hasattr(self.ocr_worker, 'stop'):
@@ -6400,21 +6758,21 @@ class MarketAnalysisTab(QWidget):
         try:
             # 分析文本，提取价格信息
             old_item_count = len(self.market_data)
-            old_message_count = len(self.raw_messages)
+            old_message_count = self.message_model.appended
             
             print(f"[_on_ocr_finished] 开始分析文本...")
             self._analyze_texts(texts)
             print(f"[_on_ocr_finished] 文本分析完成")
             
             new_item_count = len(self.market_data)
-            new_message_count = len(self.raw_messages)
+            new_message_count = self.message_model.appended
             added_items = new_item_count - old_item_count
             added_messages = new_message_count - old_message_count
             
             print(f"[_on_ocr_finished] 提取结果: {added_messages}条消息, {added_items}个新物品")
             
-            # 更新UI显示
-            self._update_ui()
+            # 本帧的所有价格记录合并为一次刷新
+            self._flush_ui_refresh()
             
             self.status_label.setText(f"状态：识别完成，{len(texts)}条文本，提取{added_messages}条价格信息，{added_items}个新物品")
             
@@ -6470,6 +6828,7 @@ class MarketAnalysisTab(QWidget):
                 print(f"[_restart_ocr_engine] 正在重置 OCR 引擎，原因: {reason}")
                 self._cleanup_worker()
                 self.ocr_engine = None
+                reset_ocr_engine()
                 try:
                     import gc
                     gc.collect()
@@ -7246,7 +7605,7 @@ class MarketAnalysisTab(QWidget):
         )
         dialog.exec()
         self._save_market_data()
-        self._update_ui()
+        self._update_ui('messages')
 
     def _apply_learning_feedback(
         self,
@@ -7301,6 +7660,15 @@ class MarketAnalysisTab(QWidget):
         message['category'] = category
         message['subcategory'] = subcategory
         message['status'] = 'learned'
+        self.message_model.message_changed(message_index)
+        self._append_journal({
+            'type': 'learn',
+            'time': time.time(),
+            'message_id': message.get('id'),
+            'item': canonical_name,
+            'category': category,
+            'subcategory': subcategory,
+        })
 
         return True, "已更新词典并记录学习结果"
 
@@ -7309,6 +7677,13 @@ class MarketAnalysisTab(QWidget):
             return False, "记录不存在"
         status = status or "pending"
         self.raw_messages[message_index]['status'] = status
+        self.message_model.message_changed(message_index)
+        self._append_journal({
+            'type': 'status',
+            'time': time.time(),
+            'message_id': self.raw_messages[message_index].get('id'),
+            'status': status,
+        })
         return True, f"已标记为{status}"
 
     def _export_learning_data(self):
@@ -7317,14 +7692,13 @@ class MarketAnalysisTab(QWidget):
         if not file_path:
             return
         data = {
-            'market_data': self.market_data,
-            'raw_messages': self.raw_messages,
-            'item_repository': self.item_repository,
+            'market_data': self._serialize_market_data(),
+            'raw_messages': list(self.raw_messages),
+            'item_repository': self._serialize_item_repository(),
             'alias_config': self.alias_config,
         }
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            atomic_write_json(file_path, data)
             QMessageBox.information(self, "成功", f"已导出到：{file_path}")
         except Exception as exc:
             QMessageBox.warning(self, "导出失败", f"无法保存文件：{exc}")
@@ -7344,19 +7718,24 @@ class MarketAnalysisTab(QWidget):
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-            self.market_data = data.get('market_data', {}) or {}
-            self.raw_messages = data.get('raw_messages', []) or []
-            self.item_repository = data.get('item_repository', {}) or {}
+            self.market_data = self._restore_market_data(data.get('market_data', {}) or {})
+            self.message_model.reset(data.get('raw_messages', []) or [])
+            self.item_repository = self._restore_item_repository(data.get('item_repository', {}) or {})
+            self._repository_dirty = None
             self.alias_config = data.get('alias_config', self.alias_config) or self.alias_config
             for msg in self.raw_messages:
                 if isinstance(msg, dict):
                     msg.setdefault('status', 'pending')
                     msg.setdefault('raw_item', msg.get('item', ''))
+                    if not msg.get('id'):
+                        msg['id'] = uuid.uuid4().hex
             self.item_alias_exact, self.item_alias_contains = self._build_item_alias_rules()
             if hasattr(self, "item_matcher"):
                 self.item_matcher.update_aliases(self.alias_config)
             self._save_item_aliases()
             self._save_market_data()
+            # 快照中的价格历史在后台分批导入 market_data.db（同一文件只导入一次）
+            self.market_store.import_snapshot(file_path)
             self._update_ui()
             QMessageBox.information(self, "成功", "数据已导入。")
         except Exception as exc:
@@ -7403,7 +7782,7 @@ class MarketAnalysisTab(QWidget):
         self._on_filter_control_changed()
 
     def _on_filter_control_changed(self):
-        self._update_ui()
+        self._update_ui('market')
 
     def _take_screenshot(self):
         """截图"""
@@ -7842,68 +8221,167 @@ class MarketAnalysisTab(QWidget):
         """记录价格信息"""
         if not match_info:
             return
-        item_name = match_info.standard_name
+        event = {
+            'type': 'price',
+            'time': time.time(),
+            # 消息 id 在创建时生成并写入日志，重放、淘汰、导入后都指向同一条消息
+            'message_id': uuid.uuid4().hex,
+            'item': match_info.standard_name,
+            'trade_type': trade_type,
+            'price': price,
+            'text': raw_text,
+            'raw_item': raw_item or match_info.raw_name or match_info.standard_name,
+            'category': match_info.category,
+            'subcategory': match_info.subcategory,
+            'confidence': match_info.confidence,
+            'match_method': match_info.method,
+        }
+        self._append_journal(event)
+        self._apply_price_event(event)
+        self.market_store.put(self._price_event_to_record(event))
+
+        # 更新分位数统计
+        self.session_sketches.setdefault(match_info.standard_name, QuantileSketch()).add(price)
+
+        if self.market_journal.should_compact():
+            self._save_market_data()
+        
+        self._schedule_ui_refresh('messages', 'market', 'repository')
+
+    def _apply_price_event(self, event: Dict[str, Any]):
+        """将一条价格记录应用到内存数据（实时识别和日志重放共用）"""
+        item_name = event['item']
+        trade_type = event['trade_type']
+        price = event['price']
+        recorded_at = datetime.fromtimestamp(event['time'])
 
         if item_name not in self.market_data:
             self.market_data[item_name] = {
-                'buy': [],
-                'sell': [],
+                'buy': PriceSeries(),
+                'sell': PriceSeries(),
                 'latest_time': None,
-                'category': match_info.category,
-                'subcategory': match_info.subcategory,
+                'category': event.get('category'),
+                'subcategory': event.get('subcategory'),
             }
         else:
             if 'category' not in self.market_data[item_name]:
-                self.market_data[item_name]['category'] = match_info.category
+                self.market_data[item_name]['category'] = event.get('category')
             if 'subcategory' not in self.market_data[item_name]:
-                self.market_data[item_name]['subcategory'] = match_info.subcategory
+                self.market_data[item_name]['subcategory'] = event.get('subcategory')
         
         self.market_data[item_name][trade_type].append(price)
-        self.market_data[item_name]['latest_time'] = time.time()
-        self.market_data[item_name]['confidence'] = match_info.confidence
+        self.market_data[item_name]['latest_time'] = event['time']
+        self.market_data[item_name]['confidence'] = event.get('confidence')
         
-        # 记录原始消息（最多保留100条）
-        self.raw_messages.append({
+        # 记录原始消息（环形缓冲区，超出容量时自动淘汰最旧的）
+        self.message_model.append({
+            # 旧版日志没有 message_id，沿用当时按 seq 生成的 id
+            'id': event.get('message_id') or str(event.get('seq', '')),
             'item': item_name,
-            'category': match_info.category,
-            'subcategory': match_info.subcategory,
-            'confidence': match_info.confidence,
-            'match_method': match_info.method,
+            'category': event.get('category'),
+            'subcategory': event.get('subcategory'),
+            'confidence': event.get('confidence'),
+            'match_method': event.get('match_method'),
             'type': trade_type,
             'price': price,
-            'text': raw_text,
-            'time': datetime.now().strftime("%H:%M:%S"),
-            'raw_item': raw_item or match_info.raw_name or match_info.standard_name,
+            'text': event.get('text', ''),
+            'time': recorded_at.strftime("%H:%M:%S"),
+            'raw_item': event.get('raw_item') or item_name,
             'status': 'pending',
         })
-        
-        # 限制消息数量
-        if len(self.raw_messages) > 200:
-            self.raw_messages.pop(0)
-            
+
         # 更新物品仓库统计
-        self._update_item_repository(item_name, trade_type, price)
-        
-        self._update_ui()
+        self._update_item_repository(item_name, trade_type, price, recorded_at)
+
+    @staticmethod
+    def _price_event_to_record(event: Dict[str, Any]) -> Dict[str, Any]:
+        """价格日志转换为 market_data.db 的记录"""
+        return {
+            'name': event['item'],
+            'price': event['price'],
+            'trade_type': event['trade_type'],
+            'category': event.get('category') or '未分类',
+            'subcategory': event.get('subcategory') or '',
+            'raw_name': event.get('raw_item'),
+            'full_text': event.get('text'),
+            'timestamp': event['time'],
+        }
 
+    def _append_journal(self, event: Dict[str, Any]):
+        """分配 seq 后交给后台线程写入追加日志"""
+        self.market_journal.assign_seq(event)
+        self.market_writer.put(('event', event))
 
+    def _write_market_batch(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        """后台写线程：按入队顺序写日志，遇到快照时先写出之前的日志再压缩
 
-    def _update_item_repository(self, item_name: str, trade_type: str, price: float):
+        写入失败时只打印，数据仍保留在内存中，下次压缩时写入快照。
+        """
+        events: List[Dict[str, Any]] = []
+        for kind, payload in batch:
+            if kind == 'event':
+                events.append(payload)
+                continue
+            try:
+                self.market_journal.write_events(events)
+            except OSError as exc:
+                print(f"[MarketJournal] 写入日志失败: {exc}")
+            events = []
+            try:
+                self.market_journal.write_snapshot(payload)
+            except OSError as exc:
+                print(f"[MarketJournal] 写入快照失败: {exc}")
+        try:
+            self.market_journal.write_events(events)
+        except OSError as exc:
+            print(f"[MarketJournal] 写入日志失败: {exc}")
+
+    def _replay_journal_event(self, event: Dict[str, Any]):
+        """重放一条日志"""
+        event_type = event.get('type')
+        if event_type == 'price':
+            self._apply_price_event(event)
+            return
+        message = self._find_message_by_id(event.get('message_id'))
+        if message is None:
+            return
+        if event_type == 'learn':
+            message['item'] = event.get('item', message.get('item'))
+            message['category'] = event.get('category', message.get('category'))
+            message['subcategory'] = event.get('subcategory', message.get('subcategory'))
+            message['status'] = 'learned'
+        elif event_type == 'status':
+            message['status'] = event.get('status') or 'pending'
+
+    def _find_message_by_id(self, message_id: Optional[str]) -> Optional[Dict]:
+        if not message_id:
+            return None
+        for message in reversed(self.raw_messages):
+            if message.get('id') == message_id:
+                return message
+        return None
+
+    # 物品仓库中每个物品保留的最近记录条数
+    REPOSITORY_RECORDS_LIMIT = 200
+
+    def _update_item_repository(self, item_name: str, trade_type: str, price: float, now: Optional[datetime] = None):
         """更新物品仓库中的统计信息"""
-        now = datetime.now()
+        now = now or datetime.now()
         date_key = now.strftime("%Y-%m-%d")
+        if self._repository_dirty is not None:
+            self._repository_dirty.add(item_name)
 
-        repo = self.item_repository.setdefault(
-            item_name,
-            {
+        repo = self.item_repository.get(item_name)
+        if repo is None:
+            repo = self.item_repository[item_name] = {
                 'count': 0,
                 'last_seen': None,
-                'records': [],
-                'daily': {},  # {date: {'buy': [], 'sell': []}}
+                'records': deque(maxlen=self.REPOSITORY_RECORDS_LIMIT),
+                'daily': DailyAggregates(),  # 按天的条数/总和/最小/最大
+                'sketches': {},  # {date: QuantileSketch}
                 'category': None,
                 'subcategory': None,
             }
-        )
 
         source_meta = self.market_data.get(item_name, {})
         if not repo.get('category'):
@@ -7914,51 +8392,31 @@ class MarketAnalysisTab(QWidget):
         repo['count'] = repo.get('count', 0) + 1
         repo['last_seen'] = now.isoformat()
 
-        records = repo.setdefault('records', [])
-        records.append({
+        repo['records'].append({
             'time': now.isoformat(),
             'type': trade_type,
             'price': price
         })
-        if len(records) > 200:
-            repo['records'] = records[-200:]
-
-        daily = repo.setdefault('daily', {})
-        day_entry = daily.setdefault(date_key, {'buy': [], 'sell': []})
-        day_entry.setdefault('buy', [])
-        day_entry.setdefault('sell', [])
-        day_entry[trade_type].append(price)
-
-        # 只保留最近60天的日统计
-        cutoff_date = (now - timedelta(days=60)).strftime("%Y-%m-%d")
-        for key in list(daily.keys()):
-            if key < cutoff_date:
-                del daily[key]
-
-    def _get_daily_average(self, daily_data: Dict[str, Dict[str, List[float]]], date_key: str) -> Optional[float]:
-        entry = daily_data.get(date_key)
-        if not entry:
-            return None
-        prices: List[float] = []
-        for arr in entry.values():
-            if arr:
-                prices.extend(arr)
-        if not prices:
-            return None
-        return sum(prices) / len(prices)
 
-    def _get_period_average(self, daily_data: Dict[str, Dict[str, List[float]]], date_keys: List[str]) -> Optional[float]:
-        prices: List[float] = []
-        for key in date_keys:
-            entry = daily_data.get(key)
-            if not entry:
-                continue
-            for arr in entry.values():
-                if arr:
-                    prices.extend(arr)
-        if not prices:
-            return None
-        return sum(prices) / len(prices)
+        # 日统计在出现新的一天时自动淘汰60天前的日期
+        repo['daily'].add(date_key, trade_type, price)
+
+        sketches = repo['sketches']
+        day_sketch = sketches.get(date_key)
+        if day_sketch is None:
+            day_sketch = sketches[date_key] = QuantileSketch()
+            # 新的一天才检查过期的分位数草图
+            cutoff_date = (now - timedelta(days=DAILY_RETENTION_DAYS)).strftime("%Y-%m-%d")
+            for key in [key for key in sketches if key < cutoff_date]:
+                del sketches[key]
+        day_sketch.add(price)
+
+    @staticmethod
+    def _format_quantiles(sketch: Optional[QuantileSketch]) -> str:
+        """格式化为 P10/中位/P90"""
+        if not sketch:
+            return "-"
+        return "/".join(f"{sketch.quantile(q):.1f}" for q in (0.1, 0.5, 0.9))
 
     def _format_trend(self, today_avg: Optional[float], yesterday_avg: Optional[float]) -> str:
         if today_avg is None or yesterday_avg is None:
@@ -7973,231 +8431,136 @@ class MarketAnalysisTab(QWidget):
         return f"{arrow}{abs(percent):.1f}%"
 
     def _update_repository_table(self):
-        """更新物品仓库趋势表"""
+        """更新物品仓库趋势表：只重算有变化的物品，跨天或数据整体替换时全部重算"""
         if not hasattr(self, "item_table"):
             return
 
-        self.item_table.setRowCount(0)
-        if not self.item_repository:
-            return
-
         today = datetime.now().date()
         today_key = today.strftime("%Y-%m-%d")
-        yesterday_key = (today - timedelta(days=1)).strftime("%Y-%m-%d")
-        week_keys = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
-
-        rows = []
-        for item_name, data in self.item_repository.items():
-            count = data.get('count', 0)
-            records = data.get('records', [])
-            latest_price = records[-1]['price'] if records else None
-            daily_stats = data.get('daily', {})
-
-            today_avg = self._get_daily_average(daily_stats, today_key)
-            yesterday_avg = self._get_daily_average(daily_stats, yesterday_key)
-            week_avg = self._get_period_average(daily_stats, week_keys)
-            trend = self._format_trend(today_avg, yesterday_avg)
-
-            rows.append({
-                'item': item_name,
-                'category': data.get('category', '未分类'),
-                'subcategory': data.get('subcategory', '未分类'),
-                'count': count,
-                'latest': latest_price,
-                'today_avg': today_avg,
-                'yesterday_avg': yesterday_avg,
-                'week_avg': week_avg,
-                'trend': trend
-            })
-
-        rows.sort(key=lambda x: (-x['count'], x['item']))
-
-        for row_data in rows:
-            row = self.item_table.rowCount()
-            self.item_table.insertRow(row)
-
-            def fmt(value: Optional[float]) -> str:
-                return f"{value:.1f}" if isinstance(value, (int, float)) and value is not None else "-"
+        day_keys = (
+            today_key,
+            (today - timedelta(days=1)).strftime("%Y-%m-%d"),
+            [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)],
+        )
+        dirty = self._repository_dirty
+        self._repository_dirty = set()
+        if dirty is None or today_key != self._repository_day:
+            self._repository_day = today_key
+            self.repository_model.reset(
+                self._repository_row(item_name, data, day_keys)
+                for item_name, data in self.item_repository.items()
+            )
+        elif dirty:
+            self.repository_model.upsert(
+                self._repository_row(item_name, self.item_repository[item_name], day_keys)
+                for item_name in dirty
+                if item_name in self.item_repository
+            )
 
-            label = row_data['item']
-            category_tag = f"({row_data.get('category', '-')}/{row_data.get('subcategory', '-')})"
-            self.item_table.setItem(row, 0, QTableWidgetItem(f"{label} {category_tag}"))
-            self.item_table.setItem(row, 1, QTableWidgetItem(str(row_data['count'])))
-            self.item_table.setItem(row, 2, QTableWidgetItem(fmt(row_data['latest'])))
-            self.item_table.setItem(row, 3, QTableWidgetItem(fmt(row_data['today_avg'])))
-            self.item_table.setItem(row, 4, QTableWidgetItem(fmt(row_data['yesterday_avg'])))
-            self.item_table.setItem(row, 5, QTableWidgetItem(fmt(row_data['week_avg'])))
-            self.item_table.setItem(row, 6, QTableWidgetItem(row_data['trend']))
+    def _repository_row(self, item_name: str, data: Dict[str, Any], day_keys: Tuple[str, str, List[str]]) -> Dict[str, Any]:
+        """计算趋势表中一个物品的行"""
+        today_key, yesterday_key, week_keys = day_keys
+        records = data['records']
+        daily_stats = data['daily']
+        today_avg = daily_stats.average((today_key,))
+        yesterday_avg = daily_stats.average((yesterday_key,))
+        sketches = data.get('sketches', {})
+        week_sketch = QuantileSketch.merged(sketches.get(key) for key in week_keys)
+        return {
+            'item': item_name,
+            'category': data.get('category', '未分类'),
+            'subcategory': data.get('subcategory', '未分类'),
+            'count': data.get('count', 0),
+            'latest': records[-1]['price'] if records else None,
+            'today_avg': today_avg,
+            'yesterday_avg': yesterday_avg,
+            'week_avg': daily_stats.average(week_keys),
+            'session_quantiles': self._format_quantiles(self.session_sketches.get(item_name)),
+            'today_quantiles': self._format_quantiles(sketches.get(today_key)),
+            'week_quantiles': self._format_quantiles(week_sketch),
+            'trend': self._format_trend(today_avg, yesterday_avg),
+        }
 
-    def _update_result_tree(self, rows_data: List[Dict[str, Any]]):
-        self.result_tree.clear()
-        if not rows_data:
-            self.category_stats_label.setText("分类统计：暂无数据")
+    def _update_result_tree(self, changed_items: Optional[Set[str]] = None):
+        """更新分类统计树：changed_items 为 None 时按当前筛选结果重建，否则只更新这些物品的节点"""
+        if changed_items is None:
+            self.category_tree.reset(self.market_proxy.visible_rows())
+        elif changed_items:
+            rows = []
+            removed = []
+            for item_name in changed_items:
+                row = self.market_model.row_for(item_name)
+                if row is not None and self.market_proxy.accepts(row):
+                    rows.append(row)
+                else:
+                    removed.append(item_name)
+            self.category_tree.update(rows, removed)
+        self.category_stats_label.setText(self.category_tree.summary_text())
+
+    # 界面视图：消息列表、市场表格（含分类树）、物品趋势表
+    UI_VIEWS = ('messages', 'market', 'repository')
+    # 连续记录价格时两次界面刷新的最小间隔（毫秒）
+    UI_REFRESH_INTERVAL_MS = 200
+
+    def _schedule_ui_refresh(self, *views: str):
+        """标记视图需要刷新，UI_REFRESH_INTERVAL_MS 内的多次标记合并为一次刷新"""
+        self._dirty_views.update(views or self.UI_VIEWS)
+        if not self.ui_refresh_timer.isActive():
+            self.ui_refresh_timer.start()
+
+    def _flush_ui_refresh(self):
+        """立即刷新所有脏视图（页面不可见时保留标记，等切回本页再刷新）"""
+        self.ui_refresh_timer.stop()
+        if not self._dirty_views or not self.isVisible():
             return
+        dirty = self._dirty_views
+        self._dirty_views = set()
+        if 'messages' in dirty:
+            self._refresh_message_list()
+        if 'market' in dirty:
+            self._refresh_market_table()
+        if 'repository' in dirty:
+            self._update_repository_table()
+        self._refresh_status()
+
+    def _update_ui(self, *views: str):
+        """立即刷新指定视图（不指定时刷新全部），用于加载、清空、筛选等用户操作"""
+        self._dirty_views.update(views or self.UI_VIEWS)
+        self._flush_ui_refresh()
+
+    def _refresh_message_list(self):
+        """消息行已由模型增量插入/删除，学习和标记状态时单独通知对应行，这里只跟随到底部"""
+        if self._follow_messages:
+            self.message_list.scrollToBottom()
+
+    def _on_message_scroll(self, value: int):
+        self._follow_messages = value >= self.message_list.verticalScrollBar().maximum()
+
+    def _refresh_market_table(self):
+        """同步市场表格模型（只通知变化的行）并刷新分类统计树"""
+        filters_changed = self.market_proxy.set_filters(
+            self.category_filter_combo.currentData(),
+            self.subcategory_filter_combo.currentData(),
+            self.min_profit_spin.value(),
+        )
+        changed_items = self.market_model.sync(self.market_data)
+        self._update_result_tree(None if filters_changed else changed_items)
 
-        stats: Dict[str, Dict[str, Any]] = {}
-        for row in rows_data:
-            category = row.get('category', '未分类')
-            subcategory = row.get('subcategory', '未分类')
-            profit = row.get('profit')
-            confidence = row.get('confidence')
-
-            cat_entry = stats.setdefault(category, {'count': 0, 'profit_values': [], 'subs': {}})
-            cat_entry['count'] += 1
-            if profit is not None:
-                cat_entry['profit_values'].append(profit)
-
-            sub_entry = cat_entry['subs'].setdefault(subcategory, {'count': 0, 'profit_values': [], 'items': []})
-            sub_entry['count'] += 1
-            if profit is not None:
-                sub_entry['profit_values'].append(profit)
-            sub_entry['items'].append({
-                'name': row['item'],
-                'min_buy': row['min_buy'],
-                'max_buy': row['max_buy'],
-                'min_sell': row['min_sell'],
-                'max_sell': row['max_sell'],
-                'profit': profit,
-                'confidence': confidence,
-            })
-
-        summary_lines = []
-        for category in sorted(stats.keys()):
-            cat_entry = stats[category]
-            profit_values = cat_entry['profit_values']
-            cat_avg = sum(profit_values) / len(profit_values) if profit_values else 0
-            cat_item = QTreeWidgetItem([
-                f"{category} ({cat_entry['count']})",
-                f"均利润 {cat_avg:.1f}万" if profit_values else "暂无利润数据"
-            ])
-            self.result_tree.addTopLevelItem(cat_item)
-            summary_lines.append(f"{category}均利润{cat_avg:.1f}万" if profit_values else f"{category}暂无利润")
-
-            for subcategory in sorted(cat_entry['subs'].keys()):
-                sub_entry = cat_entry['subs'][subcategory]
-                sub_profit_values = sub_entry['profit_values']
-                sub_avg = sum(sub_profit_values) / len(sub_profit_values) if sub_profit_values else 0
-                sub_item = QTreeWidgetItem([
-                    f"{subcategory} ({sub_entry['count']})",
-                    f"均利润 {sub_avg:.1f}万" if sub_profit_values else "暂无利润数据"
-                ])
-                cat_item.addChild(sub_item)
-
-                for item_entry in sub_entry['items']:
-                    profit_text = f"{item_entry['profit']:.1f}万" if item_entry['profit'] is not None else "-"
-                    confidence_text = f"{item_entry['confidence']:.2f}" if isinstance(item_entry['confidence'], (float, int)) else "-"
-                    detail_text = (
-                        f"收 {item_entry['min_buy'] or '-'}~{item_entry['max_buy'] or '-'} | "
-                        f"卖 {item_entry['min_sell'] or '-'}~{item_entry['max_sell'] or '-'} | "
-                        f"利润 {profit_text} | 置信度 {confidence_text}"
-                    )
-                    sub_item.addChild(QTreeWidgetItem([item_entry['name'], detail_text]))
-
-        self.result_tree.expandAll()
-        self.category_stats_label.setText("分类统计：" + "； ".join(summary_lines))
-
-    def _update_ui(self):
-        """更新界面显示"""
-        # 更新消息列表
-        self.message_list.clear()
-        for msg in self.raw_messages[-50:]:  # 只显示最近50条
-            category = msg.get('category', '-')
-            subcategory = msg.get('subcategory', '-')
-            confidence = msg.get('confidence')
-            confidence_text = f"{confidence:.2f}" if isinstance(confidence, (int, float)) else "-"
-            display_text = (
-                f"[{msg['time']}] [{category}/{subcategory}] {msg['type']} {msg['item']} "
-                f"{msg['price']:.1f}万 (置信度 {confidence_text}) - {msg['text'][:30]}"
-            )
-            self.message_list.addItem(display_text)
-        self.message_list.scrollToBottom()
-        
-        # 更新市场表格
-        self.market_table.setRowCount(0)
-        rows_data = []
-        cat_filter = self.category_filter_combo.currentData()
-        sub_filter = self.subcategory_filter_combo.currentData()
-        min_profit_filter = self.min_profit_spin.value()
-        
-        for item_name, data in self.market_data.items():
-            buy_prices = data['buy']
-            sell_prices = data['sell']
-            
-            if not buy_prices and not sell_prices:
-                continue
-            
-            min_buy = min(buy_prices) if buy_prices else None
-            max_buy = max(buy_prices) if buy_prices else None
-            min_sell = min(sell_prices) if sell_prices else None
-            max_sell = max(sell_prices) if sell_prices else None
-            
-            # 计算利润空间（最低卖价 - 最高收价）
-            profit = None
-            if min_sell is not None and max_buy is not None:
-                profit = min_sell - max_buy
-            elif min_sell is not None and min_buy is not None:
-                profit = min_sell - min_buy
-
-            category = data.get('category', '未分类')
-            subcategory = data.get('subcategory', '未分类')
-            confidence = data.get('confidence')
-
-            if cat_filter and category != cat_filter:
-                continue
-            if sub_filter and subcategory != sub_filter:
-                continue
-            if min_profit_filter and (profit is None or profit < min_profit_filter):
-                continue
-            
-            rows_data.append({
-                'item': item_name,
-                'category': category,
-                'subcategory': subcategory,
-                'confidence': confidence,
-                'min_buy': min_buy,
-                'max_buy': max_buy,
-                'min_sell': min_sell,
-                'max_sell': max_sell,
-                'profit': profit,
-                'buy_prices': buy_prices,
-                'sell_prices': sell_prices,
-            })
-        
-        # 按利润排序（有利润的优先，然后按利润从高到低）
-        rows_data.sort(key=lambda x: (x['profit'] is None, -(x['profit'] or 0)))
-        
-        # 填充表格
-        for row_data in rows_data:
-            row = self.market_table.rowCount()
-            self.market_table.insertRow(row)
-            
-            item_label = row_data['item']
-            category = row_data.get('category', '未分类')
-            subcategory = row_data.get('subcategory', '未分类')
-            self.market_table.setItem(row, 0, QTableWidgetItem(f"{item_label} ({category}/{subcategory})"))
-            self.market_table.setItem(row, 1, QTableWidgetItem(f"{row_data['min_buy']:.1f}" if row_data['min_buy'] else "-"))
-            self.market_table.setItem(row, 2, QTableWidgetItem(f"{row_data['max_buy']:.1f}" if row_data['max_buy'] else "-"))
-            self.market_table.setItem(row, 3, QTableWidgetItem(f"{row_data['min_sell']:.1f}" if row_data['min_sell'] else "-"))
-            self.market_table.setItem(row, 4, QTableWidgetItem(f"{row_data['max_sell']:.1f}" if row_data['max_sell'] else "-"))
-            profit_text = f"{row_data['profit']:.1f}" if row_data['profit'] is not None else "-"
-            if row_data['profit'] and row_data['profit'] > 0:
-                profit_text += " ✓"
-            profit_item = QTableWidgetItem(profit_text)
-            if row_data['profit'] and row_data['profit'] > 0:
-                profit_item.setForeground(Qt.GlobalColor.green)
-            self.market_table.setItem(row, 5, profit_item)
-
-        self._update_result_tree(rows_data)
-        
-        # 更新物品趋势表
-        self._update_repository_table()
-        
-        # 更新状态
+    def _refresh_status(self):
         total_items = len(self.market_data)
         total_messages = len(self.raw_messages)
         repo_count = len(self.item_repository)
+        writer_stats = self.market_writer.stats()
+        store_stats = self.market_store.stats()
+        write_info = f"待写入：{writer_stats['depth'] + store_stats['depth']}"
+        errors = writer_stats['errors'] + store_stats['errors']
+        if errors:
+            write_info += f"（写入失败 {errors} 次）"
+        dropped = writer_stats['dropped'] + store_stats['dropped']
+        if dropped:
+            write_info += f"（重试后仍失败，已丢弃 {dropped} 条）"
         self.status_label.setText(
-            f"状态：识别中... | 物品数：{total_items} | 消息数：{total_messages} | 仓库：{repo_count}"
+            f"状态：识别中... | 物品数：{total_items} | 消息数：{total_messages} | 仓库：{repo_count} | {write_info}"
         )
 
     def _clear_data(self):
@@ -8210,62 +8573,161 @@ class MarketAnalysisTab(QWidget):
         )
         if reply == QMessageBox.StandardButton.Yes:
             self.market_data.clear()
-            self.raw_messages.clear()
+            self.message_model.reset()
             self.item_repository.clear()
+            self.session_sketches.clear()
+            self._repository_dirty = None
             self._update_ui()
 
+    def _get_market_data_file(self) -> str:
+        return os.path.join(os.path.dirname(__file__), "novels_data", "market_data.json")
+
+    @property
+    def market_store(self):
+        """market_data.db 的共用写入器（与市场分析 V2 是同一个写线程）"""
+        return get_store_writer()
+
     def _save_market_data(self):
-        """保存市场数据"""
-        data_file = os.path.join(os.path.dirname(__file__), "novels_data", "market_data.json")
-        os.makedirs(os.path.dirname(data_file), exist_ok=True)
-        try:
-            with open(data_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'market_data': self.market_data,
-                    'raw_messages': self.raw_messages[-100:],  # 只保存最近100条
-                    'item_repository': self.item_repository
-                }, f, ensure_ascii=False, indent=2)
-        except Exception as exc:
-            QMessageBox.warning(self, "保存失败", f"无法保存数据：{exc}")
+        """保存市场数据（压缩日志：生成完整快照，由后台线程原子写入并清空日志）
+
+        快照在界面线程生成，复制了所有可变列表，写线程序列化时不会与后续更新冲突。
+        """
+        snapshot = self.market_journal.prepare_snapshot({
+            'market_data': self._serialize_market_data(),
+            'raw_messages': [dict(msg) for msg in self.message_model.recent(100)],  # 只保存最近100条
+            'item_repository': self._serialize_item_repository(),
+            'store_imported': self._store_imported,
+        })
+        self.market_writer.put(('snapshot', snapshot))
+
+    def _serialize_market_data(self) -> Dict[str, Dict]:
+        """将价格环形缓冲区转换为列表，便于写入 JSON"""
+        result = {}
+        for item_name, meta in self.market_data.items():
+            entry = dict(meta)
+            for trade_type in ('buy', 'sell'):
+                entry[trade_type] = list(meta.get(trade_type) or [])
+            result[item_name] = entry
+        return result
+
+    @staticmethod
+    def _restore_market_data(raw: Dict) -> Dict[str, Dict]:
+        """从 JSON 数据恢复，价格列表转换为固定容量的 PriceSeries"""
+        restored = {}
+        if not isinstance(raw, dict):
+            return restored
+        for item_name, meta in raw.items():
+            if not isinstance(meta, dict):
+                continue
+            entry = dict(meta)
+            for trade_type in ('buy', 'sell'):
+                values = meta.get(trade_type) or []
+                entry[trade_type] = PriceSeries(v for v in values if isinstance(v, (int, float)))
+            restored[item_name] = entry
+        return restored
+
+    def _serialize_item_repository(self) -> Dict[str, Dict]:
+        """将最近记录、每日统计和分位数草图转换为列表/字典，便于写入 JSON"""
+        result = {}
+        for item_name, repo in self.item_repository.items():
+            entry = dict(repo)
+            entry['records'] = list(repo['records'])
+            entry['daily'] = repo['daily'].to_dict()
+            if 'sketches' in repo:
+                entry['sketches'] = {day: sketch.to_dict() for day, sketch in repo['sketches'].items()}
+            result[item_name] = entry
+        return result
+
+    @classmethod
+    def _restore_item_repository(cls, raw: Dict) -> Dict[str, Dict]:
+        """从 JSON 数据恢复物品仓库
+
+        最近记录恢复为定长 deque，每日统计恢复为 DailyAggregates（兼容旧的每日价格列表），
+        每日分位数草图转换回 QuantileSketch。
+        """
+        if not isinstance(raw, dict):
+            return {}
+        restored = {}
+        for item_name, repo in raw.items():
+            if not isinstance(repo, dict):
+                continue
+            repo['records'] = deque(
+                (r for r in repo.get('records') or [] if isinstance(r, dict)),
+                maxlen=cls.REPOSITORY_RECORDS_LIMIT,
+            )
+            repo['daily'] = DailyAggregates.from_dict(repo.get('daily') or {})
+            sketches = repo.get('sketches')
+            repo['sketches'] = {
+                day: QuantileSketch.from_dict(data)
+                for day, data in (sketches.items() if isinstance(sketches, dict) else ())
+                if isinstance(data, dict)
+            }
+            restored[item_name] = repo
+        return restored
 
     def _load_market_data(self):
-        """加载市场数据"""
-        data_file = os.path.join(os.path.dirname(__file__), "novels_data", "market_data.json")
-        if os.path.exists(data_file):
-            try:
-                with open(data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.market_data = data.get('market_data', {})
-                    self.raw_messages = data.get('raw_messages', [])
-                    self.item_repository = data.get('item_repository', {}) or {}
-                    if not isinstance(self.item_repository, dict):
-                        self.item_repository = {}
-                    for msg in self.raw_messages:
-                        if isinstance(msg, dict):
-                            msg.setdefault('status', 'pending')
-                            msg.setdefault('raw_item', msg.get('item', ''))
-                    for meta in self.market_data.values():
-                        if isinstance(meta, dict):
-                            meta.setdefault('category', '未分类')
-                            meta.setdefault('subcategory', '未分类')
-                            meta.setdefault('confidence', None)
-                    added_alias = False
-                    for item_name in list(self.market_data.keys()):
-                        added_alias |= self._ensure_alias_entry(item_name, save=False)
-                    for item_name in list(self.item_repository.keys()):
-                        added_alias |= self._ensure_alias_entry(item_name, save=False)
-                    if added_alias:
-                        self.item_alias_exact, self.item_alias_contains = self._build_item_alias_rules()
-                        self._save_item_aliases()
-                    self._update_ui()
-            except Exception as exc:
-                QMessageBox.warning(self, "加载失败", f"无法加载数据：{exc}")
+        """加载市场数据（读取快照后重放追加日志）"""
+        try:
+            data, events = self.market_journal.load()
+            self.market_data = self._restore_market_data(data.get('market_data', {}))
+            self.message_model.reset(data.get('raw_messages', []) or [])
+            self.item_repository = self._restore_item_repository(data.get('item_repository', {}) or {})
+            assigned_ids = False
+            for msg in self.raw_messages:
+                if isinstance(msg, dict):
+                    msg.setdefault('status', 'pending')
+                    msg.setdefault('raw_item', msg.get('item', ''))
+                    if not msg.get('id'):
+                        msg['id'] = uuid.uuid4().hex
+                        assigned_ids = True
+            for meta in self.market_data.values():
+                if isinstance(meta, dict):
+                    meta.setdefault('category', '未分类')
+                    meta.setdefault('subcategory', '未分类')
+                    meta.setdefault('confidence', None)
+            for event in events:
+                self._replay_journal_event(event)
+            if events:
+                print(f"[_load_market_data] 已从日志恢复 {len(events)} 条记录")
+            # 快照中记录了是否已导入 market_data.db，导入过就不再序列化整个仓库
+            self._store_imported = bool(data.get('store_imported'))
+            if self.item_repository and not self._store_imported:
+                # 升级后首次启动时把已有的仓库价格导入 market_data.db（只导入一次）
+                self._store_imported = True
+                self.market_store.import_snapshot(
+                    {
+                        'market_data': self._serialize_market_data(),
+                        'item_repository': self._serialize_item_repository(),
+                    },
+                    source_key="legacy:market_data.json",
+                )
+            if assigned_ids:
+                # 新分配的 id 立即写入快照，之后的学习/标记日志才能在重启后找到对应消息
+                self._save_market_data()
+            added_alias = False
+            for item_name in list(self.market_data.keys()):
+                added_alias |= self._ensure_alias_entry(item_name, save=False)
+            for item_name in list(self.item_repository.keys()):
+                added_alias |= self._ensure_alias_entry(item_name, save=False)
+            if added_alias:
+                self.item_alias_exact, self.item_alias_contains = self._build_item_alias_rules()
+                self._save_item_aliases()
+            self._update_ui()
+        except Exception as exc:
+            QMessageBox.warning(self, "加载失败", f"无法加载数据：{exc}")
 
     def closeEvent(self, event):
         """关闭时保存数据"""
+        if self.market_writer.closed:
+            super().closeEvent(event)
+            return
         if self.is_capturing:
             self._stop_capture()
         self._save_market_data()
+        # 等待后台线程写完队列中的数据
+        if not self.market_writer.close(timeout=10):
+            print(f"[MarketWriter] 关闭超时，仍有 {self.market_writer.depth} 条数据未写入")
+        close_store_writer(timeout=10)
         super().closeEvent(event)
 
 
@@ -8854,6 +9316,11 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         if hasattr(self, "transfer_tab"):
             self.transfer_tab.stop_server()
+        if hasattr(self, "market_tab"):
+            # 子控件不会自动收到 closeEvent，显式关闭以写完市场数据
+            self.market_tab.close()
+        if hasattr(self, "alarm_tab"):
+            self.alarm_tab.close()
         super().closeEvent(event)
 
 
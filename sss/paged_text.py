@@ -0,0 +1,139 @@
+"""
+分页文本缓冲
+保存整章文本和每一行（段落）的起始偏移，界面只渲染当前可见位置附近的一段窗口，
+滚动、搜索和朗读高亮都使用整章中的绝对偏移，由这里换算成窗口内的偏移。
+与界面无关，供 Qt 和 Tk 阅读器共用。
+"""
+
+import re
+from array import array
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+
+# 没有换行的超长段落按这个字数切成多行建立索引，避免单行窗口过大
+SEGMENT_MAX_CHARS = 1000
+
+# 每次渲染到控件中的行数
+WINDOW_LINES = 400
+
+# 可见区域距窗口边缘少于这么多行时移动窗口
+WINDOW_MARGIN_LINES = 100
+
+
+class PagedText:
+    """整章文本 + 行偏移索引 + 当前渲染窗口
+
+    行以换行符分隔（换行符属于前一行），窗口为 [window_first, window_last) 行，
+    对应文本 text[window_start:window_end]。章节较短时窗口即整章，行为与直接显示全文相同。
+    """
+
+    def __init__(self, text: str = "", window_lines: int = WINDOW_LINES,
+                 margin_lines: int = WINDOW_MARGIN_LINES):
+        self.window_lines = window_lines
+        self.margin_lines = margin_lines
+        self.set_text(text)
+
+    def set_text(self, text: str):
+        self.text = text or ""
+        starts = array('l', [0])
+        length = len(self.text)
+        pos = 0
+        while pos < length:
+            newline = self.text.find("\n", pos, pos + SEGMENT_MAX_CHARS)
+            pos = newline + 1 if newline != -1 else min(pos + SEGMENT_MAX_CHARS, length)
+            if pos < length:
+                starts.append(pos)
+        self.starts = starts
+        self.window_first = 0
+        self.window_last = 0
+        self.move_window(0)
+
+    # ---------- 行与偏移 ----------
+    @property
+    def line_count(self) -> int:
+        return len(self.starts)
+
+    def line_of(self, offset: int) -> int:
+        """偏移所在的行"""
+        return max(0, bisect_right(self.starts, offset) - 1)
+
+    def line_start(self, line: int) -> int:
+        if line >= len(self.starts):
+            return len(self.text)
+        return self.starts[max(0, line)]
+
+    def paragraph_of(self, offset: int) -> int:
+        """偏移所在的段落号（按换行符计，不含超长段落的切分）"""
+        return self.text.count("\n", 0, offset)
+
+    # ---------- 窗口 ----------
+    @property
+    def window_start(self) -> int:
+        return self.line_start(self.window_first)
+
+    @property
+    def window_end(self) -> int:
+        return self.line_start(self.window_last)
+
+    def window_text(self) -> str:
+        return self.text[self.window_start:self.window_end]
+
+    def move_window(self, line: int) -> bool:
+        """把窗口移到以 line 为中心的位置，窗口有变化时返回 True"""
+        count = self.line_count
+        first = max(0, line - self.window_lines // 2)
+        last = min(count, first + self.window_lines)
+        first = max(0, last - self.window_lines)
+        if (first, last) == (self.window_first, self.window_last):
+            return False
+        self.window_first, self.window_last = first, last
+        return True
+
+    def contains(self, start: int, end: Optional[int] = None) -> bool:
+        """[start, end] 是否都在当前窗口内"""
+        end = start if end is None else end
+        window_end = self.window_end
+        # 窗口到达文末时，文末位置本身也算在窗口内
+        if self.window_last >= self.line_count:
+            window_end += 1
+        return self.window_start <= start and end < window_end
+
+    def needs_shift(self, top_offset: int, bottom_offset: int) -> bool:
+        """可见区域 [top_offset, bottom_offset] 接近窗口边缘且外面还有内容"""
+        top_line = self.line_of(top_offset)
+        bottom_line = self.line_of(bottom_offset)
+        if self.window_first > 0 and top_line - self.window_first < self.margin_lines:
+            return True
+        if self.window_last < self.line_count and self.window_last - 1 - bottom_line < self.margin_lines:
+            return True
+        return False
+
+    def to_local(self, offset: int) -> int:
+        return offset - self.window_start
+
+    def to_absolute(self, local_offset: int) -> int:
+        return local_offset + self.window_start
+
+    def local_range(self, start: int, end: int) -> Optional[Tuple[int, int]]:
+        """绝对区间与窗口的交集（窗口内偏移），不相交时返回 None"""
+        window_start, window_end = self.window_start, self.window_end
+        start, end = max(start, window_start), min(end, window_end)
+        if start >= end:
+            return None
+        return start - window_start, end - window_start
+
+    # ---------- 搜索 ----------
+    def find_all(self, keyword: str) -> List[Tuple[int, int]]:
+        """不区分大小写查找整章中的全部匹配，返回绝对偏移区间"""
+        if not keyword:
+            return []
+        # 直接在原文上做不区分大小写的匹配：str.lower() 可能改变长度（如 'İ'），偏移会错位
+        pattern = re.compile(re.escape(keyword), re.IGNORECASE)
+        return [match.span() for match in pattern.finditer(self.text)]
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __repr__(self) -> str:
+        return f"PagedText(len={len(self.text)}, lines={self.line_count}, window={self.window_first}-{self.window_last})"
@@ -0,0 +1,178 @@
+"""
+后台批量写入队列
+界面线程只负责入队，由独立线程按条数或时间间隔批量交给处理函数写盘，
+避免磁盘卡顿阻塞界面。
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _Barrier:
+    """flush() 放入队列的标记，写线程处理到这里时通知等待方"""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """有界写入队列 + 后台写线程
+
+    handler(batch) 在写线程中被调用，batch 为入队对象的列表（保持入队顺序）。
+    满足以下任一条件即写入一批：攒够 max_batch 条，或距第一条入队超过 flush_interval 秒。
+    handler 抛出异常时按 retry_delay 指数退避重试 retries 次，仍失败才丢弃这一批；
+    handler 可以从 batch 中删除已写入的前缀，重试时只写剩余部分，丢弃条数也只计剩余部分。
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], None],
+        max_batch: int = 200,
+        flush_interval: float = 1.0,
+        maxsize: int = 10000,
+        name: str = "WriteBehind",
+        on_stop: Optional[Callable[[], None]] = None,
+        retries: int = 3,
+        retry_delay: float = 0.5,
+    ):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.name = name
+        self.on_stop = on_stop
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+        self._closed = False
+
+        # 统计信息
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.last_error: Optional[str] = None
+        self.last_batch_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item: Any):
+        """入队（队列满时阻塞等待，形成背压）"""
+        if self._closed:
+            raise RuntimeError(f"{self.name} 已关闭")
+        self._queue.put(item)
+        self.enqueued += 1
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前入队的数据全部写完，超时返回 False"""
+        if self._closed or not self._thread.is_alive():
+            return True
+        barrier = _Barrier()
+        self._queue.put(barrier)
+        return barrier.event.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """写完剩余数据后停止写线程"""
+        if self._closed:
+            return True
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'batches': self.batches,
+            'errors': self.errors,
+            'dropped': self.dropped,
+            'last_error': self.last_error,
+            'last_batch_ms': self.last_batch_ms,
+        }
+
+    def _write_batch(self, batch: List[Any]):
+        if not batch:
+            return
+        start_time = time.perf_counter()
+        total = len(batch)
+        for attempt in range(self.retries + 1):
+            try:
+                self.handler(batch)
+                self.written += total
+                break
+            except Exception as exc:
+                self.errors += 1
+                self.last_error = str(exc)
+                if attempt < self.retries:
+                    delay = self.retry_delay * (2 ** attempt)
+                    print(f"[{self.name}] 批量写入失败，{delay:.1f} 秒后重试: {exc}")
+                    time.sleep(delay)
+                    continue
+                import traceback
+                self.written += total - len(batch)
+                self.dropped += len(batch)
+                print(f"[{self.name}] 重试 {self.retries} 次仍失败，丢弃 {len(batch)} 条: {exc}\n{traceback.format_exc()}")
+        self.batches += 1
+        self.last_batch_ms = (time.perf_counter() - start_time) * 1000
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch: List[Any] = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, _Barrier):
+                    self._write_batch(batch)
+                    batch = []
+                    item.event.set()
+                else:
+                    batch.append(item)
+                    if len(batch) >= self.max_batch:
+                        break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 and batch:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(remaining, 0.01) if batch else None)
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+        # 处理关闭后仍残留的屏障，避免等待方卡住
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _Barrier):
+                item.event.set()
+        if self.on_stop:
+            try:
+                self.on_stop()
+            except Exception as exc:
+                print(f"[{self.name}] 关闭时出错: {exc}")